@@ -4,10 +4,13 @@ Flask application factory.
 """
 from flask import Flask
 from flask_socketio import SocketIO
+import logging
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -18,6 +21,9 @@ socketio = SocketIO(cors_allowed_origins="*", path=_socketio_path)
 
 def create_app():
     """Create and configure Flask application."""
+    from app.utils.logging_config import configure_logging
+    configure_logging()
+    
     app = Flask(__name__, 
                 static_folder='static',
                 template_folder='templates')
@@ -39,10 +45,10 @@ def create_app():
         # x_port=1: trust 1 proxy for X-Forwarded-Port
         # x_prefix=1: trust 1 proxy for X-Forwarded-Prefix
         app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_port=1, x_prefix=1)
-        print("[App] ProxyFix middleware enabled (works in both proxied and non-proxied setups)")
+        logger.info("ProxyFix middleware enabled (works in both proxied and non-proxied setups)")
     except ImportError:
-        print("[App] WARNING: werkzeug.middleware.proxy_fix not available. Install werkzeug>=0.15.0 for proxy support.")
-        print("[App] The app will still work, but may not handle reverse proxy headers correctly.")
+        logger.warning("werkzeug.middleware.proxy_fix not available. Install werkzeug>=0.15.0 for proxy support.")
+        logger.warning("The app will still work, but may not handle reverse proxy headers correctly.")
     
     # Configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -52,19 +58,69 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = Path(__file__).parent / 'uploads'
     app.config['QUIZES_FOLDER'] = Path(__file__).parent / 'quizes'
     app.config['AVATARS_FOLDER'] = Path(__file__).parent / 'static' / 'avatars'
+    # Media uploads are streamed to disk; larger files are rejected (resumable uploads included)
+    app.config['MAX_MEDIA_UPLOAD_SIZE'] = int(os.environ.get('MAX_MEDIA_UPLOAD_MB', '500')) * 1024 * 1024
+    # Quiz library archives (/api/quiz/import) hold many quizzes and all their media
+    app.config['MAX_IMPORT_ARCHIVE_SIZE'] = int(os.environ.get('MAX_IMPORT_ARCHIVE_MB', '5120')) * 1024 * 1024
+    # Reject oversized request bodies before they are parsed (1 MB allowance for form fields).
+    # This is the ceiling for every route - the media upload and import routes check their own limit.
+    app.config['MAX_CONTENT_LENGTH'] = max(app.config['MAX_MEDIA_UPLOAD_SIZE'],
+                                           app.config['MAX_IMPORT_ARCHIVE_SIZE']) + 1024 * 1024
+    # Optional hand-off of media delivery to the front proxy so Python never streams media bytes:
+    # MEDIA_ACCEL_REDIRECT_PREFIX for nginx (internal location aliasing the uploads folder),
+    # MEDIA_USE_X_SENDFILE=true for Apache mod_xsendfile / lighttpd
+    app.config['MEDIA_ACCEL_REDIRECT_PREFIX'] = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+    app.config['USE_X_SENDFILE'] = os.environ.get('MEDIA_USE_X_SENDFILE', 'false').lower() == 'true'
+    # Which answer counts when a participant submits more than once for a question:
+    # 'first' (default - later submissions are ignored) or 'last' (newest submission replaces it)
+    app.config['ANSWER_SUBMISSION_POLICY'] = os.environ.get('ANSWER_SUBMISSION_POLICY', 'first').lower()
+    
+    # Socket.IO wire format: 'json' (default) or 'msgpack' (smaller and faster to encode for
+    # large quiz payloads, needs the msgpack package). Pages load the matching client bundle.
+    serializer = os.environ.get('SOCKETIO_SERIALIZER', 'json').lower()
+    if serializer == 'msgpack':
+        try:
+            import msgpack
+        except ImportError:
+            logger.warning("SOCKETIO_SERIALIZER=msgpack but msgpack is not installed - using JSON")
+            serializer = 'json'
+    elif serializer != 'json':
+        logger.warning("Unknown SOCKETIO_SERIALIZER '%s' - using JSON", serializer)
+        serializer = 'json'
+    app.config['SOCKETIO_SERIALIZER'] = serializer
+    
+    # Bearer token required by /metrics (open when unset)
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
     
     # Create necessary directories
     app.config['UPLOAD_FOLDER'].mkdir(exist_ok=True)
     app.config['QUIZES_FOLDER'].mkdir(exist_ok=True)
     app.config['AVATARS_FOLDER'].mkdir(exist_ok=True)
     
+    # Outgoing events are measured against per-event size budgets as they are encoded
+    from app.utils.payload_budget import budgeted_packet_class
+    if serializer == 'msgpack':
+        from socketio.msgpack_packet import MsgPackPacket
+        packet_class = budgeted_packet_class(MsgPackPacket)
+    else:
+        packet_class = budgeted_packet_class()
+    
+    # Compress long-polling responses above the threshold (bytes). WebSocket connections
+    # negotiate per-message deflate with the browser (eventlet).
+    socketio_options = {
+        'cors_allowed_origins': "*",
+        'serializer': packet_class,
+        'http_compression': True,
+        'compression_threshold': int(os.environ.get('SOCKETIO_COMPRESSION_THRESHOLD', '1024'))
+    }
+    
     # Initialize Socket.IO - try eventlet first, fallback to threading
     # eventlet has better WebSocket support, threading is fallback for Windows
     try:
         import eventlet
-        socketio.init_app(app, async_mode='eventlet', cors_allowed_origins="*")
+        socketio.init_app(app, async_mode='eventlet', **socketio_options)
     except ImportError:
-        socketio.init_app(app, async_mode='threading', cors_allowed_origins="*")
+        socketio.init_app(app, async_mode='threading', **socketio_options)
     
     # Restore rooms from disk on startup
     # In development (with reloader), only restore in the main process (not on reloads)
@@ -79,7 +135,11 @@ def create_app():
         from app.utils.room_manager import restore_rooms
         restored = restore_rooms()
         if restored > 0:
-            print(f"Restored {restored} room(s) from disk")
+            logger.info("Restored %s room(s) from disk", restored)
+    
+    # Remove abandoned rooms in the background as they expire
+    from app.utils.room_manager import start_room_reaper
+    start_room_reaper()
     
     # When deployed under a subpath (e.g. APPLICATION_ROOT=/quizmaster), ensure request.script_root
     # is set so url_for() and APP_BASE_PATH in templates generate correct URLs. ProxyFix sets
@@ -99,5 +159,9 @@ def create_app():
     app.register_blueprint(media.bp)
     app.register_blueprint(debug.bp)
     
+    # Trace every Socket.IO event (slow-event log, profiling, /metrics)
+    from app.utils.event_trace import instrument_socketio_handlers
+    instrument_socketio_handlers(socketio)
+    
     return app
 
@@ -13,8 +13,10 @@ from app.utils.auth import (
 )
 from app.utils.stats import get_all_quizmaster_stats
 import json
+import logging
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
+logger = logging.getLogger(__name__)
 
 @bp.route('/request', methods=['POST'])
 def request_account():
@@ -40,20 +42,12 @@ def login_route():
     password = data.get('password')
 
     # BG TRACE: do NOT log password; log URL/path + expected public URL
-    try:
-        xf_prefix = request.headers.get('X-Forwarded-Prefix')
-        xf_host = request.headers.get('X-Forwarded-Host')
+    if logger.isEnabledFor(logging.DEBUG):
         expected_public = (request.url_root.rstrip('/') + request.path) if request.url_root else None
-        print(
-            "[BG TRACE][quizia] api=/api/auth/login "
-            f"input_path={request.path} "
-            f"expected_public={expected_public} "
-            f"actual_url={request.url} "
-            f"xf_prefix={xf_prefix} xf_host={xf_host} "
-            f"username={username}"
-        )
-    except Exception:
-        pass
+        logger.debug("[BG TRACE] api=/api/auth/login input_path=%s expected_public=%s actual_url=%s "
+                     "xf_prefix=%s xf_host=%s username=%s",
+                     request.path, expected_public, request.url,
+                     request.headers.get('X-Forwarded-Prefix'), request.headers.get('X-Forwarded-Host'), username)
     
     if not username or not password:
         return jsonify({'error': 'Username and password required'}), 400
@@ -142,10 +136,13 @@ def get_quizmasters():
     # Combine quizmasters with their stats
     quizmasters_with_stats = []
     for username in quizmasters:
+        user_stats = stats.get(username, {})
         quizmasters_with_stats.append({
             'username': username,
-            'quizzes_created': stats.get(username, {}).get('quizzes_created', 0),
-            'quizzes_run': stats.get(username, {}).get('quizzes_run', 0)
+            'quizzes_created': user_stats.get('quizzes_created', 0),
+            'quizzes_run': user_stats.get('quizzes_run', 0),
+            'participants_hosted': user_stats.get('participants_hosted', 0),
+            'answers_collected': user_stats.get('answers_collected', 0)
         })
     
     return jsonify({'quizmasters': quizmasters_with_stats}), 200
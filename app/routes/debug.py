@@ -1,15 +1,15 @@
 """
 Debug routes for diagnosing TV display issues.
 """
-from flask import Blueprint, jsonify
-from app.utils.room_manager import get_room
+from flask import Blueprint, jsonify, request, session, Response
+from app.utils.room_manager import peek_room
 
 bp = Blueprint('debug', __name__)
 
 @bp.route('/api/debug/room/<room_code>')
 def debug_room(room_code):
     """Debug endpoint to check room status."""
-    room = get_room(room_code)
+    room = peek_room(room_code)
     if not room:
         return jsonify({
             'exists': False,
@@ -52,8 +52,30 @@ def test_playwright():
             'traceback': traceback.format_exc()
         }), 500
 
+@bp.route('/api/debug/room/<room_code>/profile', methods=['GET', 'POST'])
+def room_profile(room_code):
+    """
+    Profile a room's Socket.IO events with cProfile. POST {"enabled": true/false}
+    starts or stops profiling (stopping returns the report), GET returns the
+    report so far. Only the quizmaster running the room may use it.
+    """
+    from app.utils import event_trace
 
+    room = peek_room(room_code)
+    if not room:
+        return jsonify({'success': False, 'error': 'Room not found'}), 404
+    if not session.get('is_quizmaster') or session.get('username') != room.get('quizmaster'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
 
+    if request.method == 'GET':
+        report = event_trace.get_room_profile(room_code)
+        if report is None:
+            return jsonify({'success': False, 'error': 'Room is not being profiled'}), 404
+        return Response(report, mimetype='text/plain')
 
-
-
+    data = request.get_json(silent=True) or {}
+    if data.get('enabled', True):
+        event_trace.start_room_profile(room_code)
+        return jsonify({'success': True, 'profiling': True})
+    report = event_trace.stop_room_profile(room_code)
+    return jsonify({'success': True, 'profiling': False, 'report': report})
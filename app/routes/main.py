@@ -3,8 +3,10 @@ Main routes for the application.
 """
 from flask import Blueprint, Response, render_template, send_from_directory
 from pathlib import Path
+import logging
 
 bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
 
 def _logo_path():
     """Path to logo.png at app root (standardized across apps)."""
@@ -83,10 +85,10 @@ def get_public_rooms():
 @bp.route('/api/participants/<room_code>')
 def get_room_participants(room_code):
     """Get list of participants in a room for rejoin selection."""
-    from app.utils.room_manager import get_room
+    from app.utils.room_manager import peek_room
     from flask import jsonify
     
-    room = get_room(room_code)
+    room = peek_room(room_code)
     if not room:
         return jsonify({'error': 'Room not found'}), 404
     
@@ -104,6 +106,37 @@ def get_room_participants(room_code):
     
     return jsonify({'participants': participants_list})
 
+@bp.route('/api/room/<room_code>/manifest')
+def get_room_media_manifest(room_code):
+    """Get a running room's per-page media manifest so clients can prefetch upcoming media."""
+    from app.utils.room_manager import peek_room, get_media_manifest, get_prefetch_media
+    from flask import jsonify
+    
+    room = peek_room(room_code)
+    if not room or room.get('ended', False):
+        return jsonify({'error': 'Room not found'}), 404
+    
+    current_page = room.get('current_page', 0)
+    return jsonify({
+        'current_page': current_page,
+        'pages': get_media_manifest(room),
+        'prefetch': get_prefetch_media(room, current_page)
+    })
+
+@bp.route('/metrics')
+def metrics():
+    """Server metrics in the Prometheus text format (needs 'Authorization: Bearer <METRICS_TOKEN>' when set)."""
+    import hmac
+    from flask import request, current_app
+    from app.utils.metrics import render_metrics
+    
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        provided = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(provided.encode('utf-8'), f'Bearer {token}'.encode('utf-8')):
+            return Response('Unauthorized', status=401, mimetype='text/plain')
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @bp.route('/quizmaster')
 def quizmaster():
     """Quizmaster dashboard."""
@@ -113,20 +146,13 @@ def quizmaster():
 def quizmaster_login():
     """Quizmaster login page."""
     # BG TRACE: log how this request arrived (proxied vs direct)
-    try:
+    if logger.isEnabledFor(logging.DEBUG):
         from flask import request
-        xf_prefix = request.headers.get('X-Forwarded-Prefix')
-        xf_host = request.headers.get('X-Forwarded-Host')
         expected_public = (request.url_root.rstrip('/') + request.path) if request.url_root else None
-        print(
-            "[BG TRACE][quizia] route=/quizmaster/login "
-            f"input_path={request.path} "
-            f"expected_public={expected_public} "
-            f"actual_url={request.url} "
-            f"xf_prefix={xf_prefix} xf_host={xf_host}"
-        )
-    except Exception:
-        pass
+        logger.debug("[BG TRACE] route=/quizmaster/login input_path=%s expected_public=%s actual_url=%s "
+                     "xf_prefix=%s xf_host=%s",
+                     request.path, expected_public, request.url,
+                     request.headers.get('X-Forwarded-Prefix'), request.headers.get('X-Forwarded-Host'))
     return render_template('quizmaster_login.html')
 
 @bp.route('/quizmaster/create')
@@ -137,10 +163,10 @@ def quizmaster_create():
 @bp.route('/display/<room_code>')
 def display(room_code):
     """Display page for quiz room - publicly accessible, no authentication required."""
-    from app.utils.room_manager import get_room
+    from app.utils.room_manager import peek_room
     
     # Check if room exists and is running
-    room = get_room(room_code)
+    room = peek_room(room_code)
     if not room or room.get('ended', False):
         return render_template('quiz_not_running.html', room_code=room_code, view_type='display')
     
@@ -149,10 +175,10 @@ def display(room_code):
 @bp.route('/tvdisplay/<room_code>')
 def tvdisplay(room_code):
     """TV-safe display page - shows server-rendered image stream."""
-    from app.utils.room_manager import get_room
+    from app.utils.room_manager import peek_room
     
     # Check if room exists and is running
-    room = get_room(room_code)
+    room = peek_room(room_code)
     if not room or room.get('ended', False):
         return render_template('quiz_not_running.html', room_code=room_code, view_type='display')
     
@@ -161,10 +187,10 @@ def tvdisplay(room_code):
 @bp.route('/tvdisplay_old/<room_code>')
 def tvdisplay_old(room_code):
     """Old TV-safe display page - uses polling instead of WebSockets (kept for fallback)."""
-    from app.utils.room_manager import get_room
+    from app.utils.room_manager import peek_room
     
     # Check if room exists and is running
-    room = get_room(room_code)
+    room = peek_room(room_code)
     if not room or room.get('ended', False):
         return render_template('quiz_not_running.html', room_code=room_code, view_type='display')
     
@@ -173,11 +199,11 @@ def tvdisplay_old(room_code):
 @bp.route('/api/tvdisplay/version/<room_code>')
 def api_tvdisplay_version(room_code):
     """Lightweight endpoint that returns the current version number for a room."""
-    from app.utils.room_manager import get_room
+    from app.utils.room_manager import peek_room
     from flask import jsonify
     from app.utils.display_renderer import get_version
     
-    room = get_room(room_code)
+    room = peek_room(room_code)
     if not room:
         return jsonify({'error': 'Room not found', 'version': 0}), 404
     
@@ -190,12 +216,12 @@ def api_tvdisplay_version(room_code):
 @bp.route('/api/tvdisplay/image/<room_code>')
 def api_tvdisplay_image(room_code):
     """API endpoint that returns a rendered screenshot of the display page."""
-    from app.utils.room_manager import get_room
+    from app.utils.room_manager import peek_room
     from flask import Response, request
     from app.utils.display_renderer import render_display_page_sync
     import os
     
-    room = get_room(room_code)
+    room = peek_room(room_code)
     if not room:
         return Response('Room not found', status=404, mimetype='text/plain')
     
@@ -209,28 +235,28 @@ def api_tvdisplay_image(room_code):
     try:
         base_url = request.url_root.rstrip('/')
         request_host = request.host if request.host else 'unknown'
-        print(f"[TV Display API] Request came from: {base_url} (host: {request_host})")
-        print(f"[TV Display API] Using base_url: {base_url} for room {room_code}")
+        logger.debug("Request came from: %s (host: %s)", base_url, request_host)
+        logger.debug("Using base_url: %s for room %s", base_url, room_code)
     except Exception as e:
         # Fallback to localhost if request.url_root fails (shouldn't happen, but safety first)
-        print(f"[TV Display API] Error reading request URL: {e}, using fallback")
+        logger.error("Error reading request URL: %s, using fallback", e)
         base_url = "http://127.0.0.1:6005"
     
     # Render the display page
     try:
-        print(f"[TV Display API] Starting render for room {room_code}")
-        print(f"[TV Display API] Room exists: {room is not None}, Room ended: {room.get('ended', False) if room else 'N/A'}")
+        logger.debug("Starting render for room %s", room_code)
+        logger.debug("Room exists: %s, Room ended: %s", room is not None, room.get('ended', False) if room else 'N/A')
         image_data = render_display_page_sync(room_code, base_url)
         if image_data:
-            print(f"[TV Display API] Render successful for room {room_code}, image size: {len(image_data)} bytes")
+            logger.debug("Render successful for room %s, image size: %s bytes", room_code, len(image_data))
             return Response(image_data, mimetype='image/png')
         else:
-            print(f"[TV Display API] Render returned None for room {room_code}")
+            logger.warning("Render returned None for room %s", room_code)
             # Try to get last successful image from renderer
             from app.utils.display_renderer import _last_successful_image
             if room_code in _last_successful_image:
                 last_image = _last_successful_image[room_code]
-                print(f"[TV Display API] Returning last successful image for room {room_code}")
+                logger.debug("Returning last successful image for room %s", room_code)
                 return Response(last_image, mimetype='image/png')
             # If no last image, return a 1x1 transparent PNG (will show as black, but better than error)
             import base64
@@ -238,10 +264,7 @@ def api_tvdisplay_image(room_code):
             transparent_png = base64.b64decode('iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
             return Response(transparent_png, mimetype='image/png')
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"[TV Display API] ERROR rendering display image for room {room_code}: {e}")
-        print(f"[TV Display API] Traceback: {error_trace}")
+        logger.exception("Error rendering display image for room %s", room_code)
         # Return error details in response for debugging (in production, might want to hide this)
         error_msg = f"Error rendering display: {str(e)}\n\nCheck server logs for full traceback."
         return Response(error_msg, status=500, mimetype='text/plain')
@@ -249,10 +272,10 @@ def api_tvdisplay_image(room_code):
 @bp.route('/api/tvdisplay/<room_code>')
 def api_tvdisplay(room_code):
     """API endpoint for TV display - returns current quiz state as JSON."""
-    from app.utils.room_manager import get_room
+    from app.utils.room_manager import peek_room
     from flask import jsonify
     
-    room = get_room(room_code)
+    room = peek_room(room_code)
     if not room:
         return jsonify({'error': 'Room not found', 'running': False}), 404
     
@@ -283,10 +306,10 @@ def api_tvdisplay(room_code):
 @bp.route('/participant/<room_code>')
 def participant(room_code):
     """Participant page for quiz room - publicly accessible, participants join via room code."""
-    from app.utils.room_manager import get_room
+    from app.utils.room_manager import peek_room
     
     # Check if room exists and is running
-    room = get_room(room_code)
+    room = peek_room(room_code)
     if not room or room.get('ended', False):
         return render_template('quiz_not_running.html', room_code=room_code, view_type='participant')
     
@@ -296,14 +319,14 @@ def participant(room_code):
 def control(room_code):
     """Quizmaster control page for quiz room - ONLY accessible by the specific user who started this quiz instance."""
     from flask import session, redirect, url_for, flash
-    from app.utils.room_manager import get_room
+    from app.utils.room_manager import peek_room
     
     # First check: User must be logged in as a quizmaster
     if not session.get('is_quizmaster'):
         return redirect(url_for('main.quizmaster_login'))
     
     # Second check: Room must exist
-    room = get_room(room_code)
+    room = peek_room(room_code)
     if not room:
         flash('Room not found or expired', 'error')
         return redirect(url_for('main.quizmaster'))
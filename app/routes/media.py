@@ -1,14 +1,29 @@
 """
 Media management routes.
 """
-from flask import Blueprint, request, jsonify, session, send_file
+import mimetypes
+from urllib.parse import quote
+from flask import Blueprint, request, jsonify, session, send_file, current_app, Response
+from app.utils.media_variants import find_variant, variants_pending
 from app.utils.media_storage import (
-    save_media_file,
+    save_media_stream,
+    get_media_metadata,
+    get_uploads_folder,
+    start_chunked_upload,
+    get_chunked_upload,
+    append_upload_chunk,
+    complete_chunked_upload,
+    cancel_chunked_upload,
     delete_media_file,
+    delete_media_files,
     list_media_files,
     get_media_file_path,
     toggle_media_public,
-    rename_media_display_name
+    set_media_public_bulk,
+    rename_media_display_name,
+    get_quizzes_using_media,
+    list_orphaned_media,
+    find_media_by_hashes
 )
 
 bp = Blueprint('media', __name__, url_prefix='/api/media')
@@ -29,12 +44,64 @@ def list_media_route():
     files = list_media_files(username=username, include_reference_count=True)
     return jsonify({'files': files}), 200
 
+@bp.route('/usage/<filename>', methods=['GET'])
+def media_usage_route(filename):
+    """List the quizzes that use a media file (quizmaster only, only quizzes they can see)."""
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    from app.utils.quiz_storage import load_quiz
+    
+    username = session.get('username')
+    quiz_ids = get_quizzes_using_media(filename)
+    quizzes = []
+    for quiz_id in quiz_ids:
+        quiz_data = load_quiz(quiz_id)
+        if quiz_data and (quiz_data.get('creator') == username or quiz_data.get('public', False)):
+            quizzes.append({'id': quiz_id, 'name': quiz_data.get('name', 'Untitled Quiz')})
+    
+    return jsonify({'filename': filename, 'reference_count': len(quiz_ids), 'quizzes': quizzes}), 200
+
+@bp.route('/lookup-hashes', methods=['POST'])
+def lookup_media_hashes_route():
+    """
+    Report which content hashes the current quizmaster already has stored.
+    Content only available as another user's public file is cloned into their media.
+    """
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json() or {}
+    hashes = data.get('hashes', [])
+    if not isinstance(hashes, list):
+        return jsonify({'error': 'hashes must be a list'}), 400
+    
+    return jsonify({'found': find_media_by_hashes(hashes, session.get('username'))}), 200
+
+@bp.route('/orphans', methods=['GET'])
+def list_orphaned_media_route():
+    """List the current quizmaster's media files that no quiz uses."""
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    username = session.get('username')
+    try:
+        files = [f for f in list_orphaned_media(username=username) if f['creator'] == username]
+    except Exception as e:
+        return jsonify({'error': f'Could not determine media usage: {e}'}), 500
+    return jsonify({'files': files}), 200
+
 @bp.route('/upload', methods=['POST'])
 def upload_media():
     """Upload a media file (quizmaster only)."""
     if not session.get('is_quizmaster'):
         return jsonify({'error': 'Unauthorized'}), 401
     
+    # Refuse before the body is parsed (save_media_stream also enforces the limit while streaming)
+    max_size = current_app.config['MAX_MEDIA_UPLOAD_SIZE']
+    if request.content_length and request.content_length > max_size + 1024 * 1024:
+        return jsonify({'error': f'File too large (maximum {max_size // (1024 * 1024)} MB)'}), 413
+    
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -49,16 +116,91 @@ def upload_media():
         username = session.get('username')
         public = request.form.get('public', 'false').lower() == 'true'
         
-        file_content = file.read()
-        result = save_media_file(file.filename, file_content, username, public=public)
+        # Stream to disk in chunks rather than reading the whole file into memory
+        result = save_media_stream(file.filename, file.stream, username, public=public)
         
         if result['success']:
             return jsonify({'message': 'File uploaded', 'filename': result['filename']}), 200
         else:
-            return jsonify({'error': result['error']}), 400
+            return jsonify({'error': result['error']}), 413 if result.get('too_large') else 400
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@bp.route('/upload/start', methods=['POST'])
+def start_chunked_upload_route():
+    """Start a resumable (chunked) upload (quizmaster only)."""
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json() or {}
+    filename = data.get('filename', '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed'}), 400
+    
+    result = start_chunked_upload(filename, session.get('username'), data.get('size'),
+                                  public=bool(data.get('public', False)))
+    if result['success']:
+        return jsonify({'upload_id': result['upload_id'], 'chunk_size': result['chunk_size']}), 200
+    return jsonify({'error': result['error']}), 413 if result.get('too_large') else 400
+
+@bp.route('/upload/<upload_id>', methods=['GET'])
+def get_chunked_upload_route(upload_id):
+    """Get the offset a resumable upload should continue from."""
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    result = get_chunked_upload(upload_id, session.get('username'))
+    if result['success']:
+        return jsonify({'offset': result['offset'], 'size': result['total_size']}), 200
+    return jsonify({'error': result['error']}), 404
+
+@bp.route('/upload/<upload_id>', methods=['PUT'])
+def append_upload_chunk_route(upload_id):
+    """Append a chunk (raw request body) at ?offset= to a resumable upload."""
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset is required'}), 400
+    
+    result = append_upload_chunk(upload_id, session.get('username'), offset, request.stream)
+    if result['success']:
+        return jsonify({'offset': result['offset']}), 200
+    if result.get('busy'):
+        # An earlier attempt of this chunk is still streaming - the client backs off and asks for the offset
+        return jsonify({'error': result['error']}), 503
+    if 'offset' in result:
+        # Client is out of step - tell it where to resume
+        return jsonify({'error': result['error'], 'offset': result['offset']}), 409
+    return jsonify({'error': result['error']}), 404 if result['error'] == 'Upload not found' else 400
+
+@bp.route('/upload/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload_route(upload_id):
+    """Finish a resumable upload and store the file."""
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    result = complete_chunked_upload(upload_id, session.get('username'))
+    if result['success']:
+        return jsonify({'message': 'File uploaded', 'filename': result['filename']}), 200
+    if result.get('busy'):
+        return jsonify({'error': result['error']}), 503
+    if 'offset' in result:
+        return jsonify({'error': result['error'], 'offset': result['offset']}), 409
+    return jsonify({'error': result['error']}), 400
+
+@bp.route('/upload/<upload_id>', methods=['DELETE'])
+def cancel_chunked_upload_route(upload_id):
+    """Cancel a resumable upload."""
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    result = cancel_chunked_upload(upload_id, session.get('username'))
+    if result['success']:
+        return jsonify({'message': 'Upload cancelled'}), 200
+    return jsonify({'error': result['error']}), 404
+
 @bp.route('/download/<filename>', methods=['GET'])
 def download_media(filename):
     """Download a media file (quizmaster only, must have access)."""
@@ -107,14 +249,74 @@ def toggle_media_public_route(filename):
     else:
         return jsonify({'error': result['error']}), 400
 
+# Cache lifetime for versioned media URLs (/api/media/serve/<filename>?v=<content hash prefix>)
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
 @bp.route('/serve/<filename>', methods=['GET'])
 def serve_media(filename):
-    """Serve a media file (for use in quizzes)."""
+    """
+    Serve a media file (for use in quizzes).
+    
+    The ETag is the file's content hash, so clients revalidate with a cheap 304.
+    URLs carrying ?v=<hash prefix> that matches the current content are cached
+    as immutable. Byte ranges are supported for seeking in video and audio.
+    
+    A resized variant is served instead of the original when one fits the
+    request: ?variant=thumb|phone|hd, or ?w=<viewport width in device pixels>,
+    or ?role=participant|display, with the image format chosen from Accept.
+    While the variant is still being generated the original is served with
+    no-cache, so clients pick up the variant once it exists.
+    """
     file_path = get_media_file_path(filename)
     if not file_path.exists():
         return jsonify({'error': 'File not found'}), 404
     
-    return send_file(file_path)
+    file_meta = get_media_metadata(filename) or {}
+    sha256 = file_meta.get('sha256')
+    version = request.args.get('v', '')
+    immutable = bool(sha256 and len(version) >= 8 and sha256.startswith(version))
+    
+    etag = sha256
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    variant = find_variant(sha256, filename, request.accept_mimetypes,
+                           variant=request.args.get('variant'),
+                           role=request.args.get('role'),
+                           width=request.args.get('w', type=int))
+    if variant:
+        variant_name, file_path, mimetype = variant
+        etag = f'{sha256}-{variant_name}-{file_path.suffix.lstrip(".")}'
+    elif immutable and variants_pending(sha256, filename, variant=request.args.get('variant'),
+                                        role=request.args.get('role'), width=request.args.get('w', type=int)):
+        # The original stands in until the variant exists - the URL must not cache it for good
+        immutable = False
+    
+    accel_prefix = current_app.config.get('MEDIA_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        # Let nginx deliver the bytes (including ranges); only headers come from here
+        if etag and etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(mimetype=mimetype)
+            relative_path = file_path.relative_to(get_uploads_folder()).as_posix()
+            response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(relative_path)
+    else:
+        response = send_file(file_path, mimetype=mimetype, etag=etag or True, conditional=True)
+        response.headers['Accept-Ranges'] = 'bytes'
+    
+    if etag:
+        response.set_etag(etag)
+    if 'variant' in request.args or 'w' in request.args or 'role' in request.args:
+        # The image format depends on what the client accepts
+        response.vary.add('Accept')
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # Unversioned URLs may point at new content later (delete + re-upload) - always revalidate
+        response.cache_control.no_cache = True
+    return response
 
 @bp.route('/bulk-delete', methods=['POST'])
 def bulk_delete_media():
@@ -130,8 +332,7 @@ def bulk_delete_media():
         return jsonify({'error': 'No files specified'}), 400
     
     results = []
-    for filename in filenames:
-        result = delete_media_file(filename, username)
+    for filename, result in zip(filenames, delete_media_files(filenames, username)):
         results.append({'filename': filename, 'success': result['success'], 'error': result.get('error')})
     
     return jsonify({'results': results}), 200
@@ -150,27 +351,8 @@ def bulk_toggle_media_public():
     if not filenames:
         return jsonify({'error': 'No files specified'}), 400
     
-    results = []
-    for filename in filenames:
-        # Get current status
-        from app.utils.media_storage import _load_media_metadata, _save_media_metadata
-        metadata = _load_media_metadata()
-        file_meta = metadata.get(filename)
-        
-        if not file_meta:
-            results.append({'filename': filename, 'success': False, 'error': 'File not found'})
-            continue
-        
-        if file_meta.get('creator') != username:
-            results.append({'filename': filename, 'success': False, 'error': 'Only creator can change status'})
-            continue
-        
-        # Set public status
-        file_meta['public'] = make_public
-        metadata[filename] = file_meta
-        _save_media_metadata(metadata)
-        
-        results.append({'filename': filename, 'success': True, 'public': make_public})
+    # All status changes are committed in one transaction
+    results = set_media_public_bulk(filenames, username, make_public)
     
     return jsonify({'results': results}), 200
 
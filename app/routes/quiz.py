@@ -1,7 +1,7 @@
 """
 Quiz management routes.
 """
-from flask import Blueprint, request, jsonify, session, send_file
+from flask import Blueprint, request, jsonify, session, send_file, Response, stream_with_context, current_app
 from app.utils.quiz_storage import (
     save_quiz,
     load_quiz,
@@ -9,14 +9,18 @@ from app.utils.quiz_storage import (
     delete_quiz,
     validate_quiz_json,
     generate_quiz_id,
-    copy_quiz
+    copy_quiz,
+    get_quizes_folder
 )
+from app.utils.quiz_archive import stream_quiz_archive, import_quiz_archive
 from app.utils.room_manager import get_running_rooms_for_quizmaster, end_room
 from pathlib import Path
 import json
+import logging
 import time
 
 bp = Blueprint('quiz', __name__, url_prefix='/api/quiz')
+logger = logging.getLogger(__name__)
 
 @bp.route('/list', methods=['GET'])
 def list_quizes_route():
@@ -138,9 +142,7 @@ def download_quiz(quiz_id):
     if quiz_creator != username and not is_public:
         return jsonify({'error': 'Access denied'}), 403
     
-    from app import create_app
-    app = create_app()
-    quiz_file = app.config['QUIZES_FOLDER'] / f'{quiz_id}.json'
+    quiz_file = get_quizes_folder() / f'{quiz_id}.json'
     
     # Use quiz name for download filename
     quiz_name = quiz.get('name', 'quiz')
@@ -192,6 +194,79 @@ def upload_quiz():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@bp.route('/export', methods=['GET'])
+def export_quizzes():
+    """
+    Download several quizzes plus their media as one zip archive (quizmaster only).
+    
+    Query params:
+        ids: Comma-separated quiz IDs (default: all the quizmaster's own quizzes)
+    
+    The archive is streamed while it is generated.
+    """
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    username = session.get('username')
+    ids = [quiz_id for quiz_id in request.args.get('ids', '').split(',') if quiz_id]
+    if not ids:
+        ids = [quiz['id'] for quiz in list_quizes(username=username) if quiz.get('creator') == username]
+    
+    quizzes = []
+    for quiz_id in dict.fromkeys(ids):
+        quiz = load_quiz(quiz_id)
+        if not quiz:
+            return jsonify({'error': f'Quiz not found: {quiz_id}'}), 404
+        # Check if user has access (creator or public)
+        if quiz.get('creator') != username and not quiz.get('public', False):
+            return jsonify({'error': f'Access denied: {quiz_id}'}), 403
+        quizzes.append(quiz)
+    
+    if not quizzes:
+        return jsonify({'error': 'No quizzes to export'}), 400
+    
+    download_name = f"quizzes_{time.strftime('%Y%m%d_%H%M%S')}.zip"
+    return Response(
+        stream_with_context(stream_quiz_archive(quizzes)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+    )
+
+@bp.route('/import', methods=['POST'])
+def import_quizzes():
+    """
+    Import a quiz archive created by /export (quizmaster only). Always creates new quizzes.
+    Archives may be up to MAX_IMPORT_ARCHIVE_MB (default 5 GB); each media file in
+    them is still limited to MAX_MEDIA_UPLOAD_MB.
+    """
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    max_size = current_app.config['MAX_IMPORT_ARCHIVE_SIZE']
+    if request.content_length and request.content_length > max_size + 1024 * 1024:
+        return jsonify({'error': f'Archive too large (maximum {max_size // (1024 * 1024)} MB)'}), 413
+    
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    try:
+        result = import_quiz_archive(file.stream, session.get('username'))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not result['success']:
+        return jsonify({'error': result['error']}), 400
+    return jsonify({
+        'message': f"Imported {len(result['quizzes'])} quiz(zes)",
+        'quizzes': result['quizzes'],
+        'media': result['media'],
+        'skipped': result['skipped']
+    }), 200
+
 @bp.route('/toggle-public/<quiz_id>', methods=['POST'])
 def toggle_quiz_public(quiz_id):
     """Toggle public status of a quiz (quizmaster only, must be creator)."""
@@ -245,6 +320,31 @@ def copy_quiz_route(quiz_id):
     else:
         return jsonify({'error': result['error']}), 400
 
+@bp.route('/analytics/<quiz_id>', methods=['GET'])
+def quiz_analytics(quiz_id):
+    """Get per-question analytics and recent run summaries for a quiz (quizmaster only, must be creator)."""
+    if not session.get('is_quizmaster'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    username = session.get('username')
+    quiz = load_quiz(quiz_id)
+    
+    if not quiz:
+        return jsonify({'error': 'Quiz not found'}), 404
+    
+    if quiz.get('creator') != username:
+        return jsonify({'error': 'Only the creator can view analytics for this quiz'}), 403
+    
+    from app.utils.analytics import get_quiz_analytics, list_run_summaries
+    try:
+        limit = int(request.args.get('runs', 20))
+    except ValueError:
+        limit = 20
+    
+    analytics = get_quiz_analytics(quiz_id)
+    analytics['recent_runs'] = list_run_summaries(quiz_id=quiz_id, limit=limit)
+    return jsonify(analytics), 200
+
 @bp.route('/running', methods=['GET'])
 def get_running_quizzes():
     """Get all running quizzes for the current quizmaster."""
@@ -265,7 +365,7 @@ def end_running_quiz(room_code):
     username = session.get('username')
     
     # Check if room exists and belongs to this quizmaster
-    from app.utils.room_manager import get_room, end_room
+    from app.utils.room_manager import get_room, end_room, touch_room, broadcast_room_event
     room = get_room(room_code)
     
     if not room:
@@ -279,13 +379,12 @@ def end_running_quiz(room_code):
     try:
         from app.utils.scoring import calculate_score
         from app.utils.stats import record_quiz_run
-        from app import socketio
         
         # Calculate final scores
         scores = calculate_score(room)
         room['scores'] = scores
         room['ended'] = True
-        room['last_activity'] = time.time()
+        touch_room(room)
         
         # Don't save state - we're about to delete the room file
         
@@ -293,10 +392,19 @@ def end_running_quiz(room_code):
         quiz_id = room.get('quiz_id')
         try:
             if quiz_id:
-                record_quiz_run(quiz_id, username, room_code, completed=True)
+                record_quiz_run(quiz_id, username, room_code, completed=True,
+                                participant_count=len(room.get('participants', {})),
+                                answer_count=sum(len(a) for a in room.get('answers', {}).values()))
         except Exception as e:
             # Log error but don't fail - stats recording is not critical
-            print(f"Warning: Failed to record quiz run stats: {e}")
+            logger.warning("Failed to record quiz run stats: %s", e)
+        
+        # Archive per-question analytics in the background (answers are dropped with the room)
+        try:
+            from app.utils.analytics import schedule_run_archive
+            schedule_run_archive(room)
+        except Exception as e:
+            logger.warning("Failed to schedule run archive: %s", e)
         
         # Get final rankings
         participants = room.get('participants', {})
@@ -315,23 +423,23 @@ def end_running_quiz(room_code):
         
         # Broadcast end to all rooms
         try:
-            socketio.emit('quiz_ended', {
+            broadcast_room_event(room_code, 'display', 'quiz_ended', {
                 'scores': scores,
                 'final_rankings': rankings
-            }, room=f'display_{room_code}')
+            })
             
-            socketio.emit('quiz_ended', {
+            broadcast_room_event(room_code, 'participant', 'quiz_ended', {
                 'scores': scores,
                 'final_rankings': rankings
-            }, room=f'participant_{room_code}')
+            })
             
-            socketio.emit('quiz_ended', {
+            broadcast_room_event(room_code, 'control', 'quiz_ended', {
                 'scores': scores,
                 'final_rankings': rankings
-            }, room=f'control_{room_code}')
+            })
         except Exception as e:
             # Log error but don't fail - socket operations are not critical
-            print(f"Warning: Failed to emit quiz_ended events: {e}")
+            logger.warning("Failed to emit quiz_ended events: %s", e)
         
         # Disconnect all clients from the rooms
         try:
@@ -341,16 +449,16 @@ def end_running_quiz(room_code):
             close_room(f'control_{room_code}')
         except Exception as e:
             # Log error but don't fail
-            print(f"Warning: Failed to close rooms: {e}")
+            logger.warning("Failed to close rooms: %s", e)
     except Exception as e:
         # Log the error but ensure room is still ended
-        print(f"Error during quiz end operations: {e}")
+        logger.error("Error during quiz end operations: %s", e)
     
     # Mark room as ended and remove it (always do this, even if other operations failed)
     try:
         end_room(room_code)
     except Exception as e:
-        print(f"Warning: Failed to end room: {e}")
+        logger.warning("Failed to end room: %s", e)
     
     return jsonify({'message': 'Quiz ended successfully'}), 200
 
@@ -363,7 +471,7 @@ def toggle_running_quiz_public(room_code):
     username = session.get('username')
     
     # Check if room exists and belongs to this quizmaster
-    from app.utils.room_manager import get_room, save_room_state_now
+    from app.utils.room_manager import get_room, save_room_state_now, touch_room
     room = get_room(room_code)
     
     if not room:
@@ -374,7 +482,7 @@ def toggle_running_quiz_public(room_code):
     
     # Toggle public status
     room['public'] = not room.get('public', False)
-    room['last_activity'] = time.time()
+    touch_room(room)
     
     # Save room state
     save_room_state_now(room_code)
@@ -427,9 +535,7 @@ def migrate_quiz_route(quiz_id):
             return jsonify({'error': result['error']}), 400
     except Exception as e:
         # Ensure we always return JSON, even on unexpected errors
-        import traceback
-        print(f"Error in migrate_quiz_route: {e}")
-        print(traceback.format_exc())
+        logger.exception("Error in migrate_quiz_route")
         return jsonify({'error': f'Migration failed: {str(e)}'}), 500
 
 @bp.route('/check-localhost', methods=['GET'])
@@ -1,7 +1,7 @@
 """
 WebSocket routes for real-time communication.
 """
-from flask import Blueprint, session, request
+from flask import Blueprint, session, request, current_app
 from flask_socketio import emit, join_room, leave_room, close_room
 from app import socketio
 from app.utils.room_manager import (
@@ -11,14 +11,53 @@ from app.utils.room_manager import (
     add_participant,
     remove_participant,
     get_participants,
-    find_participant_by_combo,
+    get_prefetch_media,
     update_room_state,
-    save_room_state_now
+    save_room_state_now,
+    touch_room,
+    peek_room,
+    register_socket,
+    unregister_socket,
+    mark_participant_disconnected,
+    count_connected_participants,
+    get_participant_id,
+    bump_room_revision,
+    broadcast_room_event,
+    get_event_cursor,
+    get_missed_events
 )
 from app.utils.scoring import calculate_score
+from app.utils.logging_config import get_sampled_logger
+from app.utils import metrics
+from app.utils.event_trace import record_idle
+from threading import Lock
+import logging
 import time
 
 bp = Blueprint('websocket', __name__)
+logger = logging.getLogger(__name__)
+# One in LOG_SAMPLE_RATE answer submissions is logged
+answer_logger = get_sampled_logger(__name__ + '.answers')
+
+# Answers are fanned out to the control view in micro-batches: a burst of
+# submissions becomes one 'answers_submitted' event (and one room save)
+# per interval instead of one per answer.
+ANSWER_BATCH_INTERVAL = 0.1  # seconds
+_pending_answers = {}  # room_code -> answer entries not yet sent to control
+_pending_answers_lock = Lock()
+
+# Participant joins and connect/disconnect changes are debounced the same way
+# into 'participant_presence' events for control.
+PRESENCE_BATCH_INTERVAL = 0.5  # seconds
+_pending_presence = {}  # room_code -> {'changes': {participant_id: connected}, 'joined': {participant_id: {name, avatar}}}
+_pending_presence_lock = Lock()
+
+# Join pacing per room: bursts of JOIN_BURST are admitted at once, further
+# joins are spread out to JOIN_RATE per second
+JOIN_RATE = 50  # joins per second
+JOIN_BURST = 50
+_join_schedule = {}  # room_code -> theoretical arrival time of the next join (monotonic)
+_join_schedule_lock = Lock()
 
 def check_quizmaster_access(room_code, emit_error=True):
     """
@@ -65,9 +104,51 @@ def handle_connect():
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    """Handle client disconnection."""
-    # Clean up participant if they were in a room
-    pass
+    """Handle client disconnection - mark the participant (if any) as disconnected."""
+    entry = unregister_socket(request.sid)
+    if not entry:
+        return
+    
+    room_code, role, participant_id = entry
+    if role == 'participant' and mark_participant_disconnected(room_code, participant_id, request.sid):
+        _queue_presence_change(room_code, participant_id, False)
+
+def _queue_presence_change(room_code, participant_id, connected, participant=None):
+    """
+    Record a participant presence change for the room's next presence update to control.
+    Pass the participant for joins so control learns their name and avatar.
+    """
+    with _pending_presence_lock:
+        pending = _pending_presence.get(room_code)
+        start_flush = pending is None
+        if start_flush:
+            pending = _pending_presence[room_code] = {'changes': {}, 'joined': {}}
+        pending['changes'][participant_id] = connected
+        if participant:
+            pending['joined'][participant_id] = {
+                'name': participant.get('name'),
+                'avatar': participant.get('avatar')
+            }
+    if start_flush:
+        socketio.start_background_task(_flush_presence_changes, room_code)
+
+def _flush_presence_changes(room_code):
+    """Send a room's pending presence changes to control with live counts."""
+    socketio.sleep(PRESENCE_BATCH_INTERVAL)
+    with _pending_presence_lock:
+        pending = _pending_presence.pop(room_code, None)
+    if not pending:
+        return
+    
+    room = peek_room(room_code)
+    if not room:
+        return
+    broadcast_room_event(room_code, 'control', 'participant_presence', {
+        'changes': pending['changes'],
+        'joined': pending['joined'],
+        'connected': count_connected_participants(room),
+        'total': len(room.get('participants', {}))
+    })
 
 @socketio.on('quizmaster_start_quiz')
 def handle_start_quiz(data):
@@ -77,12 +158,12 @@ def handle_start_quiz(data):
     IMPORTANT: Must receive quiz_id (not quiz_name). Multiple quizzes can have the same name,
     so we always identify quizzes by their unique ID.
     """
-    print(f"[DEBUG] quizmaster_start_quiz received: {data}")
-    print(f"[DEBUG] Session data: username={session.get('username')}, is_quizmaster={session.get('is_quizmaster')}")
+    logger.debug("quizmaster_start_quiz received: %s", data)
+    logger.debug("Session data: username=%s, is_quizmaster=%s", session.get('username'), session.get('is_quizmaster'))
     
     quiz_id = data.get('quiz_id')
     if not quiz_id:
-        print("[ERROR] No quiz_id provided in request")
+        logger.error("No quiz_id provided in request")
         emit('error', {'message': 'Quiz ID required. Quiz name cannot be used - multiple quizzes can share the same name.'})
         return
     
@@ -90,13 +171,13 @@ def handle_start_quiz(data):
     from app.utils.quiz_storage import load_quiz
     quiz = load_quiz(quiz_id)
     if not quiz:
-        print(f"[ERROR] Quiz not found with ID: {quiz_id}")
+        logger.error("Quiz not found with ID: %s", quiz_id)
         emit('error', {'message': f'Quiz not found with ID: {quiz_id}'})
         return
     
     quizmaster_username = session.get('username', 'unknown')
     quiz_name = quiz.get('name', 'Unknown Quiz')  # Name is only for display
-    print(f"[DEBUG] Starting quiz '{quiz_name}' (ID: {quiz_id}) for quizmaster: {quizmaster_username}")
+    logger.debug("Starting quiz '%s' (ID: %s) for quizmaster: %s", quiz_name, quiz_id, quizmaster_username)
     
     # Initialize visibility states for all elements in all pages
     # This ensures display page respects control visibility settings from the start
@@ -116,14 +197,14 @@ def handle_start_quiz(data):
     
     # Create room (stores both quiz_id and quiz_name - quiz_id is the authoritative identifier)
     room_code = create_room(quiz_id, quiz_name, quiz, quizmaster_username)
-    print(f"[DEBUG] Room created with code: {room_code}")
+    logger.debug("Room created with code: %s", room_code)
     
     # Record quiz run start (use quiz_id, not quiz_name)
     from app.utils.stats import record_quiz_run
     import time
     record_quiz_run(quiz_id, quizmaster_username, room_code, completed=False)
     
-    print(f"[DEBUG] Emitting quiz_started with room_code: {room_code}")
+    logger.debug("Emitting quiz_started with room_code: %s", room_code)
     emit('quiz_started', {'room_code': room_code})
     
     # Join quizmaster to control room
@@ -161,6 +242,9 @@ def handle_quizmaster_join_control(data):
         return
     
     join_room(f'control_{room_code}')
+    register_socket(request.sid, room_code, 'control')
+    if _resume_session(room, 'control', data.get('resume')):
+        return
     
     # Get current page
     quiz = room.get('quiz', {})
@@ -169,12 +253,10 @@ def handle_quizmaster_join_control(data):
     current_page = pages[current_page_index] if current_page_index < len(pages) else None
     
     # Get participants dictionary for control page
-    participants_dict = {pid: {'name': p.get('name'), 'avatar': p.get('avatar')} 
+    participants_dict = {pid: {'name': p.get('name'), 'avatar': p.get('avatar'), 'connected': p.get('connected', False)}
                          for pid, p in room.get('participants', {}).items()}
     
-    # Debug: Log participant IDs being sent
-    print(f"[DEBUG] joined_control for room {room_code}: participant IDs = {list(participants_dict.keys())}")
-    print(f"[DEBUG] Total participants in room: {len(room.get('participants', {}))}")
+    logger.debug("joined_control for room %s: %s participants (%s)", room_code, len(participants_dict), participants_dict.keys())
     
     emit('joined_control', {
         'room_code': room_code,
@@ -183,7 +265,8 @@ def handle_quizmaster_join_control(data):
         'page': current_page,
         'scores': room.get('scores', {}),
         'participants': participants_dict,
-        'answers': room.get('answers', {})  # Send all submitted answers
+        'answers': room.get('answers', {}),  # Send all submitted answers
+        'resume': get_event_cursor(room)
     })
 
 @socketio.on('quizmaster_rerender_quiz')
@@ -228,6 +311,7 @@ def handle_quizmaster_rerender_quiz(data):
     
     # Update room's quiz data
     room['quiz'] = updated_quiz
+    bump_room_revision(room)
     # Update quiz_name in case it changed
     room['quiz_name'] = updated_quiz.get('name', 'Unknown Quiz')
     
@@ -263,7 +347,7 @@ def handle_quizmaster_rerender_quiz(data):
         room['current_page'] = 0
         room['page_start_time'] = time.time()
     
-    room['last_activity'] = time.time()
+    touch_room(room)
     save_room_state_now(room_code)
     
     # Clear TV display render cache so it gets fresh image
@@ -271,7 +355,7 @@ def handle_quizmaster_rerender_quiz(data):
         from app.utils.display_renderer import clear_cache
         clear_cache(room_code)
     except Exception as e:
-        print(f"Warning: Failed to clear TV display cache: {e}")
+        logger.warning("Failed to clear TV display cache: %s", e)
     
     # Get current page
     current_page = pages[current_page_index] if current_page_index < len(pages) else None
@@ -282,57 +366,71 @@ def handle_quizmaster_rerender_quiz(data):
     room_scores = room.get('scores', {})
     
     # Broadcast updated quiz to control view
-    emit('quiz_state', {
+    broadcast_room_event(room_code, 'control', 'quiz_state', {
         'quiz': updated_quiz,
         'current_page': current_page_index,
         'answers': room.get('answers', {})
-    }, room=f'control_{room_code}')
+    })
     
     # Also emit page_changed for control view (some handlers might listen to this)
-    emit('page_changed', {
+    broadcast_room_event(room_code, 'control', 'page_changed', {
         'page_index': current_page_index,
         'page': current_page,
         'quiz': updated_quiz
-    }, room=f'control_{room_code}')
+    })
     
     # Broadcast to display view
-    emit('display_state', {
+    broadcast_room_event(room_code, 'display', 'display_state', {
         'room_code': room_code,
         'current_page': current_page_index,
         'page': current_page,
         'quiz': updated_quiz,
         'participants': participants_dict,
         'scores': room_scores
-    }, room=f'display_{room_code}')
+    })
     
     # Also emit page_changed for display view
-    emit('page_changed', {
+    broadcast_room_event(room_code, 'display', 'page_changed', {
         'page_index': current_page_index,
         'page': current_page,
         'quiz': updated_quiz,
         'participants': participants_dict,
         'scores': room_scores
-    }, room=f'display_{room_code}')
+    })
     
     # Broadcast to participant views
-    emit('page_changed', {
+    broadcast_room_event(room_code, 'participant', 'page_changed', {
         'page_index': current_page_index,
         'page': current_page,
         'quiz': updated_quiz
-    }, room=f'participant_{room_code}')
+    })
 
 @socketio.on('participant_join')
 def handle_participant_join(data):
-    """Participant joins a quiz room."""
+    """
+    Participant joins a quiz room.
+    
+    Built for reconnect storms: joins are paced per room, pure reconnects
+    are not persisted, the room-wide part of the joined_room payload is
+    cached per room revision (and the quiz left out when the client already
+    has that revision), and control is told about joins in batches.
+    """
     room_code = data.get('room_code')
     name = data.get('name')
     avatar = data.get('avatar')
-    participant_id = data.get('participant_id')  # For rejoining (legacy support)
+    participant_id = data.get('participant_id')  # For rejoining
+    known_revision = data.get('revision')  # Room revision of the quiz the client already holds
     
     if not room_code:
         emit('error', {'message': 'Room code required'})
         return
     
+    # Smooth join bursts (e.g. every phone reconnecting after a Wi-Fi blip)
+    delay = _get_join_delay(room_code)
+    if delay > 0:
+        record_idle(delay)
+        socketio.sleep(delay)
+    
     room = get_room(room_code)
     if not room:
         emit('error', {'message': 'No such quiz is currently running'})
@@ -345,71 +443,45 @@ def handle_participant_join(data):
         emit('quiz_not_running', {'room_code': room_code})
         return
     
-    # Add participant
-    if participant_id:
-        # Rejoining with explicit participant_id (legacy support)
-        participant = room.get('participants', {}).get(participant_id)
-        if participant:
-            participant['connected'] = True
-            participant['socket_id'] = request.sid
-            room['last_activity'] = time.time()
-            # Save room state when participant rejoins
-            save_room_state_now(room_code)
-        else:
-            emit('error', {'message': 'Participant not found'})
-            return
-    else:
+    if not participant_id:
         # New participant - check if name+avatar combo already exists
         if not name or not avatar:
             emit('error', {'message': 'Name and avatar required'})
             return
-        
-        # Check if combo already exists
-        from app.utils.room_manager import find_participant_by_combo
-        existing_id = find_participant_by_combo(room_code, name, avatar)
-        if existing_id:
-            # Combo already exists - this is a rejoin
-            participant = room.get('participants', {}).get(existing_id)
-            if participant:
-                participant['connected'] = True
-                participant['socket_id'] = request.sid
-                participant_id = existing_id
-                room['last_activity'] = time.time()
-                save_room_state_now(room_code)
-            else:
-                emit('error', {'message': 'Participant profile found but data corrupted'})
+        participant_id = get_participant_id(name, avatar)
+    
+    participant = room.get('participants', {}).get(participant_id)
+    if participant:
+        # Rejoin (reconnect or the same name+avatar again) - presence is not persisted,
+        # so there is nothing to save
+        participant['connected'] = True
+        participant['socket_id'] = request.sid
+        touch_room(room)
+    elif data.get('participant_id'):
+        emit('error', {'message': 'Participant not found'})
+        return
+    else:
+        # New participant - try to add
+        if not add_participant(room_code, name, avatar, request.sid):
+            # Combo was taken between check and add (race condition) - treat as rejoin
+            participant = room.get('participants', {}).get(participant_id)
+            if not participant:
+                emit('error', {'message': 'This name and avatar combination is already taken. Please choose a different combination.'})
                 return
-        else:
-            # New participant - try to add
-            participant_id = add_participant(room_code, name, avatar, request.sid)
-            if not participant_id:
-                # Combo was taken between check and add (race condition) - treat as rejoin
-                existing_id = find_participant_by_combo(room_code, name, avatar)
-                if existing_id:
-                    participant = room.get('participants', {}).get(existing_id)
-                    participant['connected'] = True
-                    participant['socket_id'] = request.sid
-                    participant_id = existing_id
-                    room['last_activity'] = time.time()
-                    save_room_state_now(room_code)
-                else:
-                    emit('error', {'message': 'This name and avatar combination is already taken. Please choose a different combination.'})
-                    return
+            participant['connected'] = True
+            participant['socket_id'] = request.sid
+            touch_room(room)
+        participant = room.get('participants', {}).get(participant_id)
     
     # Join rooms
     join_room(f'participant_{room_code}')
     join_room(f'display_{room_code}')
+    register_socket(request.sid, room_code, 'participant', participant_id)
+    _queue_presence_change(room_code, participant_id, True, participant)
     
-    # Get current page data
-    quiz = room.get('quiz', {})
-    pages = quiz.get('pages', [])
-    current_page_index = room.get('current_page', 0)
-    current_page = pages[current_page_index] if current_page_index < len(pages) else None
-    
-    # Get participant info for the response
-    participant = room.get('participants', {}).get(participant_id)
-    participant_name = participant.get('name') if participant else name
-    participant_avatar = participant.get('avatar') if participant else avatar
+    # Brief reconnect - replay what the client missed instead of resending everything
+    if data.get('participant_id') and _resume_session(room, 'participant', data.get('resume')):
+        return
     
     # Get this participant's current score
     # Prefer room['scores'] if it exists, otherwise use participant['score'], or calculate if needed
@@ -420,7 +492,6 @@ def handle_participant_join(data):
         participant_score = participant['score']
     else:
         # Calculate score if not available
-        from app.utils.scoring import calculate_score
         scores = calculate_score(room)
         participant_score = scores.get(participant_id, 0)
     
@@ -432,25 +503,72 @@ def handle_participant_join(data):
             participant_answers[question_id] = question_answers[participant_id]
     
     # Send current state - always include current_page to ensure synchronization
-    emit('joined_room', {
-        'room_code': room_code,
+    payload = dict(_get_join_payload(room_code, room))
+    if known_revision is not None and known_revision == payload['revision']:
+        # The client already has this revision of the quiz
+        del payload['quiz']
+    payload.update({
         'participant_id': participant_id,
-        'participant_name': participant_name,
-        'participant_avatar': participant_avatar,
+        'participant_name': participant.get('name') if participant else name,
+        'participant_avatar': participant.get('avatar') if participant else avatar,
         'participant_score': participant_score,  # Include participant's current score
+        'submitted_answers': participant_answers,  # Send this participant's submitted answers
+        'resume': get_event_cursor(room)
+    })
+    emit('joined_room', payload)
+
+def _resume_session(room, role, resume):
+    """
+    Send a reconnecting client the room broadcasts it missed since its last
+    position. Returns False (sending nothing) if it needs a full snapshot.
+    """
+    missed = get_missed_events(room, role, resume)
+    if missed is None:
+        return False
+    emit('session_resumed', {
+        'events': missed,
+        'resume': get_event_cursor(room)
+    })
+    return True
+
+def _get_join_delay(room_code):
+    """
+    Seconds a join should wait so a room admits at most JOIN_RATE joins per
+    second after an initial burst of JOIN_BURST (generic cell rate algorithm).
+    """
+    with _join_schedule_lock:
+        now = time.monotonic()
+        if len(_join_schedule) > 1000:
+            # Drop rooms whose schedule has fully drained
+            for code in [code for code, tat in _join_schedule.items() if tat < now]:
+                del _join_schedule[code]
+        tat = max(_join_schedule.get(room_code, now), now)
+        _join_schedule[room_code] = tat + 1.0 / JOIN_RATE
+    return max(0.0, tat - now - JOIN_BURST / JOIN_RATE)
+
+def _get_join_payload(room_code, room):
+    """The room-wide part of joined_room, cached on the room until its revision changes."""
+    revision = room.get('revision', 0)
+    cached = room.get('join_payload')
+    hit = cached is not None and cached['revision'] == revision
+    metrics.count_cache('join_payload', hit)
+    if hit:
+        return cached
+    
+    quiz = room.get('quiz', {})
+    pages = quiz.get('pages', [])
+    current_page_index = room.get('current_page', 0)
+    payload = {
+        'room_code': room_code,
+        'revision': revision,
         'current_page': current_page_index,  # Always send to keep views in sync
-        'page': current_page,
+        'page': pages[current_page_index] if current_page_index < len(pages) else None,
         'quiz': quiz,
         'state': room.get('state', {}),
-        'submitted_answers': participant_answers  # Send this participant's submitted answers
-    })
-    
-    # Notify others
-    emit('participant_joined', {
-        'participant_id': participant_id,
-        'name': name or room['participants'][participant_id]['name'],
-        'avatar': avatar or room['participants'][participant_id]['avatar']
-    }, room=f'control_{room_code}')
+        'prefetch_media': get_prefetch_media(room, current_page_index)
+    }
+    room['join_payload'] = payload
+    return payload
 
 @socketio.on('display_join')
 def handle_display_join(data):
@@ -473,6 +591,9 @@ def handle_display_join(data):
         return
     
     join_room(f'display_{room_code}')
+    register_socket(request.sid, room_code, 'display')
+    if _resume_session(room, 'display', data.get('resume')):
+        return
     
     # Get current page data
     quiz = room.get('quiz', {})
@@ -480,14 +601,12 @@ def handle_display_join(data):
     current_page_index = room.get('current_page', 0)
     current_page = pages[current_page_index] if current_page_index < len(pages) else None
     
-    # Debug: Log what we're sending
-    print(f"[DEBUG] Display join for room {room_code}: quiz has {len(pages)} pages, current_page={current_page_index}")
-    if quiz:
-        print(f"[DEBUG] Quiz keys: {list(quiz.keys())}")
-    if current_page:
-        elements = current_page.get('elements', {})
-        elements_count = len(elements) if isinstance(elements, dict) else 0
-        print(f"[DEBUG] Current page type: {current_page.get('type')}, elements: {elements_count}")
+    if logger.isEnabledFor(logging.DEBUG):
+        elements = current_page.get('elements', {}) if current_page else {}
+        logger.debug("Display join for room %s: quiz has %s pages, current_page=%s (type %s, %s elements)",
+                     room_code, len(pages), current_page_index,
+                     current_page.get('type') if current_page else None,
+                     len(elements) if isinstance(elements, dict) else 0)
     
     # Get participants and scores for status page
     participants_dict = {pid: {'name': p.get('name'), 'avatar': p.get('avatar')}
@@ -517,7 +636,9 @@ def handle_display_join(data):
         'state': room.get('state', {}),
         'participants': participants_dict,
         'scores': scores,
-        'answer_overlay': answer_overlay_with_data  # Include overlay state
+        'prefetch_media': get_prefetch_media(room, current_page_index),
+        'answer_overlay': answer_overlay_with_data,  # Include overlay state
+        'resume': get_event_cursor(room)
     })
 
 @socketio.on('quizmaster_navigate')
@@ -558,7 +679,8 @@ def handle_navigate(data):
     # Reset question start times when page changes
     if 'question_start_times' not in room:
         room['question_start_times'] = {}
-    room['last_activity'] = time.time()
+    touch_room(room)
+    bump_room_revision(room)
     
     # Preserve visibility states when navigating - only set defaults if not already set
     # This ensures user-set visibility toggles are preserved when navigating between pages
@@ -586,40 +708,46 @@ def handle_navigate(data):
         from app.utils.display_renderer import clear_cache
         clear_cache(room_code)
     except Exception as e:
-        print(f"Warning: Failed to clear TV display cache: {e}")
+        logger.warning("Failed to clear TV display cache: %s", e)
     
     # Get participants and scores for status page
     participants_dict = {pid: {'name': p.get('name'), 'avatar': p.get('avatar')}
                           for pid, p in room.get('participants', {}).items()}
     room_scores = room.get('scores', {})
     
+    # Media of the next page, so clients can fetch it while this page is showing
+    prefetch_media = get_prefetch_media(room, new_index)
+    
     # Broadcast to all views
-    emit('page_changed', {
+    broadcast_room_event(room_code, 'display', 'page_changed', {
         'page_index': new_index,
         'page': current_page,
         'quiz': quiz,
         'participants': participants_dict,
-        'scores': room_scores
-    }, room=f'display_{room_code}')
+        'scores': room_scores,
+        'prefetch_media': prefetch_media
+    })
     
-    emit('page_changed', {
+    broadcast_room_event(room_code, 'participant', 'page_changed', {
         'page_index': new_index,
         'page': current_page,
-        'quiz': quiz
-    }, room=f'participant_{room_code}')
+        'quiz': quiz,
+        'prefetch_media': prefetch_media
+    })
     
-    emit('page_changed', {
+    broadcast_room_event(room_code, 'control', 'page_changed', {
         'page_index': new_index,
         'page': current_page,
-        'quiz': room.get('quiz')  # Include full quiz for all elements
-    }, room=f'control_{room_code}')
+        'quiz': room.get('quiz'),  # Include full quiz for all elements
+        'prefetch_media': prefetch_media
+    })
     
     # Also send quiz_state to control to ensure it has all data
-    emit('quiz_state', {
+    broadcast_room_event(room_code, 'control', 'quiz_state', {
         'quiz': room.get('quiz'),
         'current_page': new_index,
         'answers': room.get('answers', {})  # Include answers
-    }, room=f'control_{room_code}')
+    })
 
 @socketio.on('question_visible')
 def handle_question_visible(data):
@@ -641,26 +769,53 @@ def handle_question_visible(data):
     # Only set the start time if it hasn't been set yet (first time question becomes visible)
     if question_id not in room['question_start_times']:
         room['question_start_times'][question_id] = time.time()
-        room['last_activity'] = time.time()
+        touch_room(room)
         save_room_state_now(room_code)
 
 @socketio.on('participant_submit_answer')
 def handle_submit_answer(data):
-    """Participant submits an answer."""
+    """
+    Participant submits an answer.
+    
+    The answer is recorded in memory and acknowledged straight away; control
+    receives it with the next answer batch. Submissions carry a client
+    submission_id so retries are acknowledged without being recorded again;
+    ANSWER_SUBMISSION_POLICY decides whether a different later answer
+    replaces the first one.
+    """
     room_code = data.get('room_code')
     participant_id = data.get('participant_id')
     question_id = data.get('question_id')
     answer = data.get('answer')
     answer_type = data.get('answer_type')
+    submission_id = data.get('submission_id')  # Client-generated, reused when retrying
+    seq = data.get('seq')  # Client sequence number (orders submissions under last-answer-wins)
+    if not isinstance(seq, (int, float)) or isinstance(seq, bool):
+        seq = None
     
     if not all([room_code, participant_id, question_id, answer is not None]):
         emit('error', {'message': 'Missing required fields'})
-        return
+        return {'success': False, 'error': 'Missing required fields'}
     
     room = get_room(room_code)
     if not room:
         emit('error', {'message': 'Room not found'})
-        return
+        return {'success': False, 'error': 'Room not found'}
+    
+    # Store answer
+    if 'answers' not in room:
+        room['answers'] = {}
+    
+    if question_id not in room['answers']:
+        room['answers'][question_id] = {}
+    
+    # Resubmissions (flaky connections retrying, reconnects) must not rewrite
+    # the recorded answer or its submission time
+    existing = room['answers'][question_id].get(participant_id)
+    if existing:
+        status = _check_resubmission(existing, submission_id, seq)
+        if status:
+            return _ack_answer(question_id, submission_id, status, existing)
     
     # Record submission time - use question-specific start time if available,
     # otherwise fall back to page_start_time
@@ -673,28 +828,27 @@ def handle_submit_answer(data):
     
     submission_time = time.time() - question_start_time
     
-    # Store answer
-    if 'answers' not in room:
-        room['answers'] = {}
-    
-    if question_id not in room['answers']:
-        room['answers'][question_id] = {}
-    
-    room['answers'][question_id][participant_id] = {
+    timestamp = time.time()
+    record = {
         'answer': answer,
         'submission_time': submission_time,
-        'timestamp': time.time(),
+        'timestamp': timestamp,
         'correct': False,
         'bonus_points': 0
     }
-    room['last_activity'] = time.time()
-    # Save room state when answers are submitted
-    save_room_state_now(room_code)
+    if submission_id:
+        record['submission_id'] = submission_id
+    if seq is not None:
+        record['seq'] = seq
+    room['answers'][question_id][participant_id] = record
+    touch_room(room)
+    answer_logger.info("Answer from %s for question %s in room %s after %.1fs",
+                       participant_id, question_id, room_code, submission_time)
     
     participant = room.get('participants', {}).get(participant_id)
     
-    # Notify quizmaster
-    emit('answer_submitted', {
+    # Control is notified (and the room saved) by the next answer batch
+    _queue_answer_for_control(room_code, {
         'participant_id': participant_id,
         'participant_name': participant.get('name') if participant else 'Unknown',
         'participant_avatar': participant.get('avatar') if participant else '👤',
@@ -702,20 +856,77 @@ def handle_submit_answer(data):
         'answer': answer,
         'answer_type': answer_type,
         'submission_time': submission_time,
-        'timestamp': time.time()
-    }, room=f'control_{room_code}')
+        'timestamp': timestamp
+    })
     
-    # Also send updated participants list to control for answer display
-    participants_dict_update = {pid: {'name': p.get('name'), 'avatar': p.get('avatar')} 
-                               for pid, p in room.get('participants', {}).items()}
+    return _ack_answer(question_id, submission_id, 'accepted', record)
+
+def _check_resubmission(existing, submission_id, seq):
+    """
+    Decide what to do with an answer for a question the participant already answered.
+    
+    Returns:
+        'duplicate' (same submission seen before), 'ignored' (a different
+        submission the answer policy rejects) or None to record it
+    """
+    if submission_id and existing.get('submission_id') == submission_id:
+        return 'duplicate'
     
-    # Debug: Log participant IDs being sent
-    print(f"[DEBUG] participant_list_update for room {room_code}: participant IDs = {list(participants_dict_update.keys())}")
-    print(f"[DEBUG] Total participants in room: {len(room.get('participants', {}))}")
+    if current_app.config.get('ANSWER_SUBMISSION_POLICY', 'first') != 'last':
+        # First answer wins
+        return 'ignored'
     
-    emit('participant_list_update', {
-        'participants': participants_dict_update
-    }, room=f'control_{room_code}')
+    # Last answer wins - unless this is an older submission arriving late
+    if seq is not None and existing.get('seq') is not None and seq <= existing['seq']:
+        return 'ignored'
+    return None
+
+def _ack_answer(question_id, submission_id, status, record):
+    """Acknowledge a submission to the participant (answer_ack event and Socket.IO ack)."""
+    ack = {
+        'success': True,
+        'status': status,
+        'question_id': question_id,
+        'submission_id': submission_id,
+        'answer': record.get('answer'),
+        'submission_time': record.get('submission_time')
+    }
+    emit('answer_ack', ack)
+    return ack
+
+def _queue_answer_for_control(room_code, entry):
+    """Add an answer to the room's pending control batch, starting a flush if none is due."""
+    with _pending_answers_lock:
+        batch = _pending_answers.get(room_code)
+        if batch is not None:
+            batch.append(entry)
+            return
+        _pending_answers[room_code] = [entry]
+    socketio.start_background_task(_flush_answer_batch, room_code)
+
+def _flush_answer_batch(room_code):
+    """Send a room's pending answers to control in one event and persist the room once."""
+    socketio.sleep(ANSWER_BATCH_INTERVAL)
+    with _pending_answers_lock:
+        batch = _pending_answers.pop(room_code, None)
+    if not batch:
+        return
+    
+    try:
+        room = get_room(room_code)
+        room_answers = room.get('answers', {}) if room else {}
+        counts = {question_id: len(room_answers.get(question_id, {}))
+                  for question_id in {entry['question_id'] for entry in batch}}
+        
+        broadcast_room_event(room_code, 'control', 'answers_submitted', {
+            'answers': batch,
+            'counts': counts
+        })
+        
+        # Save room state once per batch rather than once per answer
+        save_room_state_now(room_code)
+    except Exception as e:
+        logger.warning("Failed to flush answers for room %s: %s", room_code, e)
 
 @socketio.on('quizmaster_mark_answer')
 def handle_mark_answer(data):
@@ -754,7 +965,7 @@ def handle_mark_answer(data):
     # Recalculate scores for all participants
     scores = calculate_score(room)
     room['scores'] = scores
-    room['last_activity'] = time.time()
+    touch_room(room)
     
     # Update all participant scores in the participants dictionary
     for pid, participant in room.get('participants', {}).items():
@@ -768,20 +979,20 @@ def handle_mark_answer(data):
         from app.utils.display_renderer import clear_cache
         clear_cache(room_code)
     except Exception as e:
-        print(f"Warning: Failed to clear TV display cache: {e}")
+        logger.warning("Failed to clear TV display cache: %s", e)
     
     # Broadcast score update
-    emit('score_updated', {
+    broadcast_room_event(room_code, 'participant', 'score_updated', {
         'scores': scores,
         'participant_id': participant_id,
         'question_id': question_id
-    }, room=f'participant_{room_code}')
+    })
     
-    emit('score_updated', {
+    broadcast_room_event(room_code, 'control', 'score_updated', {
         'scores': scores,
         'participant_id': participant_id,
         'question_id': question_id
-    }, room=f'control_{room_code}')
+    })
 
 @socketio.on('quizmaster_control_element')
 def handle_control_element(data):
@@ -800,17 +1011,17 @@ def handle_control_element(data):
     
     # Broadcast to display FIRST (before any blocking operations)
     # This ensures immediate response for play/pause actions
-    emit('element_control', {
+    broadcast_room_event(room_code, 'display', 'element_control', {
         'element_id': element_id,
         'action': action
-    }, room=f'display_{room_code}')
+    })
     
     # Also broadcast to control room so media controls update
     if action in ['play', 'pause']:
-        emit('element_media_control', {
+        broadcast_room_event(room_code, 'control', 'element_media_control', {
             'element_id': element_id,
             'playing': action == 'play'
-        }, room=f'control_{room_code}')
+        })
     
     # Update media playing state AFTER broadcasting (non-blocking for user experience)
     # This happens in the background and doesn't delay the play action
@@ -826,6 +1037,8 @@ def handle_control_element(data):
                                element.get('media_type') in ['audio', 'video'])
                     if is_media:
                         element['media_playing'] = (action == 'play')
+                        touch_room(room)
+                        bump_room_revision(room)
                         # Save room state after broadcast (non-blocking)
                         save_room_state_now(room_code)  # Persist the change
                     break
@@ -836,7 +1049,7 @@ def handle_control_element(data):
             from app.utils.display_renderer import clear_cache
             clear_cache(room_code)
         except Exception as e:
-            print(f"Warning: Failed to clear TV display cache: {e}")
+            logger.warning("Failed to clear TV display cache: %s", e)
 
 @socketio.on('media_finished')
 def handle_media_finished(data):
@@ -848,10 +1061,10 @@ def handle_media_finished(data):
         return
     
     # Broadcast to control room to update play/pause button
-    emit('element_media_control', {
+    broadcast_room_event(room_code, 'control', 'element_media_control', {
         'element_id': element_id,
         'playing': False
-    }, room=f'control_{room_code}')
+    })
     
     # Update media playing state in room data
     room = get_room(room_code)
@@ -865,6 +1078,8 @@ def handle_media_finished(data):
                            element.get('media_type') in ['audio', 'video'])
                 if is_media:
                     element['media_playing'] = False
+                    touch_room(room)
+                    bump_room_revision(room)
                     # Save room state after broadcast (non-blocking)
                     save_room_state_now(room_code)  # Persist the change
                 break
@@ -906,26 +1121,26 @@ def handle_control_element_appearance(data):
         from app.utils.display_renderer import clear_cache
         clear_cache(room_code)
     except Exception as e:
-        print(f"Warning: Failed to clear TV display cache: {e}")
+        logger.warning("Failed to clear TV display cache: %s", e)
     
     # Broadcast to display
-    emit('element_appearance_control', {
+    broadcast_room_event(room_code, 'display', 'element_appearance_control', {
         'element_id': element_id,
         'visible': visible
-    }, room=f'display_{room_code}')
+    })
     
     # Also broadcast to control room so toggles update
-    emit('element_appearance_control', {
+    broadcast_room_event(room_code, 'control', 'element_appearance_control', {
         'element_id': element_id,
         'visible': visible
-    }, room=f'control_{room_code}')
+    })
     
     # Broadcast to participant room so answer elements can be hidden/shown
     # When a question element is hidden on display, its answer should be hidden on participant page
-    emit('element_appearance_control', {
+    broadcast_room_event(room_code, 'participant', 'element_appearance_control', {
         'element_id': element_id,
         'visible': visible
-    }, room=f'participant_{room_code}')
+    })
 
 @socketio.on('element_appearance_changed')
 def handle_element_appearance_changed(data):
@@ -957,25 +1172,25 @@ def handle_element_appearance_changed(data):
         from app.utils.display_renderer import clear_cache
         clear_cache(room_code)
     except Exception as e:
-        print(f"Warning: Failed to clear TV display cache: {e}")
+        logger.warning("Failed to clear TV display cache: %s", e)
     
     # Broadcast to control room so toggles update (timer-based visibility change)
-    emit('element_appearance_control', {
+    broadcast_room_event(room_code, 'control', 'element_appearance_control', {
         'element_id': element_id,
         'visible': visible
-    }, room=f'control_{room_code}')
+    })
     
     # Broadcast to display room so element becomes visible (triggered by control toggle change)
-    emit('element_appearance_control', {
+    broadcast_room_event(room_code, 'display', 'element_appearance_control', {
         'element_id': element_id,
         'visible': visible
-    }, room=f'display_{room_code}')
+    })
     
     # Broadcast to participant room so answer elements appear when questions appear on display
-    emit('element_appearance_changed', {
+    broadcast_room_event(room_code, 'participant', 'element_appearance_changed', {
         'element_id': element_id,
         'visible': visible
-    }, room=f'participant_{room_code}')
+    })
 
 @socketio.on('stopwatch_start_trigger')
 def handle_stopwatch_start_trigger(data):
@@ -991,10 +1206,10 @@ def handle_stopwatch_start_trigger(data):
         return
     
     # Broadcast to participant room to start the stopwatch
-    emit('stopwatch_start', {
+    broadcast_room_event(room_code, 'participant', 'stopwatch_start', {
         'question_id': question_id,
         'trigger_type': trigger_type
-    }, room=f'participant_{room_code}')
+    })
 
 @socketio.on('quizmaster_toggle_answer_display')
 def handle_toggle_answer_display(data):
@@ -1044,6 +1259,7 @@ def handle_toggle_answer_display(data):
     else:
         # Clear overlay state
         room['answer_overlay'] = {}
+    touch_room(room)
     
     # Save room state
     save_room_state_now(room_code)
@@ -1053,10 +1269,10 @@ def handle_toggle_answer_display(data):
         from app.utils.display_renderer import clear_cache
         clear_cache(room_code)
     except Exception as e:
-        print(f"Warning: Failed to clear TV display cache: {e}")
+        logger.warning("Failed to clear TV display cache: %s", e)
     
     # Broadcast to display room
-    emit('answer_display_toggle', {
+    broadcast_room_event(room_code, 'display', 'answer_display_toggle', {
         'question_id': question_id,
         'visible': visible,
         'questionTitle': data.get('questionTitle', 'Question'),
@@ -1066,7 +1282,7 @@ def handle_toggle_answer_display(data):
         'imageSrc': data.get('imageSrc'),
         'answerVisibility': answer_visibility,
         'correctAnswer': correct_answer
-    }, room=f'display_{room_code}')
+    })
 
 @socketio.on('quizmaster_end_quiz')
 def handle_end_quiz(data):
@@ -1086,7 +1302,7 @@ def handle_end_quiz(data):
         scores = calculate_score(room)
         room['scores'] = scores
         room['ended'] = True
-        room['last_activity'] = time.time()
+        touch_room(room)
         # Don't save state - we're about to delete the room file
         
         # Record quiz run completion (use quiz_id, not quiz_name)
@@ -1094,23 +1310,29 @@ def handle_end_quiz(data):
         quiz_id = room.get('quiz_id')
         quizmaster_username = room.get('quizmaster', session.get('username', 'unknown'))
         if quiz_id:
-            record_quiz_run(quiz_id, quizmaster_username, room_code, completed=True)
+            record_quiz_run(quiz_id, quizmaster_username, room_code, completed=True,
+                            participant_count=len(room.get('participants', {})),
+                            answer_count=sum(len(a) for a in room.get('answers', {}).values()))
+        
+        # Archive per-question analytics in the background (answers are dropped with the room)
+        from app.utils.analytics import schedule_run_archive
+        schedule_run_archive(room)
         
         # Broadcast end to all
-        emit('quiz_ended', {
+        broadcast_room_event(room_code, 'display', 'quiz_ended', {
             'scores': scores,
             'final_rankings': get_final_rankings(room)
-        }, room=f'display_{room_code}')
+        })
         
-        emit('quiz_ended', {
+        broadcast_room_event(room_code, 'participant', 'quiz_ended', {
             'scores': scores,
             'final_rankings': get_final_rankings(room)
-        }, room=f'participant_{room_code}')
+        })
         
-        emit('quiz_ended', {
+        broadcast_room_event(room_code, 'control', 'quiz_ended', {
             'scores': scores,
             'final_rankings': get_final_rankings(room)
-        }, room=f'control_{room_code}')
+        })
         
         # Disconnect all clients from the rooms
         close_room(f'display_{room_code}')
@@ -1140,7 +1362,7 @@ def handle_finalize_scores(data):
     
     scores = calculate_score(room)
     room['scores'] = scores
-    room['last_activity'] = time.time()
+    touch_room(room)
     
     # Update all participant scores in the participants dictionary
     for pid, participant in room.get('participants', {}).items():
@@ -1154,7 +1376,7 @@ def handle_finalize_scores(data):
         from app.utils.display_renderer import clear_cache
         clear_cache(room_code)
     except Exception as e:
-        print(f"Warning: Failed to clear TV display cache: {e}")
+        logger.warning("Failed to clear TV display cache: %s", e)
     
     # Get final rankings
     final_rankings = get_final_rankings(room)
@@ -1163,24 +1385,24 @@ def handle_finalize_scores(data):
     winner_id = final_rankings[0]['id'] if final_rankings else None
     
     # Broadcast final scores to display page
-    emit('final_scores_finalized', {
+    broadcast_room_event(room_code, 'display', 'final_scores_finalized', {
         'final_rankings': final_rankings,
         'scores': scores
-    }, room=f'display_{room_code}')
+    })
     
     # Broadcast to control page
-    emit('final_scores_finalized', {
+    broadcast_room_event(room_code, 'control', 'final_scores_finalized', {
         'final_rankings': final_rankings,
         'scores': scores
-    }, room=f'control_{room_code}')
+    })
     
     # Broadcast winner event to participants
     if winner_id:
-        emit('winner_announced', {
+        broadcast_room_event(room_code, 'participant', 'winner_announced', {
             'winner_id': winner_id,
             'final_rankings': final_rankings,
             'scores': scores
-        }, room=f'participant_{room_code}')
+        })
 
 def get_final_rankings(room):
     """Get final rankings sorted by score."""
@@ -5,7 +5,8 @@ window.socket = socket; // Make socket available globally for question type view
 let currentPageIndex = 0;
 let quiz = null;
 let answers = {}; // { question_id: { participant_id: { answer, submission_time, correct, bonus_points } } }
-let participants = {}; // { participant_id: { name, avatar } }
+let participants = {}; // { participant_id: { name, avatar, connected } }
+let sessionResume = null; // Last room broadcast seen ({ epoch, seq }) - lets reconnects replay only missed events
 // Answer visibility state: { question_id: { participant_ids: [participant_id], control_answer: boolean } }
 // Store on window so it's accessible from control view renderers
 window.answerVisibility = {}; // { question_id: { visibleParticipants: Set, controlAnswerVisible: boolean } }
@@ -36,17 +37,37 @@ document.addEventListener('DOMContentLoaded', () => {
 
     socket.on('connect', () => {
         console.log('[Control] Socket connected via', socket.io.engine.transport.name);
-        socket.emit('quizmaster_join_control', { room_code: window.roomCode });
+        socket.emit('quizmaster_join_control', { room_code: window.roomCode, resume: sessionResume });
     });
 
     socket.on('disconnect', (reason) => {
         console.warn('[Control] Socket disconnected:', reason);
     });
 
+    // Track the last room broadcast seen so a reconnect only needs what was missed meanwhile
+    socket.onAny((event, data) => {
+        if (sessionResume && data && typeof data.seq === 'number' && data.seq > sessionResume.seq) {
+            sessionResume.seq = data.seq;
+        }
+    });
+
+    // Brief reconnect - the server replays the broadcasts we missed instead of a full state dump
+    socket.on('session_resumed', (data) => {
+        data.events.forEach(entry => {
+            if (sessionResume && entry.seq <= sessionResume.seq) {
+                return; // Already received live
+            }
+            socket.listeners(entry.event).forEach(listener => listener(entry.data));
+        });
+        sessionResume = data.resume;
+        console.log('[Control] Session resumed,', data.events.length, 'missed events replayed');
+    });
+
     socket.on('joined_control', (data) => {
         if (data.quiz) {
             quiz = data.quiz;
         }
+        sessionResume = data.resume || null;
         // Always use server's current_page to stay in sync
         if (data.current_page !== undefined) {
             currentPageIndex = data.current_page;
@@ -54,6 +75,7 @@ document.addEventListener('DOMContentLoaded', () => {
         // Update participants from initial join if provided
         if (data.participants) {
             participants = data.participants;
+            updatePresenceIndicator();
         }
         // Load all submitted answers from server
         if (data.answers) {
@@ -91,111 +113,91 @@ document.addEventListener('DOMContentLoaded', () => {
         updateNavigationButtons();
     });
     
-    socket.on('participant_joined', (data) => {
-        // Add/update single participant
-        if (data.participant_id) {
-            participants[data.participant_id] = {
-                name: data.name,
-                avatar: data.avatar
+    // Participant joins and connects/disconnects (batched on the server, with live counts)
+    socket.on('participant_presence', (data) => {
+        const joined = data.joined || {};
+        Object.entries(data.changes || {}).forEach(([participantId, connected]) => {
+            if (participants[participantId]) {
+                participants[participantId].connected = connected;
+            }
+        });
+        
+        const newParticipantIds = Object.keys(joined).filter(participantId => !participants[participantId]);
+        Object.entries(joined).forEach(([participantId, info]) => {
+            participants[participantId] = {
+                name: info.name,
+                avatar: info.avatar,
+                connected: true
             };
-            // Add new participant to visibility sets for all questions (default: visible)
-            if (!window.answerVisibility) {
-                window.answerVisibility = {};
+        });
+        updatePresenceIndicator(data.connected, data.total);
+        if (newParticipantIds.length === 0) {
+            return;
+        }
+        
+        // Add new participants to visibility sets for all questions (default: visible)
+        if (!window.answerVisibility) {
+            window.answerVisibility = {};
+        }
+        Object.keys(window.answerVisibility).forEach(questionId => {
+            if (!window.answerVisibility[questionId].visibleParticipants) {
+                window.answerVisibility[questionId].visibleParticipants = new Set();
             }
-            // Add to all existing question visibility sets
-            Object.keys(window.answerVisibility).forEach(questionId => {
-                if (!window.answerVisibility[questionId].visibleParticipants) {
-                    window.answerVisibility[questionId].visibleParticipants = new Set();
-                }
-                window.answerVisibility[questionId].visibleParticipants.add(data.participant_id);
+            newParticipantIds.forEach(participantId => {
+                window.answerVisibility[questionId].visibleParticipants.add(participantId);
             });
-            // Update answer displays for all questions to show new participant
-            // Don't call loadPage() as it re-renders everything including appearance control,
-            // which would reset visibility toggles. Instead, update only answer displays.
-            if (quiz && quiz.pages && quiz.pages[currentPageIndex]) {
-                const page = quiz.pages[currentPageIndex];
-                const elementsDict = page.elements || {};
-                // Find all question elements and update their answer displays
-                if (page.views && page.views.display && page.views.display.local_element_configs) {
-                    const displayLocalConfigs = page.views.display.local_element_configs || {};
-                    Object.keys(displayLocalConfigs).forEach(elementId => {
-                        const elementData = elementsDict[elementId];
-                        if (elementData && elementData.is_question) {
-                            updateAnswerDisplay(elementId);
-                        }
-                    });
-                }
+        });
+        // Update answer displays for all questions to show new participants
+        // Don't call loadPage() as it re-renders everything including appearance control,
+        // which would reset visibility toggles. Instead, update only answer displays.
+        if (quiz && quiz.pages && quiz.pages[currentPageIndex]) {
+            const page = quiz.pages[currentPageIndex];
+            const elementsDict = page.elements || {};
+            // Find all question elements and update their answer displays
+            if (page.views && page.views.display && page.views.display.local_element_configs) {
+                const displayLocalConfigs = page.views.display.local_element_configs || {};
+                Object.keys(displayLocalConfigs).forEach(elementId => {
+                    const elementData = elementsDict[elementId];
+                    if (elementData && elementData.is_question) {
+                        updateAnswerDisplay(elementId);
+                    }
+                });
             }
         }
     });
-    
-    socket.on('participant_list_update', (data) => {
-        if (data.participants) {
-            // Replace entire participants object to ensure consistency with server
-            const oldParticipantIds = new Set(Object.keys(participants));
-            participants = data.participants;
-            const newParticipantIds = new Set(Object.keys(participants));
-            
-            // Update visibility sets: add new participants, remove removed participants
-            if (!window.answerVisibility) {
-                window.answerVisibility = {};
+
+    // Answers arrive in batches (one event per ~100ms burst of submissions)
+    socket.on('answers_submitted', (data) => {
+        const updatedQuestions = new Set();
+        (data.answers || []).forEach(entry => {
+            if (!answers[entry.question_id]) {
+                answers[entry.question_id] = {};
             }
-            Object.keys(window.answerVisibility).forEach(questionId => {
-                const visibility = window.answerVisibility[questionId];
-                if (!visibility.visibleParticipants) {
-                    visibility.visibleParticipants = new Set();
-                }
-                // Add new participants (default: visible)
-                newParticipantIds.forEach(pid => {
-                    if (!oldParticipantIds.has(pid)) {
-                        visibility.visibleParticipants.add(pid);
-                    }
-                });
-                // Remove participants that left
-                oldParticipantIds.forEach(pid => {
-                    if (!newParticipantIds.has(pid)) {
-                        visibility.visibleParticipants.delete(pid);
+            answers[entry.question_id][entry.participant_id] = {
+                answer: entry.answer,
+                submission_time: entry.submission_time,
+                timestamp: entry.timestamp,
+                correct: false,
+                bonus_points: 0
+            };
+            // Participants normally arrive via participant_presence - fill any gap from the answer
+            if (!participants[entry.participant_id]) {
+                participants[entry.participant_id] = {
+                    name: entry.participant_name,
+                    avatar: entry.participant_avatar
+                };
+                Object.values(window.answerVisibility || {}).forEach(visibility => {
+                    if (!visibility.visibleParticipants) {
+                        visibility.visibleParticipants = new Set();
                     }
+                    visibility.visibleParticipants.add(entry.participant_id);
                 });
-            });
-            
-            // Update answer displays for all questions to show updated participant list
-            // Don't call loadPage() as it re-renders everything including appearance control,
-            // which would reset visibility toggles. Instead, update only answer displays.
-            if (quiz && quiz.pages && quiz.pages[currentPageIndex]) {
-                const page = quiz.pages[currentPageIndex];
-                const elementsDict = page.elements || {};
-                // Find all question elements and update their answer displays
-                if (page.views && page.views.display && page.views.display.local_element_configs) {
-                    const displayLocalConfigs = page.views.display.local_element_configs || {};
-                    Object.keys(displayLocalConfigs).forEach(elementId => {
-                        const elementData = elementsDict[elementId];
-                        if (elementData && elementData.is_question) {
-                            updateAnswerDisplay(elementId);
-                        }
-                    });
-                }
             }
-        }
-    });
-
-    socket.on('answer_submitted', (data) => {
-        console.log('[Control] Answer submitted event received:', data);
-        // Store answer
-        if (!answers[data.question_id]) {
-            answers[data.question_id] = {};
-        }
-        answers[data.question_id][data.participant_id] = {
-            answer: data.answer,
-            submission_time: data.submission_time,
-            timestamp: data.timestamp,
-            correct: false,
-            bonus_points: 0
-        };
+            updatedQuestions.add(entry.question_id);
+        });
         
-        // Update answer display if we're on the page with this question
-        console.log('[Control] Updating answer display for question:', data.question_id);
-        updateAnswerDisplay(data.question_id);
+        // Update each affected answer display once per batch
+        updatedQuestions.forEach(questionId => updateAnswerDisplay(questionId));
     });
 
     socket.on('score_updated', (data) => {
@@ -814,6 +816,16 @@ function updateAnswerDisplay(questionId) {
     }
 }
 
+function updatePresenceIndicator(connected, total) {
+    const indicator = document.getElementById('presence-indicator');
+    if (!indicator) return;
+    
+    const all = Object.values(participants || {});
+    if (total === undefined) total = all.length;
+    if (connected === undefined) connected = all.filter(p => p.connected).length;
+    indicator.textContent = `${connected} of ${total} participants connected`;
+}
+
 function updateNavigationButtons() {
     const prevBtn = document.getElementById('prev-page-btn');
     const nextBtn = document.getElementById('next-page-btn');
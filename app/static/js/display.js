@@ -7,6 +7,7 @@ let currentPage = null;
 let quiz = null;
 let participants = {};
 let scores = {}; // Store scores from room file
+let sessionResume = null; // Last room broadcast seen ({ epoch, seq }) - lets reconnects replay only missed events
 let scaleContent = true; // Track if we should scale content to fit window
 
 // Avatar utilities are now in avatar-utils.js (getAvatarEmoji function)
@@ -65,7 +66,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     socket.on('connect', () => {
         console.log('[Display] Socket connected via', socket.io.engine.transport.name);
-        socket.emit('display_join', { room_code: currentRoomCode });
+        socket.emit('display_join', { room_code: currentRoomCode, resume: sessionResume });
     });
 
     socket.on('disconnect', (reason) => {
@@ -74,6 +75,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Unified handler for both display_state and page_changed
     function handlePageUpdate(data) {
+        if (data.prefetch_media && window.UrlUtils) {
+            window.UrlUtils.prefetchMedia(data.prefetch_media);
+        }
         if (data.quiz) {
             quiz = data.quiz;
             // Expose quiz globally for MediaControlManager
@@ -98,6 +102,30 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Track the last room broadcast seen so a reconnect only needs what was missed meanwhile
+    socket.onAny((event, data) => {
+        if (sessionResume && data && typeof data.seq === 'number' && data.seq > sessionResume.seq) {
+            sessionResume.seq = data.seq;
+        }
+    });
+
+    // Brief reconnect - the server replays the broadcasts we missed instead of a full state dump
+    socket.on('session_resumed', (data) => {
+        data.events.forEach(entry => {
+            if (sessionResume && entry.seq <= sessionResume.seq) {
+                return; // Already received live
+            }
+            socket.listeners(entry.event).forEach(listener => listener(entry.data));
+        });
+        sessionResume = data.resume;
+        console.log('[Display] Session resumed,', data.events.length, 'missed events replayed');
+    });
+
+    socket.on('display_state', (data) => {
+        if (data.resume) {
+            sessionResume = data.resume;
+        }
+    });
     socket.on('display_state', handlePageUpdate);
     socket.on('page_changed', handlePageUpdate);
 
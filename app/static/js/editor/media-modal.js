@@ -223,7 +223,8 @@
             
             if (tabType === 'images') {
                 const img = document.createElement('img');
-                img.src = `/api/media/serve/${file.filename}`;
+                const thumbUrl = file.url || `/api/media/serve/${file.filename}`;
+                img.src = (window.APP_BASE_PATH || '') + thumbUrl + (thumbUrl.includes('?') ? '&' : '?') + 'variant=thumb';
                 img.style.width = '50px';
                 img.style.height = '50px';
                 img.style.objectFit = 'cover';
@@ -259,7 +260,7 @@
                     try {
                         mediaModalCallback({
                             media_type: mediaType,
-                            url: `/api/media/serve/${file.filename}`,
+                            url: file.url || `/api/media/serve/${file.filename}`,
                             filename: file.filename
                         });
                     } catch (error) {
@@ -272,21 +273,13 @@
         },
 
         uploadMediaFile: async function(file, type) {
-            const formData = new FormData();
-            formData.append('file', file);
-            formData.append('public', 'false');
-            
             try {
-                const response = await fetch((window.APP_BASE_PATH || '') + '/api/media/upload', {
-                    method: 'POST',
-                    body: formData
-                });
-                const data = await response.json();
-                if (!response.ok) {
-                    alert(`Error uploading ${file.name}: ${data.error}`);
+                const result = await window.uploadMediaFile(file, { public: false });
+                if (!result.ok) {
+                    alert(`Error uploading ${file.name}: ${result.data.error}`);
                     return { success: false };
                 }
-                return { success: true, filename: data.filename };
+                return { success: true, filename: result.data.filename };
             } catch (error) {
                 alert(`Error uploading ${file.name}`);
                 return { success: false };
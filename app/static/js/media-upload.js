@@ -0,0 +1,114 @@
+// Media upload utility - used by the quizmaster media tab and the editor media modal.
+// Small files are posted in one request; large files use the resumable (chunked)
+// upload API so a dropped connection only costs the chunk in flight.
+
+(function(window) {
+    'use strict';
+
+    // Files at least this big are uploaded in chunks
+    const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+    const MAX_CHUNK_RETRIES = 5;
+
+    function apiUrl(path) {
+        return (window.APP_BASE_PATH || '') + '/api/media' + path;
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function uploadWhole(file, isPublic) {
+        const formData = new FormData();
+        formData.append('file', file);
+        formData.append('public', isPublic ? 'true' : 'false');
+
+        const response = await fetch(apiUrl('/upload'), {
+            method: 'POST',
+            body: formData
+        });
+        const data = await response.json();
+        return { ok: response.ok, data: data };
+    }
+
+    async function uploadChunked(file, isPublic, onProgress) {
+        const startResponse = await fetch(apiUrl('/upload/start'), {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size, public: isPublic })
+        });
+        const startData = await startResponse.json();
+        if (!startResponse.ok) {
+            return { ok: false, data: startData };
+        }
+
+        const uploadId = startData.upload_id;
+        const chunkSize = startData.chunk_size || (1024 * 1024);
+        let offset = 0;
+        let retries = 0;
+
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + chunkSize);
+            try {
+                const response = await fetch(apiUrl(`/upload/${uploadId}?offset=${offset}`), {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: chunk
+                });
+                const data = await response.json();
+                if (response.ok || response.status === 409) {
+                    // 409: server has a different offset (e.g. a retried chunk already arrived)
+                    offset = data.offset;
+                    retries = 0;
+                    if (onProgress) onProgress(offset, file.size);
+                    continue;
+                }
+                if (response.status < 500) {
+                    return { ok: false, data: data };
+                }
+            } catch (error) {
+                // Network error - fall through to retry
+            }
+
+            if (++retries > MAX_CHUNK_RETRIES) {
+                return { ok: false, data: { error: 'Upload failed after repeated network errors' } };
+            }
+            await sleep(Math.min(1000 * Math.pow(2, retries - 1), 15000));
+
+            // Ask the server where to resume from
+            try {
+                const statusResponse = await fetch(apiUrl(`/upload/${uploadId}`));
+                if (statusResponse.ok) {
+                    offset = (await statusResponse.json()).offset;
+                }
+            } catch (error) {
+                // Still offline - retry from the last known offset
+            }
+        }
+
+        let completeResponse = await fetch(apiUrl(`/upload/${uploadId}/complete`), { method: 'POST' });
+        // 503: a stale retry of a chunk is still being received - wait for it to finish
+        for (let attempt = 1; completeResponse.status === 503 && attempt <= MAX_CHUNK_RETRIES; attempt++) {
+            await sleep(1000 * attempt);
+            completeResponse = await fetch(apiUrl(`/upload/${uploadId}/complete`), { method: 'POST' });
+        }
+        const completeData = await completeResponse.json();
+        return { ok: completeResponse.ok, data: completeData };
+    }
+
+    /**
+     * Upload a media file.
+     * @param {File} file - The file to upload
+     * @param {Object} options - { public: boolean, onProgress: function(sent, total) }
+     * @returns {Promise<{ok: boolean, data: Object}>} data holds filename or error
+     */
+    function uploadMediaFile(file, options) {
+        options = options || {};
+        if (file.size >= CHUNKED_UPLOAD_THRESHOLD) {
+            return uploadChunked(file, !!options.public, options.onProgress);
+        }
+        return uploadWhole(file, !!options.public);
+    }
+
+    window.uploadMediaFile = uploadMediaFile;
+
+})(window);
@@ -9,6 +9,12 @@ let participantName = null;
 let participantAvatar = null;
 let quiz = null;
 let submittedAnswers = {}; // Track submitted answers: { question_id: { answer, submission_time, ... } }
+let pendingSubmissions = {}; // Submissions not yet acknowledged by the server: { question_id: payload }
+let submissionSeq = 0; // Last submission sequence number used
+let sessionResume = null; // Last room broadcast seen ({ epoch, seq }) - lets reconnects replay only missed events
+let quizRevision = null; // Room revision the quiz was received at (lets rejoins skip resending it)
+const ANSWER_RETRY_DELAY = 3000; // ms before an unacknowledged submission is resent (doubles per attempt)
+const ANSWER_MAX_RETRY_DELAY = 30000;
 
 // Avatar utilities are now in avatar-utils.js (getAvatarEmoji function)
 
@@ -66,10 +72,13 @@ document.addEventListener('DOMContentLoaded', () => {
 
     socket.on('connect', () => {
         console.log('[Participant] Socket connected via', socket.io.engine.transport.name);
-        if (rejoinId) {
+        if (participantId || rejoinId) {
+            // Reconnect - the server skips sending the quiz again if our revision is current
             socket.emit('participant_join', {
                 room_code: window.roomCode,
-                participant_id: rejoinId
+                participant_id: participantId || rejoinId,
+                revision: quiz ? quizRevision : null,
+                resume: participantId ? sessionResume : null
             });
         } else {
             socket.emit('participant_join', {
@@ -84,9 +93,50 @@ document.addEventListener('DOMContentLoaded', () => {
         console.warn('[Participant] Socket disconnected:', reason);
     });
 
+    // Track the last room broadcast seen so a reconnect only needs what was missed meanwhile
+    socket.onAny((event, data) => {
+        if (sessionResume && data && typeof data.seq === 'number' && data.seq > sessionResume.seq) {
+            sessionResume.seq = data.seq;
+        }
+    });
+
+    // Brief reconnect - the server replays the broadcasts we missed instead of a full state dump
+    socket.on('session_resumed', (data) => {
+        data.events.forEach(entry => {
+            if (sessionResume && entry.seq <= sessionResume.seq) {
+                return; // Already received live
+            }
+            socket.listeners(entry.event).forEach(listener => listener(entry.data));
+        });
+        sessionResume = data.resume;
+        console.log('[Participant] Session resumed,', data.events.length, 'missed events replayed');
+        // Resend submissions the server has not acknowledged yet
+        Object.keys(pendingSubmissions).forEach(questionId => sendSubmission(questionId, 0));
+    });
+
+    // Server acknowledgement of an answer submission (also sent for retries of an already recorded answer)
+    socket.on('answer_ack', (data) => {
+        const pending = pendingSubmissions[data.question_id];
+        if (pending && pending.submission_id === data.submission_id) {
+            clearTimeout(pending.retryTimer);
+            delete pendingSubmissions[data.question_id];
+        }
+        if (data.status !== 'accepted' && data.answer !== undefined) {
+            // The server kept an earlier answer - show what actually counts
+            submittedAnswers[data.question_id] = {
+                answer: data.answer,
+                submission_time: data.submission_time,
+                timestamp: Date.now() / 1000
+            };
+        }
+    });
+
     socket.on('joined_room', (data) => {
         participantId = data.participant_id;
         sessionStorage.setItem('participant_id', participantId);
+        if (data.prefetch_media && window.UrlUtils) {
+            window.UrlUtils.prefetchMedia(data.prefetch_media);
+        }
         
         // Update participant info from server (especially for rejoins)
         if (data.participant_name) {
@@ -107,11 +157,27 @@ document.addEventListener('DOMContentLoaded', () => {
         if (data.quiz) {
             quiz = data.quiz;
         }
+        if (data.revision !== undefined) {
+            quizRevision = data.revision;
+        }
+        sessionResume = data.resume || null;
         
         // Load submitted answers from room file (stored on server)
         if (data.submitted_answers) {
             submittedAnswers = data.submitted_answers;
         }
+        // Keep (and resend) submissions the server has not acknowledged yet
+        Object.keys(pendingSubmissions).forEach(questionId => {
+            const pending = pendingSubmissions[questionId];
+            if (!submittedAnswers[questionId]) {
+                submittedAnswers[questionId] = {
+                    answer: pending.answer,
+                    submission_time: pending.submitted_at,
+                    timestamp: pending.submitted_at
+                };
+            }
+            sendSubmission(questionId, 0);
+        });
         
         // Always use server's current_page to stay in sync
         if (data.current_page !== undefined) {
@@ -141,6 +207,9 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     socket.on('page_changed', (data) => {
+        if (data.prefetch_media && window.UrlUtils) {
+            window.UrlUtils.prefetchMedia(data.prefetch_media);
+        }
         if (data.quiz) {
             quiz = data.quiz;
         }
@@ -466,6 +535,21 @@ function renderPage(pageIndex, page) {
 }
 
 
+// Send a pending submission and resend it (same submission_id) until the server acknowledges it
+function sendSubmission(questionId, attempt) {
+    const pending = pendingSubmissions[questionId];
+    if (!pending) return;
+    
+    clearTimeout(pending.retryTimer);
+    if (socket.connected) {
+        const { retryTimer, submitted_at, ...payload } = pending;
+        socket.emit('participant_submit_answer', payload);
+    }
+    // While disconnected, joined_room resends everything pending after reconnecting
+    const delay = Math.min(ANSWER_RETRY_DELAY * Math.pow(2, attempt), ANSWER_MAX_RETRY_DELAY);
+    pending.retryTimer = setTimeout(() => sendSubmission(questionId, attempt + 1), delay);
+}
+
 function submitAnswer(questionId, answerType, buttonElement, customAnswer = null) {
     if (!participantId) return;
     
@@ -503,13 +587,19 @@ function submitAnswer(questionId, answerType, buttonElement, customAnswer = null
     questionContainer.style.backgroundColor = '#f5f5f5';
     questionContainer.style.pointerEvents = 'none';
     
-    socket.emit('participant_submit_answer', {
+    // Sequence numbers keep increasing across page reloads
+    submissionSeq = Math.max(submissionSeq + 1, Date.now());
+    pendingSubmissions[questionId] = {
         room_code: window.roomCode,
         participant_id: participantId,
         question_id: questionId,
         answer: answer,
-        answer_type: answerType
-    });
+        answer_type: answerType,
+        submission_id: `${participantId}-${submissionSeq}`,
+        seq: submissionSeq,
+        submitted_at: Date.now() / 1000
+    };
+    sendSubmission(questionId, 0);
     
     // Disable submit buttons for this question
     if (buttonElement) {
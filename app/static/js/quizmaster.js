@@ -150,16 +150,32 @@ document.addEventListener('DOMContentLoaded', async () => {
 
         const formData = new FormData();
         formData.append('file', file);
+        // .zip files are quiz archives (several quizzes plus their media)
+        const isArchive = file.name.toLowerCase().endsWith('.zip');
+        const maxArchiveMb = parseInt(e.target.dataset.maxArchiveMb, 10);
+        if (isArchive && maxArchiveMb && file.size > maxArchiveMb * 1024 * 1024) {
+            alert(`This archive is too large to import (maximum ${maxArchiveMb} MB).`);
+            e.target.value = '';
+            return;
+        }
 
         try {
-            const response = await fetch(_base() + '/api/quiz/upload', {
+            const response = await fetch(_base() + (isArchive ? '/api/quiz/import' : '/api/quiz/upload'), {
                 method: 'POST',
                 body: formData
             });
 
             const data = await response.json();
             if (response.ok) {
-                alert('Quiz uploaded successfully!');
+                if (isArchive) {
+                    let message = `Imported ${data.quizzes.length} quiz(zes) and ${data.media} media file(s).`;
+                    if (data.skipped.length > 0) {
+                        message += '\n\nSkipped:\n' + data.skipped.map(s => `${s.name}: ${s.error}`).join('\n');
+                    }
+                    alert(message);
+                } else {
+                    alert('Quiz uploaded successfully!');
+                }
                 await loadQuizzes();
             } else {
                 alert('Error: ' + data.error);
@@ -167,6 +183,12 @@ document.addEventListener('DOMContentLoaded', async () => {
         } catch (error) {
             alert('Error uploading quiz');
         }
+        e.target.value = '';
+    });
+
+    // Export all own quizzes (with their media) as one archive
+    document.getElementById('export-quizzes-btn').addEventListener('click', () => {
+        window.location.href = _base() + '/api/quiz/export';
     });
 
     // Create user button
@@ -191,19 +213,10 @@ document.addEventListener('DOMContentLoaded', async () => {
         if (files.length === 0) return;
 
         for (const file of files) {
-            const formData = new FormData();
-            formData.append('file', file);
-            formData.append('public', 'false');
-
             try {
-                const response = await fetch(_base() + '/api/media/upload', {
-                    method: 'POST',
-                    body: formData
-                });
-
-                const data = await response.json();
-                if (!response.ok) {
-                    alert(`Error uploading ${file.name}: ${data.error}`);
+                const result = await window.uploadMediaFile(file, { public: false });
+                if (!result.ok) {
+                    alert(`Error uploading ${file.name}: ${result.data.error}`);
                 }
             } catch (error) {
                 alert(`Error uploading ${file.name}`);
@@ -629,7 +642,9 @@ async function loadUsers() {
                     <strong>${quizmaster.username}</strong>
                     <div style="color: #666; font-size: 0.9rem; margin-top: 0.25rem;">
                         Quizzes Created: ${quizmaster.quizzes_created} | 
-                        Quizzes Run: ${quizmaster.quizzes_run}
+                        Quizzes Run: ${quizmaster.quizzes_run} | 
+                        Participants Hosted: ${quizmaster.participants_hosted || 0} | 
+                        Answers Collected: ${quizmaster.answers_collected || 0}
                     </div>
                 </div>
             `;
@@ -1002,17 +1017,17 @@ function createMediaItem(file, currentUsername, isMyMedia) {
     const fileSize = formatFileSize(file.size);
     const fileType = getFileType(file.filename);
     const ext = file.filename.split('.').pop().toLowerCase();
-    const mediaUrl = `/api/media/serve/${file.filename}`;
-    const referenceCount = file.reference_count || 0;
+    const mediaUrl = _base() + (file.url || `/api/media/serve/${file.filename}`);
+    const referenceCount = file.reference_count;  // null when usage could not be determined
     
     // Determine media type and create preview
     let previewHtml = '';
     if (['jpg', 'jpeg', 'png', 'gif', 'webp', 'svg'].includes(ext)) {
         // Image thumbnail
-        previewHtml = `<img src="${mediaUrl}" alt="${file.original_name}" style="width: 80px; height: 80px; object-fit: cover; border-radius: 4px; margin-right: 1rem; flex-shrink: 0;">`;
+        previewHtml = `<img src="${mediaUrl}${mediaUrl.includes('?') ? '&' : '?'}variant=thumb" alt="${file.original_name}" style="width: 80px; height: 80px; object-fit: cover; border-radius: 4px; margin-right: 1rem; flex-shrink: 0;">`;
     } else if (['mp4', 'webm'].includes(ext)) {
-        // Video thumbnail - show first frame
-        previewHtml = `<video src="${mediaUrl}" style="width: 80px; height: 80px; object-fit: cover; border-radius: 4px; margin-right: 1rem; flex-shrink: 0; pointer-events: none;" preload="metadata" muted playsinline></video>`;
+        // Video thumbnail - the generated poster frame (falls back to an icon until it exists)
+        previewHtml = `<div style="position: relative; width: 80px; height: 80px; display: flex; align-items: center; justify-content: center; background: #e0e0e0; border-radius: 4px; margin-right: 1rem; flex-shrink: 0; font-size: 2rem; overflow: hidden;">🎬<img src="${mediaUrl}${mediaUrl.includes('?') ? '&' : '?'}variant=thumb" alt="${file.original_name}" style="position: absolute; inset: 0; width: 100%; height: 100%; object-fit: cover;" onerror="this.remove()"></div>`;
     } else if (['mp3', 'wav', 'ogg'].includes(ext)) {
         // Audio icon
         previewHtml = `<div style="width: 80px; height: 80px; display: flex; align-items: center; justify-content: center; background: #e0e0e0; border-radius: 4px; margin-right: 1rem; flex-shrink: 0; font-size: 2rem;">🔊</div>`;
@@ -1037,7 +1052,7 @@ function createMediaItem(file, currentUsername, isMyMedia) {
                 ${fileType} | ${fileSize}
                 ${file.creator ? ` | Created by: ${file.creator}` : ''}
                 ${file.public ? ' | <span style="color: green;">Public</span>' : ' | <span style="color: #666;">Private</span>'}
-                ${referenceCount > 0 ? ` | Referenced in ${referenceCount} quiz${referenceCount !== 1 ? 'es' : ''}` : ' | Not referenced'}
+                ${referenceCount == null ? '' : referenceCount > 0 ? ` | Referenced in ${referenceCount} quiz${referenceCount !== 1 ? 'es' : ''}` : ' | Not referenced'}
             </div>
         </div>
         <div class="list-item-actions" style="display: flex; align-items: center; gap: 0.5rem;">
@@ -13,6 +13,29 @@
      * @returns {string} - Normalized URL
      */
     function normalizeMediaUrl(url) {
+        return withMediaVariant(normalizeUrl(url));
+    }
+
+    /**
+     * Ask the server for a media variant sized for this client.
+     * Only applies on pages that set window.MEDIA_ROLE ('participant' or 'display').
+     * The width is rounded up to a multiple of 320 so devices share cached URLs.
+     *
+     * @param {string} url - A normalized media URL
+     * @returns {string} - The URL with role and width hints added
+     */
+    function withMediaVariant(url) {
+        if (!window.MEDIA_ROLE || !url || url.indexOf('/api/media/serve/') === -1 ||
+            /[?&](variant|role|w)=/.test(url)) {
+            return url;
+        }
+        const screenWidth = (window.screen.width || 0) * (window.devicePixelRatio || 1);
+        const width = Math.ceil(screenWidth / 320) * 320;
+        const separator = url.indexOf('?') === -1 ? '?' : '&';
+        return url + separator + 'role=' + encodeURIComponent(window.MEDIA_ROLE) + (width ? '&w=' + width : '');
+    }
+
+    function normalizeUrl(url) {
         if (!url || typeof url !== 'string') {
             return url || '';
         }
@@ -70,9 +93,41 @@
         }
     }
 
+    const prefetchedUrls = new Set();
+
+    /**
+     * Warm the browser cache with media of upcoming pages (server-sent prefetch_media entries).
+     * Images are decoded ahead of time; video and audio are fetched as low-priority prefetches.
+     *
+     * @param {Array<{url: string, kind: string}>} entries - Media entries from the room manifest
+     */
+    function prefetchMedia(entries) {
+        if (!Array.isArray(entries)) {
+            return;
+        }
+        entries.forEach(entry => {
+            const url = normalizeMediaUrl(entry.url);
+            if (!url || prefetchedUrls.has(url)) {
+                return;
+            }
+            prefetchedUrls.add(url);
+            if (entry.kind === 'image') {
+                const img = new Image();
+                img.decoding = 'async';
+                img.src = url;
+            } else {
+                const link = document.createElement('link');
+                link.rel = 'prefetch';
+                link.href = url;
+                document.head.appendChild(link);
+            }
+        });
+    }
+
     // Export function
     window.UrlUtils = {
-        normalizeMediaUrl: normalizeMediaUrl
+        normalizeMediaUrl: normalizeMediaUrl,
+        prefetchMedia: prefetchMedia
     };
 
     // Also export to Editor.Utils for backwards compatibility with editor code
@@ -0,0 +1,297 @@
+"""
+Historical quiz analytics.
+
+When a quiz ends, the room's answers are reduced to compact per-question
+aggregates (answer count, correct count, answer-time quantile sketch) and a
+per-run summary. Archiving runs as a Socket.IO background task, so ending a
+quiz never waits on the aggregation or the disk writes.
+"""
+import json
+import logging
+import math
+import time
+from pathlib import Path
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_FOLDER = Path(__file__).parent.parent / 'data' / 'analytics'
+RUN_SUMMARIES_FILE = ANALYTICS_FOLDER / 'runs.jsonl'
+
+_analytics_lock = Lock()
+
+class QuantileSketch:
+    """
+    Streaming quantile sketch with bounded relative error (DDSketch-style).
+
+    Values are counted in logarithmically sized buckets, so the sketch stays
+    small no matter how many values are added, and sketches from different
+    runs merge exactly by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.02):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets = {}  # bucket index -> count
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Add a non-negative value to the sketch."""
+        value = max(0.0, float(value))
+        if value <= 1e-9:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Merge another sketch (with the same accuracy) into this one."""
+        for index, bucket_count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + bucket_count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q):
+        """Estimate the q-quantile (0 <= q <= 1). Returns None for an empty sketch."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                estimate = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def mean(self):
+        """Mean of the added values, or None for an empty sketch."""
+        return self.total / self.count if self.count else None
+
+    def to_dict(self):
+        """Serialize to a JSON-compatible dict."""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'buckets': {str(index): bucket_count for index, bucket_count in self.buckets.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Deserialize a sketch created by to_dict."""
+        sketch = cls(data.get('relative_accuracy', 0.02))
+        sketch.buckets = {int(index): bucket_count for index, bucket_count in data.get('buckets', {}).items()}
+        sketch.zero_count = data.get('zero_count', 0)
+        sketch.count = data.get('count', 0)
+        sketch.total = data.get('total', 0.0)
+        sketch.min = data.get('min')
+        sketch.max = data.get('max')
+        return sketch
+
+def _get_quiz_analytics_path(quiz_id):
+    """Get the file path for a quiz's aggregated analytics."""
+    return ANALYTICS_FOLDER / f'{quiz_id}.json'
+
+def _load_quiz_aggregates(quiz_id):
+    """Load a quiz's aggregated analytics (empty aggregates if none yet)."""
+    file_path = _get_quiz_analytics_path(quiz_id)
+    if file_path.exists():
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning("Failed to load analytics for quiz %s: %s", quiz_id, e)
+    return {'quiz_id': quiz_id, 'runs': 0, 'questions': {}}
+
+def _get_question_info(quiz):
+    """Map question element IDs to their title, type and page index."""
+    question_info = {}
+    for page_index, page in enumerate(quiz.get('pages', [])):
+        for element_id, element in (page.get('elements') or {}).items():
+            if element.get('is_question'):
+                question_config = element.get('question_config') or {}
+                question_info[element_id] = {
+                    'title': question_config.get('question_title') or element.get('element_name'),
+                    'question_type': question_config.get('question_type'),
+                    'page_index': page_index
+                }
+    return question_info
+
+def _summarize_sketch(sketch):
+    """Timing summary (seconds) for a sketch."""
+    return {
+        'mean_time': sketch.mean(),
+        'median_time': sketch.quantile(0.5),
+        'p90_time': sketch.quantile(0.9),
+        'p99_time': sketch.quantile(0.99),
+        'min_time': sketch.min,
+        'max_time': sketch.max
+    }
+
+def archive_run(snapshot):
+    """
+    Aggregate a finished run's answers and persist the run summary and quiz aggregates.
+
+    Args:
+        snapshot: Dict built by schedule_run_archive from the ended room
+    """
+    quiz_id = snapshot['quiz_id']
+    question_info = _get_question_info(snapshot['quiz'])
+
+    run_questions = {}
+    run_sketches = {}
+    for question_id, question_answers in snapshot['answers'].items():
+        sketch = QuantileSketch()
+        correct = 0
+        for answer_data in question_answers.values():
+            sketch.add(answer_data.get('submission_time', 0))
+            if answer_data.get('correct', False):
+                correct += 1
+        run_sketches[question_id] = sketch
+        run_questions[question_id] = dict(
+            question_info.get(question_id, {}),
+            answers=sketch.count,
+            correct=correct,
+            correct_rate=correct / sketch.count if sketch.count else None,
+            **_summarize_sketch(sketch)
+        )
+
+    summary = {
+        'quiz_id': quiz_id,
+        'quiz_name': snapshot['quiz_name'],
+        'room_code': snapshot['room_code'],
+        'quizmaster': snapshot['quizmaster'],
+        'started_at': snapshot['started_at'],
+        'ended_at': snapshot['ended_at'],
+        'participants': snapshot['participant_count'],
+        'answers': sum(question['answers'] for question in run_questions.values()),
+        'questions': run_questions
+    }
+
+    with _analytics_lock:
+        ANALYTICS_FOLDER.mkdir(parents=True, exist_ok=True)
+        with open(RUN_SUMMARIES_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(summary, default=str) + '\n')
+
+        aggregates = _load_quiz_aggregates(quiz_id)
+        aggregates['runs'] = aggregates.get('runs', 0) + 1
+        aggregates['last_run_at'] = snapshot['ended_at']
+        for question_id, run_question in run_questions.items():
+            question = aggregates['questions'].setdefault(question_id, {'answers': 0, 'correct': 0})
+            question.update(question_info.get(question_id, {}))
+            question['answers'] += run_question['answers']
+            question['correct'] += run_question['correct']
+            sketch = QuantileSketch.from_dict(question['timing']) if 'timing' in question else QuantileSketch()
+            sketch.merge(run_sketches[question_id])
+            question['timing'] = sketch.to_dict()
+
+        with open(_get_quiz_analytics_path(quiz_id), 'w', encoding='utf-8') as f:
+            json.dump(aggregates, f, ensure_ascii=False)
+
+def _run_archive_task(snapshot):
+    """Background task wrapper - archiving must never take the server down."""
+    try:
+        archive_run(snapshot)
+    except Exception as e:
+        logger.warning("Failed to archive run for room %s: %s", snapshot.get('room_code'), e)
+
+def schedule_run_archive(room):
+    """
+    Archive an ended room's answers in the background.
+
+    Only references are captured here: the room has been removed from the
+    active rooms by the time the task runs, so its answers no longer change.
+    """
+    quiz_id = room.get('quiz_id')
+    if not quiz_id:
+        return
+
+    snapshot = {
+        'quiz_id': quiz_id,
+        'quiz_name': room.get('quiz_name'),
+        'quiz': room.get('quiz', {}),
+        'room_code': room.get('code'),
+        'quizmaster': room.get('quizmaster'),
+        'started_at': room.get('created_at'),
+        'ended_at': time.time(),
+        'participant_count': len(room.get('participants', {})),
+        'answers': room.get('answers', {})
+    }
+
+    from app import socketio
+    socketio.start_background_task(_run_archive_task, snapshot)
+
+def get_quiz_analytics(quiz_id):
+    """
+    Get aggregated per-question analytics for a quiz across all archived runs.
+
+    Returns:
+        Dict with 'quiz_id', 'runs', 'last_run_at' and 'questions' (list of per-question
+        stats sorted by page, each with answers, correct, correct_rate and timing quantiles)
+    """
+    with _analytics_lock:
+        aggregates = _load_quiz_aggregates(quiz_id)
+
+    questions = []
+    for question_id, question in aggregates.get('questions', {}).items():
+        sketch = QuantileSketch.from_dict(question.get('timing', {}))
+        answers = question.get('answers', 0)
+        questions.append(dict(
+            question_id=question_id,
+            title=question.get('title'),
+            question_type=question.get('question_type'),
+            page_index=question.get('page_index'),
+            answers=answers,
+            correct=question.get('correct', 0),
+            correct_rate=question.get('correct', 0) / answers if answers else None,
+            **_summarize_sketch(sketch)
+        ))
+    questions.sort(key=lambda q: (q['page_index'] is None, q['page_index'] or 0))
+
+    return {
+        'quiz_id': quiz_id,
+        'runs': aggregates.get('runs', 0),
+        'last_run_at': aggregates.get('last_run_at'),
+        'questions': questions
+    }
+
+def list_run_summaries(quiz_id=None, quizmaster=None, limit=50):
+    """List archived run summaries (newest first), optionally filtered by quiz or quizmaster."""
+    if not RUN_SUMMARIES_FILE.exists():
+        return []
+
+    summaries = []
+    with _analytics_lock:
+        with open(RUN_SUMMARIES_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    summary = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if quiz_id and summary.get('quiz_id') != quiz_id:
+                    continue
+                if quizmaster and summary.get('quizmaster') != quizmaster:
+                    continue
+                summaries.append(summary)
+
+    summaries.reverse()
+    return summaries[:limit] if limit else summaries
@@ -8,20 +8,26 @@ Or for all browsers:
     playwright install
 """
 import asyncio
+import logging
 from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
 try:
     from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
     PLAYWRIGHT_AVAILABLE = True
 except ImportError:
     PLAYWRIGHT_AVAILABLE = False
-    print("Warning: Playwright not installed. Server-side rendering will not work.")
-    print("Install with: pip install playwright && playwright install chromium")
+    logger.warning("Playwright not installed. Server-side rendering will not work. "
+                   "Install with: pip install playwright && playwright install chromium")
 
 import base64
 import io
 from datetime import datetime, timedelta
 import hashlib
 import json
+import time
+from app.utils import metrics
 
 # Cache for rendered images (room_code -> (image_data, timestamp, version))
 _render_cache = {}
@@ -30,6 +36,13 @@ _version_counter = {}  # Track version number for each room (increments when cac
 # Persistent storage for last successful image (room_code -> image_data)
 # This prevents black screens when rendering fails
 _last_successful_image = {}
+_renders_in_progress = 0  # Playwright subprocesses currently running (render queue depth)
+
+def _collect_metrics():
+    """Render queue depth for /metrics."""
+    return [('quizia_render_queue_depth', {}, _renders_in_progress)]
+
+metrics.register_collector(_collect_metrics)
 
 async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
     """
@@ -45,7 +58,7 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
         bytes: PNG image data, or None if rendering failed
     """
     if not PLAYWRIGHT_AVAILABLE:
-        print(f"[Display Renderer] ERROR: Playwright is not available. Install with: pip install playwright && playwright install chromium")
+        logger.error("Playwright is not available. Install with: pip install playwright && playwright install chromium")
         return None
     
     # Check cache first
@@ -64,19 +77,13 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                 browser = await p.chromium.launch(headless=True)
             except Exception as browser_error:
                 import os
-                import traceback
-                print(f"[Display Renderer] ERROR: Failed to launch Chromium browser: {browser_error}")
-                print(f"[Display Renderer] Environment check:")
-                print(f"  HOME: {os.environ.get('HOME', 'NOT SET')}")
-                print(f"  PLAYWRIGHT_BROWSERS_PATH: {os.environ.get('PLAYWRIGHT_BROWSERS_PATH', 'NOT SET')}")
-                print(f"  USER: {os.environ.get('USER', 'NOT SET')}")
                 cache_path = os.path.expanduser('~/.cache/ms-playwright')
-                print(f"  Cache path exists: {os.path.exists(cache_path)}")
-                if os.path.exists(cache_path):
-                    print(f"  Cache path contents: {os.listdir(cache_path)}")
-                print(f"[Display Renderer] Traceback: {traceback.format_exc()}")
-                print(f"[Display Renderer] This usually means Playwright browsers are not installed or not accessible.")
-                print(f"[Display Renderer] Run: playwright install chromium")
+                logger.exception("Failed to launch Chromium browser: %s. This usually means Playwright browsers are "
+                                 "not installed or not accessible - run: playwright install chromium. "
+                                 "HOME=%s PLAYWRIGHT_BROWSERS_PATH=%s USER=%s, cache path contents: %s",
+                                 browser_error, os.environ.get('HOME', 'NOT SET'),
+                                 os.environ.get('PLAYWRIGHT_BROWSERS_PATH', 'NOT SET'), os.environ.get('USER', 'NOT SET'),
+                                 os.listdir(cache_path) if os.path.exists(cache_path) else 'missing')
                 return None
             
             try:
@@ -88,18 +95,18 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                 
                 # Navigate to display page
                 display_url = f"{base_url}/display/{room_code}"
-                print(f"[Display Renderer] Navigating to {display_url}")
+                logger.debug("Navigating to %s", display_url)
                 
                 try:
                     # Try with domcontentloaded first (faster, doesn't wait for all resources)
                     await page.goto(display_url, wait_until="domcontentloaded", timeout=20000)
                 except PlaywrightTimeoutError as e:
-                    print(f"[Display Renderer] domcontentloaded timeout, trying load event...")
+                    logger.debug("domcontentloaded timeout, trying load event...")
                     try:
                         # If that fails, try with load event
                         await page.goto(display_url, wait_until="load", timeout=20000)
                     except PlaywrightTimeoutError as e2:
-                        print(f"[Display Renderer] load timeout, trying commit...")
+                        logger.debug("load timeout, trying commit...")
                         # If that also fails, try with commit (just wait for navigation to start)
                         await page.goto(display_url, wait_until="commit", timeout=20000)
                 
@@ -107,9 +114,9 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                 # Wait for display-content element to exist
                 try:
                     await page.wait_for_selector('#display-content', timeout=10000, state='attached')
-                    print(f"[Display Renderer] Found display-content element")
+                    logger.debug("Found display-content element")
                 except Exception as e:
-                    print(f"[Display Renderer] Warning: display-content not found: {e}")
+                    logger.warning("display-content not found: %s", e)
                     # If selector doesn't appear, just wait a bit and continue
                 
                 # Wait for WebSocket connection to be established (Socket.IO connection)
@@ -124,21 +131,21 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                         """,
                         timeout=3000
                     )
-                    print(f"[Display Renderer] WebSocket connection established")
+                    logger.debug("WebSocket connection established")
                     # Give a moment for any pending WebSocket events to be processed
                     await page.wait_for_timeout(500)
                 except Exception as e:
-                    print(f"[Display Renderer] WebSocket connection check timeout/error: {e}, continuing...")
+                    logger.debug("WebSocket connection check timeout/error: %s, continuing...", e)
                 
                 # Wait for content to be rendered - check for ready signal first (fastest)
                 # Then fall back to checking for visible elements
                 try:
                     # First, wait for the ready signal (set by display.js when rendering completes)
                     await page.wait_for_selector('#display-content[data-rendered="true"]', timeout=1500, state='attached')
-                    print(f"[Display Renderer] Content ready signal detected")
+                    logger.debug("Content ready signal detected")
                 except Exception as e:
                     # Fallback: check if elements are visible
-                    print(f"[Display Renderer] Ready signal not found, checking for visible content...")
+                    logger.debug("Ready signal not found, checking for visible content...")
                     try:
                         await page.wait_for_function(
                             """
@@ -158,9 +165,9 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                             """,
                             timeout=1000
                         )
-                        print(f"[Display Renderer] Content rendered (fallback check)")
+                        logger.debug("Content rendered (fallback check)")
                     except Exception as e2:
-                        print(f"[Display Renderer] Content check timeout/error: {e2}, continuing anyway...")
+                        logger.debug("Content check timeout/error: %s, continuing anyway...", e2)
                         # Final fallback: short wait
                         await page.wait_for_timeout(300)
                 
@@ -171,7 +178,7 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                     if overlay:
                         # Wait for overlay to be ready (set by display.js when overlay is fully rendered)
                         await page.wait_for_selector('#answer-display-overlay[data-overlay-ready="true"]', timeout=1000, state='attached')
-                        print(f"[Display Renderer] Answer overlay ready signal detected")
+                        logger.debug("Answer overlay ready signal detected")
                         
                         # Verify overlay is actually visible and has correct properties
                         overlay_visible = await page.evaluate("""
@@ -197,7 +204,7 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                                 return isVisible;
                             }
                         """)
-                        print(f"[Display Renderer] Overlay visible check: {overlay_visible}")
+                        logger.debug("Overlay visible check: %s", overlay_visible)
                         
                         if overlay_visible:
                             overlay_present = True
@@ -205,7 +212,7 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                             await page.wait_for_timeout(300)
                 except Exception as e:
                     # No overlay or overlay not ready - that's fine, continue
-                    print(f"[Display Renderer] No answer overlay or overlay not ready: {e}")
+                    logger.debug("No answer overlay or overlay not ready: %s", e)
                 
                 # Final check right before screenshot - verify overlay is still there
                 if overlay_present:
@@ -215,12 +222,12 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                             return overlay !== null && overlay.offsetWidth > 0 && overlay.offsetHeight > 0;
                         }
                     """)
-                    print(f"[Display Renderer] Final overlay check before screenshot: {final_check}")
+                    logger.debug("Final overlay check before screenshot: %s", final_check)
                 
                 # Take screenshot of viewport - this should capture everything visible
                 # including fixed/absolute positioned elements like the overlay
                 # Viewport screenshot captures all visible elements regardless of positioning
-                print(f"[Display Renderer] Taking screenshot (overlay present: {overlay_present})...")
+                logger.debug("Taking screenshot (overlay present: %s)...", overlay_present)
                 
                 # Final verification: check overlay is in DOM right before screenshot
                 if overlay_present:
@@ -241,16 +248,16 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                             };
                         }
                     """)
-                    print(f"[Display Renderer] Overlay final check before screenshot: {overlay_final}")
+                    logger.debug("Overlay final check before screenshot: %s", overlay_final)
                 
                 screenshot = await page.screenshot(
                     type="png",
                     full_page=False,  # Viewport screenshot - captures all visible elements including fixed
                     timeout=10000
                 )
-                print(f"[Display Renderer] Screenshot taken successfully")
+                logger.debug("Screenshot taken successfully")
                 
-                print(f"[Display Renderer] Screenshot taken successfully")
+                logger.debug("Screenshot taken successfully")
                 
                 # Get current version for this room
                 version = _version_counter.get(cache_key, 0)
@@ -267,13 +274,11 @@ async def render_display_page(room_code, base_url='http://127.0.0.1:6005'):
                 await browser.close()
             
     except Exception as e:
-        print(f"Error rendering display page for room {room_code}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error rendering display page for room %s", room_code)
         # Return last successful image if available (prevents black screen)
         cache_key = room_code
         if cache_key in _last_successful_image:
-            print(f"[Display Renderer] Rendering failed, returning last successful image")
+            logger.warning("Rendering failed, returning last successful image")
             return _last_successful_image[cache_key]
         return None
 
@@ -289,16 +294,17 @@ def render_display_page_sync(room_code, base_url='http://127.0.0.1:6005'):
                   to work correctly with reverse proxies. Default is localhost:6005
                   for backward compatibility when not proxied.
     """
+    global _renders_in_progress
     import subprocess
     import tempfile
     import sys
     import os
     
     if not PLAYWRIGHT_AVAILABLE:
-        print(f"[Display Renderer] ERROR: Playwright is not available.")
+        logger.error("Playwright is not available.")
         # Return last successful image if available
         if room_code in _last_successful_image:
-            print(f"[Display Renderer] Playwright not available, returning last successful image")
+            logger.debug("Playwright not available, returning last successful image")
             return _last_successful_image[room_code]
         return None
     
@@ -309,14 +315,16 @@ def render_display_page_sync(room_code, base_url='http://127.0.0.1:6005'):
         if len(cache_entry) >= 2:
             image_data, timestamp = cache_entry[0], cache_entry[1]
             if datetime.now() - timestamp < timedelta(seconds=_cache_timeout):
+                metrics.count_cache('display_render', True)
                 return image_data
+    metrics.count_cache('display_render', False)
     
     # If cache expired but we have a last successful image, return it immediately
     # This prevents black screens while a new render is being generated
     # Note: The new render will still happen in the subprocess, but result is returned on next request
     if cache_key in _last_successful_image:
         last_image = _last_successful_image[cache_key]
-        print(f"[Display Renderer] Cache expired, returning last successful image while rendering new one")
+        logger.debug("Cache expired, returning last successful image while rendering new one")
         # Continue to render new image below, but return last one immediately
     
     # Get the app directory path
@@ -455,14 +463,20 @@ except Exception as e:
     
     try:
         # Run script in separate Python process (completely isolated from eventlet)
-        print(f"[Display Renderer] Running Playwright in separate process for room {room_code}")
-        result = subprocess.run(
-            [sys.executable, script_path],
-            capture_output=True,
-            text=True,
-            timeout=30,  # Reduced from 60 to 30 seconds for faster failure recovery
-            cwd=str(app_dir)
-        )
+        logger.debug("Running Playwright in separate process for room %s", room_code)
+        _renders_in_progress += 1
+        render_start = time.perf_counter()
+        try:
+            result = subprocess.run(
+                [sys.executable, script_path],
+                capture_output=True,
+                text=True,
+                timeout=30,  # Reduced from 60 to 30 seconds for faster failure recovery
+                cwd=str(app_dir)
+            )
+        finally:
+            _renders_in_progress -= 1
+            metrics.observe('quizia_render_seconds', time.perf_counter() - render_start)
         
         # Clean up script file
         try:
@@ -471,9 +485,9 @@ except Exception as e:
             pass
         
         if result.returncode != 0:
-            print(f"[Display Renderer] Subprocess failed with return code {result.returncode}")
-            print(f"[Display Renderer] stdout: {result.stdout}")
-            print(f"[Display Renderer] stderr: {result.stderr}")
+            metrics.inc('quizia_render_failures_total')
+            logger.error("Subprocess failed with return code %s\nstdout: %s\nstderr: %s",
+                         result.returncode, result.stdout, result.stderr)
             return None
         
         # Parse JSON result (should be the last line of stdout)
@@ -488,7 +502,8 @@ except Exception as e:
                     break
             
             if not json_line:
-                print(f"[Display Renderer] No JSON output found. stdout: {result.stdout[:500]}")
+                metrics.inc('quizia_render_failures_total')
+                logger.error("No JSON output found. stdout: %s", result.stdout[:500])
                 return None
             
             result_data = json.loads(json_line)
@@ -496,7 +511,7 @@ except Exception as e:
             if result_data.get('success'):
                 # Decode base64 image
                 image_data = base64.b64decode(result_data['image'])
-                print(f"[Display Renderer] Screenshot taken successfully, size: {len(image_data)} bytes")
+                logger.debug("Screenshot taken successfully, size: %s bytes", len(image_data))
                 
                 # Cache the result
                 version = _version_counter.get(room_code, 0)
@@ -507,42 +522,41 @@ except Exception as e:
                 
                 return image_data
             else:
-                print(f"[Display Renderer] Subprocess returned error: {result_data.get('error')}")
-                if 'traceback' in result_data:
-                    print(f"[Display Renderer] Traceback: {result_data['traceback']}")
+                metrics.inc('quizia_render_failures_total')
+                logger.error("Subprocess returned error: %s\n%s", result_data.get('error'), result_data.get('traceback', ''))
                 # Return last successful image if available (prevents black screen)
                 if room_code in _last_successful_image:
-                    print(f"[Display Renderer] Rendering failed, returning last successful image")
+                    logger.warning("Rendering failed, returning last successful image")
                     return _last_successful_image[room_code]
                 return None
                 
         except json.JSONDecodeError as e:
-            print(f"[Display Renderer] Failed to parse JSON output: {e}")
-            print(f"[Display Renderer] stdout (last 500 chars): {result.stdout[-500:]}")
+            metrics.inc('quizia_render_failures_total')
+            logger.error("Failed to parse JSON output: %s. stdout (last 500 chars): %s", e, result.stdout[-500:])
             return None
             
     except subprocess.TimeoutExpired:
-        print(f"[Display Renderer] Subprocess timeout (exceeded 60 seconds)")
+        metrics.inc('quizia_render_failures_total')
+        logger.error("Subprocess timeout (exceeded 30 seconds)")
         try:
             os.unlink(script_path)
         except:
             pass
         # Return last successful image if available (prevents black screen)
         if room_code in _last_successful_image:
-            print(f"[Display Renderer] Rendering timeout, returning last successful image")
+            logger.warning("Rendering timeout, returning last successful image")
             return _last_successful_image[room_code]
         return None
     except Exception as e:
-        print(f"[Display Renderer] Error running subprocess: {e}")
-        import traceback
-        traceback.print_exc()
+        metrics.inc('quizia_render_failures_total')
+        logger.exception("Error running subprocess")
         try:
             os.unlink(script_path)
         except:
             pass
         # Return last successful image if available (prevents black screen)
         if room_code in _last_successful_image:
-            print(f"[Display Renderer] Subprocess error, returning last successful image")
+            logger.warning("Subprocess error, returning last successful image")
             return _last_successful_image[room_code]
         return None
 
@@ -565,6 +579,18 @@ def clear_cache(room_code=None):
         _render_cache.clear()
         _version_counter.clear()
 
+def release_room(room_code):
+    """
+    Drop everything cached for a room, including the last successful image.
+    Called when a room ends or expires.
+    
+    Args:
+        room_code: Room code to release
+    """
+    _render_cache.pop(room_code, None)
+    _version_counter.pop(room_code, None)
+    _last_successful_image.pop(room_code, None)
+
 def get_version(room_code):
     """
     Get the current version number for a room.
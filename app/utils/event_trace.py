@@ -0,0 +1,184 @@
+"""
+Socket.IO event tracing.
+
+Every Socket.IO event handler runs inside an EventTrace recording its wall
+time, time spent waiting for and holding rooms_lock, time spent writing
+room state and the payload bytes it emitted. Events slower than
+SLOW_EVENT_MS are logged with that breakdown, and all events feed the
+handler metrics on /metrics.
+
+A room can also be profiled with cProfile at runtime (start_room_profile /
+get_room_profile / stop_room_profile), without a restart. Only one event
+is profiled at a time, and under eventlet the profile also catches
+whatever other greenlets run while the handler yields.
+"""
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+from functools import wraps
+from threading import Lock
+
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Events taking longer than this (milliseconds, not counting deliberate pacing waits) are logged
+SLOW_EVENT_MS = float(os.environ.get('SLOW_EVENT_MS', '250'))
+
+_current_trace = contextvars.ContextVar('event_trace', default=None)
+
+_profiles = {}  # room_code -> cProfile.Profile accumulating the room's events
+_profiler_lock = Lock()  # held while an event is being profiled (one profiler per thread)
+
+class EventTrace:
+    """Timing breakdown of one Socket.IO event (seconds and bytes)."""
+    __slots__ = ('event', 'room_code', 'lock_wait', 'lock_held', 'persist', 'saves',
+                 'emits', 'emitted_bytes', 'idle')
+
+    def __init__(self, event, room_code):
+        self.event = event
+        self.room_code = room_code
+        self.lock_wait = 0.0
+        self.lock_held = 0.0
+        self.persist = 0.0
+        self.saves = 0
+        self.emits = 0
+        self.emitted_bytes = 0
+        self.idle = 0.0
+
+class TracedLock:
+    """A threading.Lock that charges wait and hold time to the current event trace."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = time.perf_counter()
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.lock_wait += self._acquired_at - start
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.lock_held += held
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+def record_persist(seconds):
+    """Charge a room state write to the current event."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.persist += seconds
+        trace.saves += 1
+
+def record_emit(size):
+    """Charge an encoded outgoing payload to the current event."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.emits += 1
+        trace.emitted_bytes += size
+
+def record_idle(seconds):
+    """Record a deliberate wait (e.g. join pacing) that should not count as slowness."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.idle += seconds
+
+def start_room_profile(room_code):
+    """Start (or keep) profiling a room's events."""
+    _profiles.setdefault(room_code, cProfile.Profile())
+
+def stop_room_profile(room_code):
+    """Stop profiling a room. Returns the report, or None if it was not being profiled."""
+    profile = _profiles.pop(room_code, None)
+    return _format_profile(profile) if profile else None
+
+def get_room_profile(room_code, limit=40):
+    """Report for a room being profiled (top functions by cumulative time), or None."""
+    profile = _profiles.get(room_code)
+    return _format_profile(profile, limit) if profile else None
+
+def is_profiling(room_code):
+    return room_code in _profiles
+
+def _format_profile(profile, limit=40):
+    # Never block here: under eventlet the profiled event may be a paused greenlet on this thread
+    if not _profiler_lock.acquire(blocking=False):
+        return 'Profiler busy (an event is being profiled right now) - try again'
+    try:
+        output = io.StringIO()
+        stats = pstats.Stats(profile, stream=output)
+    finally:
+        _profiler_lock.release()
+    stats.sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+def _log_slow_event(trace, elapsed):
+    logger.warning("Slow Socket.IO event '%s' (room %s): %.1f ms - rooms_lock held %.1f ms (waited %.1f ms), "
+                   "persistence %.1f ms (%s saves), emitted %s payloads / %s bytes, paced %.1f ms",
+                   trace.event, trace.room_code, elapsed * 1000, trace.lock_held * 1000, trace.lock_wait * 1000,
+                   trace.persist * 1000, trace.saves, trace.emits, trace.emitted_bytes, trace.idle * 1000)
+
+def instrument_socketio_handlers(socketio):
+    """
+    Wrap every registered Socket.IO event handler with tracing and metrics.
+    Call once, after all handlers have been registered.
+    """
+    for namespace_handlers in socketio.server.handlers.values():
+        for event, handler in list(namespace_handlers.items()):
+            if not getattr(handler, '_traced', False):
+                namespace_handlers[event] = _trace_handler(event, handler)
+
+def _trace_handler(event, handler):
+    @wraps(handler)
+    def wrapper(*args):
+        # Handlers are called as (sid, data, ...) - most events carry the room code
+        data = args[1] if len(args) > 1 else None
+        room_code = data.get('room_code') if isinstance(data, dict) else None
+        trace = EventTrace(event, room_code)
+        token = _current_trace.set(trace)
+        profile = _profiles.get(room_code) if room_code else None
+        if profile is not None and not _profiler_lock.acquire(blocking=False):
+            profile = None  # Another event is being profiled right now
+        start = time.perf_counter()
+        try:
+            if profile is None:
+                return handler(*args)
+            profile.enable()
+            try:
+                return handler(*args)
+            finally:
+                profile.disable()
+                _profiler_lock.release()
+        except Exception:
+            metrics.inc('quizia_socketio_handler_errors_total', event=event)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_trace.reset(token)
+            metrics.inc('quizia_socketio_events_total', event=event)
+            metrics.observe('quizia_socketio_handler_seconds', elapsed, event=event)
+            if (elapsed - trace.idle) * 1000 > SLOW_EVENT_MS:
+                _log_slow_event(trace, elapsed)
+    wrapper._traced = True
+    return wrapper
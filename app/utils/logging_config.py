@@ -0,0 +1,74 @@
+"""
+Application logging.
+
+Every module logs through logging.getLogger(__name__), so all application
+loggers live under 'app'. configure_logging gives that hierarchy a level
+from LOG_LEVEL (default INFO) and a queue handler: log calls only put the
+record on a queue, and a listener thread does the formatting and stdout
+writes, so logging never blocks the eventlet hub.
+
+Use %-style arguments (logger.debug('Room %s', room_code)) so messages are
+only formatted when the level is enabled, and guard any expensive argument
+with logger.isEnabledFor. High-volume per-event logs (one per answer) go
+through get_sampled_logger, which keeps one record in LOG_SAMPLE_RATE.
+"""
+import atexit
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+# Keep one in this many records from sampled loggers
+LOG_SAMPLE_RATE = max(1, int(os.environ.get('LOG_SAMPLE_RATE', '100')))
+
+_listener = None
+
+class SampleFilter(logging.Filter):
+    """Let through one in every `rate` records."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        return next(self._counter) % self.rate == 0
+
+def get_sampled_logger(name, rate=None):
+    """
+    Get a logger that keeps only one in `rate` records (default LOG_SAMPLE_RATE).
+    Meant for per-event logs on hot paths such as answer submissions.
+    """
+    logger = logging.getLogger(name)
+    if not any(isinstance(f, SampleFilter) for f in logger.filters):
+        logger.addFilter(SampleFilter(rate or LOG_SAMPLE_RATE))
+    return logger
+
+def configure_logging():
+    """Set up the 'app' logger hierarchy (once per process)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    level_name = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    level = logging.getLevelName(level_name)
+    if not isinstance(level, int):
+        level = logging.INFO
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    # queue.Queue (not SimpleQueue) so the listener also cooperates when eventlet monkey patches threading
+    log_queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger = logging.getLogger('app')
+    logger.setLevel(level)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+    if level_name != logging.getLevelName(level):
+        logger.warning("Unknown LOG_LEVEL '%s' - using INFO", level_name)
@@ -1,13 +1,54 @@
 """
 Media storage utilities.
+
+Media metadata (display name, creator, public flag, size) is kept in a SQLite
+database in the uploads folder, indexed by creator and (creator, original_name),
+so uploads, renames and toggles touch a single record instead of rewriting one
+JSON document holding every file's metadata.
+
+File contents are stored once per SHA-256 under .blobs/; each stored filename
+(the name used in /api/media/serve/ URLs) is a hard link to its blob and its
+metadata row records the digest. Re-uploads and quiz copies therefore cost
+no extra disk space, and a blob is deleted when its last entry is.
+
+The same database holds a media -> quiz reference index, updated whenever a
+quiz is saved or deleted, so reference counts, orphan detection and "which
+quizzes use this file" are index lookups rather than parses of every quiz.
 """
+import hashlib
+import io
 import json
+import logging
 import re
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
+from threading import Lock
 from flask import current_app
 import os
 import shutil
 
+logger = logging.getLogger(__name__)
+
+METADATA_DB_NAME = '.media_metadata.db'
+# Legacy single-document metadata file (imported into the database once)
+LEGACY_METADATA_NAME = '.media_metadata.json'
+# Content-addressed file data (<sha256[:2]>/<sha256>)
+BLOBS_NAME = '.blobs'
+# Resumable uploads in progress (<upload_id>.part + <upload_id>.json)
+PARTIAL_UPLOADS_NAME = '.partial'
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_UPLOAD_SIZE = 500 * 1024 * 1024
+PARTIAL_UPLOAD_EXPIRATION = 24 * 60 * 60  # Abandoned resumable uploads are removed after a day
+
+_metadata_init_lock = Lock()
+_initialized_databases = set()  # database paths whose schema is ready in this process
+_reference_indexed_databases = set()  # database paths whose reference index is built
+
 def get_uploads_folder():
     """Get the uploads folder path."""
     try:
@@ -16,150 +57,608 @@ def get_uploads_folder():
         # Fallback if not in app context
         return Path(__file__).parent.parent / 'uploads'
 
+def get_max_upload_size():
+    """Get the maximum media upload size in bytes."""
+    try:
+        return current_app.config['MAX_MEDIA_UPLOAD_SIZE']
+    except:
+        return DEFAULT_MAX_UPLOAD_SIZE
+
+def get_media_metadata_db():
+    """Get the path to the media metadata database."""
+    return get_uploads_folder() / METADATA_DB_NAME
+
 def get_media_metadata_file():
-    """Get the path to media metadata file."""
+    """Get the path to the legacy media metadata file."""
+    return get_uploads_folder() / LEGACY_METADATA_NAME
+
+def _init_metadata_db(conn):
+    """Create the metadata schema and import the legacy JSON metadata once."""
+    conn.execute('PRAGMA journal_mode=WAL')
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS media (
+                filename TEXT PRIMARY KEY,
+                original_name TEXT NOT NULL,
+                creator TEXT,
+                public INTEGER NOT NULL DEFAULT 0,
+                size INTEGER,
+                sha256 TEXT
+            )
+        ''')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(media)')}
+        if 'sha256' not in columns:
+            conn.execute('ALTER TABLE media ADD COLUMN sha256 TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS media_creator_name ON media (creator, original_name)')
+        conn.execute('CREATE INDEX IF NOT EXISTS media_public ON media (public)')
+        conn.execute('CREATE INDEX IF NOT EXISTS media_sha256 ON media (sha256)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS media_refs (
+                quiz_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                PRIMARY KEY (quiz_id, filename)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS media_refs_filename ON media_refs (filename)')
+        conn.execute('CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)')
+
+        imported = conn.execute(
+            "SELECT 1 FROM store_meta WHERE key = 'legacy_metadata_imported'"
+        ).fetchone()
+        if imported:
+            return
+
+        legacy_file = get_media_metadata_file()
+        if legacy_file.exists():
+            try:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+            except Exception as e:
+                logger.warning("Failed to read legacy media metadata: %s", e)
+                legacy = {}
+            conn.executemany(
+                'INSERT OR IGNORE INTO media (filename, original_name, creator, public, size) VALUES (?, ?, ?, ?, ?)',
+                [
+                    (filename, meta.get('original_name', filename), meta.get('creator'),
+                     1 if meta.get('public', False) else 0, meta.get('size'))
+                    for filename, meta in legacy.items()
+                ]
+            )
+        conn.execute("INSERT INTO store_meta (key, value) VALUES ('legacy_metadata_imported', '1')")
+
+@contextmanager
+def _metadata_db():
+    """
+    Open the metadata database. Everything done inside the block is committed
+    as one transaction (or rolled back if it raises).
+    """
     uploads_folder = get_uploads_folder()
-    return uploads_folder / '.media_metadata.json'
+    uploads_folder.mkdir(exist_ok=True)
+    db_path = get_media_metadata_db()
 
-def _load_media_metadata():
-    """Load media metadata."""
-    metadata_file = get_media_metadata_file()
-    if metadata_file.exists():
-        try:
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
-
-def _save_media_metadata(metadata):
-    """Save media metadata."""
-    metadata_file = get_media_metadata_file()
+    conn = sqlite3.connect(str(db_path), timeout=10)
+    conn.row_factory = sqlite3.Row
+    try:
+        if str(db_path) not in _initialized_databases:
+            with _metadata_init_lock:
+                if str(db_path) not in _initialized_databases:
+                    _init_metadata_db(conn)
+                    _initialized_databases.add(str(db_path))
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def _row_to_metadata(row):
+    """Convert a media row to the metadata dict shape used by callers."""
+    return {
+        'original_name': row['original_name'],
+        'creator': row['creator'],
+        'public': bool(row['public']),
+        'size': row['size'],
+        'sha256': row['sha256']
+    }
+
+def get_media_metadata(filename):
+    """Get the metadata dict for a media file, or None if it has no metadata."""
+    with _metadata_db() as conn:
+        row = conn.execute('SELECT * FROM media WHERE filename = ?', (filename,)).fetchone()
+    return _row_to_metadata(row) if row else None
+
+def _next_display_name(conn, original_name, username):
+    """
+    Number a display name that the user already uses ("photo.png" -> "photo (2).png").
+
+    Only this user's names starting with the base name are read, via the
+    (creator, original_name) index.
+    """
+    exists = conn.execute(
+        'SELECT 1 FROM media WHERE creator = ? AND original_name = ?', (username, original_name)
+    ).fetchone()
+    if not exists:
+        return original_name
+
+    # Extract base name and extension
+    name_parts = original_name.rsplit('.', 1)
+    if len(name_parts) == 2:
+        base_name, ext = name_parts[0], name_parts[1]
+    else:
+        base_name, ext = original_name, ''
+
+    # Check if names match the pattern "base_name (N).ext"
+    pattern = re.escape(base_name) + r'\s*\((\d+)\)'
+    if ext:
+        pattern += r'\.' + re.escape(ext)
+    else:
+        pattern += r'$'
+
+    max_num = 0
+    candidates = conn.execute(
+        'SELECT original_name FROM media WHERE creator = ? AND original_name >= ? AND original_name < ?',
+        (username, base_name, base_name + '\U0010ffff')
+    )
+    for (existing_original,) in candidates:
+        match = re.match(pattern, existing_original)
+        if match:
+            max_num = max(max_num, int(match.group(1)))
+
+    duplicate_counter = max_num + 1
+    if ext:
+        return f"{base_name} ({duplicate_counter}).{ext}"
+    return f"{base_name} ({duplicate_counter})"
+
+def _sanitize_filename(filename):
+    """Sanitize a filename for storage."""
+    safe_name = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.')).strip()
+    return safe_name.replace(' ', '_')
+
+def _copy_stream_to_temp(stream, max_size):
+    """
+    Copy a stream into a temp file in the uploads folder chunk by chunk,
+    hashing it on the way.
+
+    Returns:
+        Tuple of (temp_path, size, sha256 hex digest)
+
+    Raises:
+        ValueError: If the stream is larger than max_size
+    """
     uploads_folder = get_uploads_folder()
     uploads_folder.mkdir(exist_ok=True)
-    
-    with open(metadata_file, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_name = tempfile.mkstemp(prefix='.upload-', suffix='.tmp', dir=str(uploads_folder))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise ValueError(f'File exceeds the maximum upload size of {max_size} bytes')
+                digest.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.unlink(temp_name)
+        raise
+    return Path(temp_name), size, digest.hexdigest()
+
+def _hash_file(file_path):
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _get_blob_path(sha256):
+    """Get the content-addressed blob path for a SHA-256 digest."""
+    return get_uploads_folder() / BLOBS_NAME / sha256[:2] / sha256
+
+def _unique_stored_name(filename):
+    """Sanitized stored filename, numbered until it does not collide with an existing file."""
+    uploads_folder = get_uploads_folder()
+    safe_name = _sanitize_filename(filename)
+    counter = 1
+    while (uploads_folder / safe_name).exists():
+        name_parts = safe_name.rsplit('.', 1)
+        if len(name_parts) == 2:
+            safe_name = f"{name_parts[0]}_{counter}.{name_parts[1]}"
+        else:
+            safe_name = f"{safe_name}_{counter}"
+        counter += 1
+    return safe_name
+
+def _link_blob(sha256, filename):
+    """
+    Make a stored filename point at a blob (hard link, so the file costs no
+    extra space). Returns the stored filename actually used, which is
+    renumbered if another upload took the name meanwhile.
+    """
+    uploads_folder = get_uploads_folder()
+    blob_path = _get_blob_path(sha256)
+    while True:
+        file_path = uploads_folder / filename
+        try:
+            os.link(blob_path, file_path)
+            return filename
+        except FileExistsError:
+            filename = _unique_stored_name(filename)
+        except OSError:
+            # Filesystem without hard links - fall back to a plain copy
+            if file_path.exists():
+                filename = _unique_stored_name(filename)
+                continue
+            shutil.copyfile(blob_path, file_path)
+            return filename
+
+def _adopt_blob(source_path, sha256, move=False):
+    """Ensure a blob exists for sha256, moving or linking source_path into the blob store if needed."""
+    blob_path = _get_blob_path(sha256)
+    if blob_path.exists():
+        if move:
+            source_path.unlink()
+        return
+    blob_path.parent.mkdir(parents=True, exist_ok=True)
+    if move:
+        os.replace(source_path, blob_path)
+    else:
+        try:
+            os.link(source_path, blob_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copyfile(source_path, blob_path)
+
+def _release_blob(conn, sha256):
+    """Delete a blob once no media entry points at it."""
+    if not sha256:
+        return
+    still_used = conn.execute('SELECT 1 FROM media WHERE sha256 = ? LIMIT 1', (sha256,)).fetchone()
+    if not still_used:
+        blob_path = _get_blob_path(sha256)
+        if blob_path.exists():
+            blob_path.unlink()
+        from app.utils.media_variants import delete_variants
+        delete_variants(sha256)
+
+def _schedule_variants(sha256, filename):
+    """Queue background generation of resized variants for a new blob."""
+    try:
+        from app.utils.media_variants import schedule_variants
+        schedule_variants(sha256, _get_blob_path(sha256), filename)
+    except Exception as e:
+        # Variants are an optimization - the original is always servable
+        logger.warning("Failed to schedule media variants for %s: %s", filename, e)
+
+def _find_duplicate(conn, username, sha256):
+    """Find a stored file of this user with the same content, if any."""
+    for row in conn.execute('SELECT filename FROM media WHERE sha256 = ? AND creator = ?', (sha256, username)):
+        if (get_uploads_folder() / row['filename']).exists():
+            return row['filename']
+    return None
+
+def _store_media_file(filename, temp_path, size, sha256, username, public):
+    """
+    Move a fully written temp file into the blob store and record its metadata.
+
+    Content already stored is not written again: re-uploading a file returns
+    the uploader's existing entry, and identical content from another user
+    gets its own entry linked to the same blob.
+    """
+    with _metadata_db() as conn:
+        existing = _find_duplicate(conn, username, sha256)
+        if existing:
+            temp_path.unlink()
+            return {'success': True, 'filename': existing, 'size': size, 'sha256': sha256, 'deduplicated': True}
+
+        # Atomic rename into the blob store - the file only appears once complete
+        _adopt_blob(temp_path, sha256, move=True)
+        safe_name = _link_blob(sha256, _unique_stored_name(filename))
+
+        # Number the display name if this creator already has a file with the same name
+        original_name = _next_display_name(conn, filename, username)
+        conn.execute(
+            'INSERT OR REPLACE INTO media (filename, original_name, creator, public, size, sha256) VALUES (?, ?, ?, ?, ?, ?)',
+            (safe_name, original_name, username, 1 if public else 0, size, sha256)
+        )
+
+    _schedule_variants(sha256, safe_name)
+    return {'success': True, 'filename': safe_name, 'size': size, 'sha256': sha256}
+
+def clone_media_file(filename, username, public=False):
+    """
+    Give a user their own entry for an existing media file (used when copying
+    quizzes). The new entry shares the original's blob, so no file data is
+    read or written.
+
+    Returns:
+        Dict with 'success' and 'filename' (the user's entry) or 'error'
+    """
+    try:
+        file_path = get_media_file_path(filename)
+        if not file_path.exists():
+            return {'success': False, 'error': 'File not found'}
+
+        with _metadata_db() as conn:
+            row = conn.execute('SELECT * FROM media WHERE filename = ?', (filename,)).fetchone()
+            if row and row['creator'] == username:
+                return {'success': True, 'filename': filename}
+
+            sha256 = row['sha256'] if row else None
+            if not sha256:
+                # Stored before content addressing - hash it and move it into the blob store
+                sha256 = _hash_file(file_path)
+                if row:
+                    conn.execute('UPDATE media SET sha256 = ? WHERE filename = ?', (sha256, filename))
+            if not _get_blob_path(sha256).exists():
+                _adopt_blob(file_path, sha256)
+
+            existing = _find_duplicate(conn, username, sha256)
+            if existing:
+                return {'success': True, 'filename': existing}
+
+            display_name = row['original_name'] if row else filename
+            new_filename = _link_blob(sha256, _unique_stored_name(display_name))
+            conn.execute(
+                'INSERT INTO media (filename, original_name, creator, public, size, sha256) VALUES (?, ?, ?, ?, ?, ?)',
+                (new_filename, _next_display_name(conn, display_name, username), username,
+                 1 if public else 0, file_path.stat().st_size, sha256)
+            )
+
+        return {'success': True, 'filename': new_filename}
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+def save_media_stream(filename, stream, username, public=False, max_size=None):
+    """
+    Save a media file from a file-like object without holding it in memory.
+
+    The stream is written to a temp file in chunks (hashing as it goes) and
+    renamed into place once complete. max_size defaults to get_max_upload_size().
+    """
+    try:
+        if not _sanitize_filename(filename):
+            return {'success': False, 'error': 'Invalid filename'}
+
+        if max_size is None:
+            max_size = get_max_upload_size()
+        try:
+            temp_path, size, sha256 = _copy_stream_to_temp(stream, max_size)
+        except ValueError as e:
+            return {'success': False, 'error': str(e), 'too_large': True}
+
+        try:
+            return _store_media_file(filename, temp_path, size, sha256, username, public)
+        except Exception:
+            if temp_path.exists():
+                temp_path.unlink()
+            raise
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
 
 def save_media_file(filename, file_content, username, public=False):
     """Save a media file and track metadata."""
+    return save_media_stream(filename, io.BytesIO(file_content), username, public=public, max_size=0)
+
+def _get_partial_uploads_folder():
+    """Get the folder holding resumable uploads in progress."""
+    return get_uploads_folder() / PARTIAL_UPLOADS_NAME
+
+def _load_partial_upload(upload_id, username):
+    """Load a resumable upload's state. Returns (state, part_path) or (None, None)."""
+    if not re.fullmatch(r'[0-9a-f]{32}', upload_id or ''):
+        return None, None
+    partial_folder = _get_partial_uploads_folder()
+    state_path = partial_folder / f'{upload_id}.json'
+    part_path = partial_folder / f'{upload_id}.part'
     try:
-        uploads_folder = get_uploads_folder()
-        uploads_folder.mkdir(exist_ok=True)
-        
-        # Sanitize filename for storage
-        safe_name = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.')).strip()
-        safe_name = safe_name.replace(' ', '_')
-        
-        if not safe_name:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except Exception:
+        return None, None
+    if state.get('creator') != username:
+        return None, None
+    return state, part_path
+
+def _remove_partial_upload(upload_id):
+    """Delete a resumable upload's state and data."""
+    partial_folder = _get_partial_uploads_folder()
+    for suffix in ('.json', '.part'):
+        path = partial_folder / f'{upload_id}{suffix}'
+        if path.exists():
+            path.unlink()
+
+def _cleanup_stale_partial_uploads():
+    """Remove resumable uploads that have not received data for a day."""
+    partial_folder = _get_partial_uploads_folder()
+    if not partial_folder.exists():
+        return
+    cutoff = time.time() - PARTIAL_UPLOAD_EXPIRATION
+    for path in partial_folder.iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            continue
+
+_busy_uploads = set()  # upload IDs with a chunk being appended or the upload being completed
+_busy_uploads_lock = Lock()
+
+def _claim_upload(upload_id):
+    """
+    Mark a resumable upload as busy. Returns False if another request is
+    already writing it (never waits - the caller tells the client to retry).
+    """
+    with _busy_uploads_lock:
+        if upload_id in _busy_uploads:
+            return False
+        _busy_uploads.add(upload_id)
+        return True
+
+def _release_upload(upload_id):
+    with _busy_uploads_lock:
+        _busy_uploads.discard(upload_id)
+
+def start_chunked_upload(filename, username, total_size, public=False):
+    """
+    Begin a resumable upload. Chunks are then appended with append_upload_chunk
+    and the file is stored by complete_chunked_upload.
+
+    Returns:
+        Dict with 'success' and 'upload_id' or 'error'
+    """
+    try:
+        if not _sanitize_filename(filename):
             return {'success': False, 'error': 'Invalid filename'}
-        
-        # Check if a file with the same original_name already exists for this creator
-        metadata = _load_media_metadata()
-        original_name = filename
-        duplicate_counter = None
-        
-        # Find all files with the same original_name created by this user
-        for existing_file, existing_meta in metadata.items():
-            if (existing_meta.get('creator') == username and 
-                existing_meta.get('original_name') == original_name):
-                # Found a duplicate - we'll need to number this one
-                duplicate_counter = 1
-                break
-        
-        # If we found a duplicate, find the highest number used
-        if duplicate_counter is not None:
-            # Extract base name and extension
-            name_parts = original_name.rsplit('.', 1)
-            if len(name_parts) == 2:
-                base_name, ext = name_parts[0], name_parts[1]
-            else:
-                base_name, ext = original_name, ''
-            
-            # Find all numbered versions
-            max_num = 0
-            for existing_file, existing_meta in metadata.items():
-                if existing_meta.get('creator') == username:
-                    existing_original = existing_meta.get('original_name', '')
-                    # Check if it matches the pattern "base_name (N).ext"
-                    pattern = re.escape(base_name) + r'\s*\((\d+)\)'
-                    if ext:
-                        pattern += r'\.' + re.escape(ext)
-                    else:
-                        pattern += r'$'
-                    match = re.match(pattern, existing_original)
-                    if match:
-                        num = int(match.group(1))
-                        max_num = max(max_num, num)
-                    # Also check if it's the exact original name (no number)
-                    elif existing_original == original_name:
-                        max_num = max(max_num, 0)
-            
-            # Set the duplicate counter to max_num + 1
-            duplicate_counter = max_num + 1
-            
-            # Update original_name to include the number
-            if ext:
-                original_name = f"{base_name} ({duplicate_counter}).{ext}"
-            else:
-                original_name = f"{base_name} ({duplicate_counter})"
-        
-        # Ensure unique stored filename (for filesystem)
-        file_path = uploads_folder / safe_name
-        counter = 1
-        while file_path.exists():
-            name_parts = safe_name.rsplit('.', 1)
-            if len(name_parts) == 2:
-                safe_name = f"{name_parts[0]}_{counter}.{name_parts[1]}"
-            else:
-                safe_name = f"{safe_name}_{counter}"
-            file_path = uploads_folder / safe_name
-            counter += 1
-        
-        # Save file
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
-        
-        # Update metadata with the potentially renamed original_name
-        metadata[safe_name] = {
-            'original_name': original_name,
-            'creator': username,
-            'public': public,
-            'size': os.path.getsize(file_path)
-        }
-        _save_media_metadata(metadata)
-        
-        return {'success': True, 'filename': safe_name}
+        max_size = get_max_upload_size()
+        if not isinstance(total_size, int) or total_size < 0:
+            return {'success': False, 'error': 'Invalid file size'}
+        if max_size and total_size > max_size:
+            return {'success': False, 'error': f'File exceeds the maximum upload size of {max_size} bytes', 'too_large': True}
+
+        _cleanup_stale_partial_uploads()
+        partial_folder = _get_partial_uploads_folder()
+        partial_folder.mkdir(parents=True, exist_ok=True)
+
+        upload_id = uuid.uuid4().hex
+        (partial_folder / f'{upload_id}.part').touch()
+        with open(partial_folder / f'{upload_id}.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'filename': filename,
+                'creator': username,
+                'public': public,
+                'total_size': total_size,
+                'started_at': time.time()
+            }, f, ensure_ascii=False)
+
+        return {'success': True, 'upload_id': upload_id, 'chunk_size': 1024 * 1024}
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
+def get_chunked_upload(upload_id, username):
+    """Get the progress of a resumable upload (the offset to resume from)."""
+    state, part_path = _load_partial_upload(upload_id, username)
+    if state is None or not part_path.exists():
+        return {'success': False, 'error': 'Upload not found'}
+    return {'success': True, 'offset': part_path.stat().st_size, 'total_size': state['total_size']}
+
+def append_upload_chunk(upload_id, username, offset, stream):
+    """
+    Append a chunk to a resumable upload. offset must equal the bytes received
+    so far, and only one request at a time may append to an upload, so a
+    retried chunk is never written twice (even while the first attempt is
+    still streaming).
+
+    Returns:
+        Dict with 'success' and the new 'offset', or 'error' (with the current
+        'offset' on a mismatch, so the client can resume from there, or
+        'busy' if another request is writing the upload)
+    """
+    if not _claim_upload(upload_id):
+        return {'success': False, 'error': 'Another chunk is still being received', 'busy': True}
+    try:
+        state, part_path = _load_partial_upload(upload_id, username)
+        if state is None or not part_path.exists():
+            return {'success': False, 'error': 'Upload not found'}
+
+        current_offset = part_path.stat().st_size
+        if offset != current_offset:
+            return {'success': False, 'error': 'Offset mismatch', 'offset': current_offset}
+
+        written = current_offset
+        with open(part_path, 'ab') as f:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > state['total_size']:
+                    f.truncate(current_offset)
+                    return {'success': False, 'error': 'Chunk exceeds the declared file size', 'offset': current_offset}
+                f.write(chunk)
+
+        return {'success': True, 'offset': written}
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+    finally:
+        _release_upload(upload_id)
+
+def complete_chunked_upload(upload_id, username):
+    """Verify a resumable upload is complete, hash it and store it like a normal upload."""
+    if not _claim_upload(upload_id):
+        return {'success': False, 'error': 'Another chunk is still being received', 'busy': True}
+    try:
+        state, part_path = _load_partial_upload(upload_id, username)
+        if state is None or not part_path.exists():
+            return {'success': False, 'error': 'Upload not found'}
+
+        size = part_path.stat().st_size
+        if size != state['total_size']:
+            return {'success': False, 'error': 'Upload is incomplete', 'offset': size}
+
+        sha256 = _hash_file(part_path)
+        result = _store_media_file(state['filename'], part_path, size, sha256, username, state.get('public', False))
+        _remove_partial_upload(upload_id)
+        return result
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+    finally:
+        _release_upload(upload_id)
+
+def cancel_chunked_upload(upload_id, username):
+    """Abandon a resumable upload and delete its data."""
+    state, _ = _load_partial_upload(upload_id, username)
+    if state is None:
+        return {'success': False, 'error': 'Upload not found'}
+    _remove_partial_upload(upload_id)
+    return {'success': True}
+
 def delete_media_file(filename, username):
     """Delete a media file (only creator can delete)."""
+    return delete_media_files([filename], username)[0]
+
+def delete_media_files(filenames, username):
+    """
+    Delete several media files (only creator can delete). Metadata for all of
+    them is removed in one transaction.
+
+    Returns:
+        List of result dicts (one per filename, in order)
+    """
     try:
         uploads_folder = get_uploads_folder()
-        file_path = uploads_folder / filename
-        
-        if not file_path.exists():
-            return {'success': False, 'error': 'File not found'}
-        
-        # Check metadata
-        metadata = _load_media_metadata()
-        file_meta = metadata.get(filename)
-        
-        if file_meta and file_meta.get('creator') != username:
-            return {'success': False, 'error': 'Only the creator can delete this file'}
-        
-        # Delete file
-        file_path.unlink()
-        
-        # Update metadata
-        if filename in metadata:
-            del metadata[filename]
-            _save_media_metadata(metadata)
-        
-        return {'success': True}
+        results = []
+        with _metadata_db() as conn:
+            for filename in filenames:
+                file_path = uploads_folder / filename
+                if not file_path.exists():
+                    results.append({'success': False, 'error': 'File not found'})
+                    continue
+
+                row = conn.execute('SELECT creator, sha256 FROM media WHERE filename = ?', (filename,)).fetchone()
+                if row and row['creator'] != username:
+                    results.append({'success': False, 'error': 'Only the creator can delete this file'})
+                    continue
+
+                try:
+                    file_path.unlink()
+                except Exception as e:
+                    results.append({'success': False, 'error': str(e)})
+                    continue
+                conn.execute('DELETE FROM media WHERE filename = ?', (filename,))
+                if row:
+                    _release_blob(conn, row['sha256'])
+                results.append({'success': True})
+        return results
     except Exception as e:
-        return {'success': False, 'error': str(e)}
+        return [{'success': False, 'error': str(e)} for _ in filenames]
+
+def _is_media_file(file_path):
+    """True for uploaded media (not the metadata store or other hidden files)."""
+    return file_path.is_file() and not file_path.name.startswith('.')
 
 def list_media_files(username=None, include_reference_count=False):
     """List media files. If username provided, returns files created by user or public files."""
@@ -167,127 +666,280 @@ def list_media_files(username=None, include_reference_count=False):
         uploads_folder = get_uploads_folder()
         uploads_folder.mkdir(exist_ok=True)
         
-        metadata = _load_media_metadata()
         files = []
+        with _metadata_db() as conn:
+            if username:
+                # Filter by creator or public status using the indexes
+                rows = conn.execute('SELECT * FROM media WHERE creator = ? OR public = 1', (username,)).fetchall()
+            else:
+                rows = conn.execute('SELECT * FROM media').fetchall()
+        metadata = {row['filename']: _row_to_metadata(row) for row in rows}
+        reference_counts = {}
+        if include_reference_count:
+            try:
+                reference_counts = get_media_reference_counts()
+            except Exception:
+                # Still list the files, with the counts marked unknown (None)
+                reference_counts = None
+        
+        if username:
+            candidates = [uploads_folder / filename for filename in metadata]
+        else:
+            # No filtering, return all (including files without metadata)
+            candidates = uploads_folder.iterdir()
         
-        for file_path in uploads_folder.iterdir():
-            if file_path.is_file() and file_path.name != '.media_metadata.json':
-                file_meta = metadata.get(file_path.name, {})
-                file_creator = file_meta.get('creator')
-                is_public = file_meta.get('public', False)
-                
-                # If username provided, filter by creator or public status
-                if username:
-                    if file_creator == username or is_public:
-                        file_info = {
-                            'filename': file_path.name,
-                            'original_name': file_meta.get('original_name', file_path.name),
-                            'creator': file_creator,
-                            'public': is_public,
-                            'size': file_meta.get('size', file_path.stat().st_size)
-                        }
-                        if include_reference_count:
-                            file_info['reference_count'] = count_media_references(file_path.name)
-                        files.append(file_info)
-                else:
-                    # No filtering, return all
-                    file_info = {
-                        'filename': file_path.name,
-                        'original_name': file_meta.get('original_name', file_path.name),
-                        'creator': file_creator,
-                        'public': is_public,
-                        'size': file_meta.get('size', file_path.stat().st_size)
-                    }
-                    if include_reference_count:
-                        file_info['reference_count'] = count_media_references(file_path.name)
-                    files.append(file_info)
+        for file_path in candidates:
+            if not _is_media_file(file_path):
+                continue
+            file_meta = metadata.get(file_path.name, {})
+            file_info = {
+                'filename': file_path.name,
+                'original_name': file_meta.get('original_name', file_path.name),
+                'creator': file_meta.get('creator'),
+                'public': file_meta.get('public', False),
+                'size': file_meta.get('size') or file_path.stat().st_size,
+                'sha256': file_meta.get('sha256'),
+                'url': get_media_url(file_path.name, file_meta.get('sha256'))
+            }
+            if include_reference_count:
+                file_info['reference_count'] = reference_counts.get(file_path.name, 0) if reference_counts is not None else None
+            files.append(file_info)
         
         return files
     except Exception as e:
         return []
 
+def get_media_url(filename, sha256=None):
+    """
+    Get the URL used to reference a media file in quizzes. With a content hash
+    the URL is versioned, which lets browsers cache it as immutable.
+    """
+    url = f'/api/media/serve/{filename}'
+    if sha256:
+        url += f'?v={sha256[:16]}'
+    return url
+
 def get_media_file_path(filename):
     """Get the full path to a media file."""
     uploads_folder = get_uploads_folder()
     return uploads_folder / filename
 
+def get_media_file_hash(filename):
+    """SHA-256 of a media file's content (from metadata when recorded, else hashed from disk)."""
+    metadata = get_media_metadata(filename)
+    if metadata and metadata.get('sha256'):
+        return metadata['sha256']
+    return _hash_file(get_media_file_path(filename))
+
 def toggle_media_public(filename, username):
     """Toggle public status of a media file (only creator can toggle)."""
     try:
-        metadata = _load_media_metadata()
-        file_meta = metadata.get(filename)
-        
-        if not file_meta:
-            return {'success': False, 'error': 'File not found in metadata'}
-        
-        if file_meta.get('creator') != username:
-            return {'success': False, 'error': 'Only the creator can change public status'}
-        
-        # Toggle public status
-        file_meta['public'] = not file_meta.get('public', False)
-        metadata[filename] = file_meta
-        _save_media_metadata(metadata)
+        with _metadata_db() as conn:
+            row = conn.execute('SELECT creator, public FROM media WHERE filename = ?', (filename,)).fetchone()
+            
+            if not row:
+                return {'success': False, 'error': 'File not found in metadata'}
+            
+            if row['creator'] != username:
+                return {'success': False, 'error': 'Only the creator can change public status'}
+            
+            # Toggle public status
+            public = not row['public']
+            conn.execute('UPDATE media SET public = ? WHERE filename = ?', (1 if public else 0, filename))
         
-        return {'success': True, 'public': file_meta['public']}
+        return {'success': True, 'public': public}
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
+def set_media_public_bulk(filenames, username, make_public):
+    """
+    Set the public status of several media files (only files the user created).
+    All changes are committed in one transaction.
+
+    Returns:
+        List of result dicts with 'filename', 'success' and 'public' or 'error'
+    """
+    try:
+        results = []
+        with _metadata_db() as conn:
+            for filename in filenames:
+                row = conn.execute('SELECT creator FROM media WHERE filename = ?', (filename,)).fetchone()
+                if not row:
+                    results.append({'filename': filename, 'success': False, 'error': 'File not found'})
+                    continue
+                if row['creator'] != username:
+                    results.append({'filename': filename, 'success': False, 'error': 'Only creator can change status'})
+                    continue
+                conn.execute('UPDATE media SET public = ? WHERE filename = ?', (1 if make_public else 0, filename))
+                results.append({'filename': filename, 'success': True, 'public': make_public})
+        return results
+    except Exception as e:
+        return [{'filename': filename, 'success': False, 'error': str(e)} for filename in filenames]
+
 def rename_media_display_name(filename, new_display_name, username):
     """Rename the display name (original_name) of a media file (only creator can rename)."""
     try:
-        metadata = _load_media_metadata()
-        file_meta = metadata.get(filename)
-        
-        if not file_meta:
-            return {'success': False, 'error': 'File not found in metadata'}
-        
-        if file_meta.get('creator') != username:
-            return {'success': False, 'error': 'Only the creator can rename the file'}
-        
-        # Validate new display name
-        if not new_display_name or not new_display_name.strip():
-            return {'success': False, 'error': 'Display name cannot be empty'}
-        
-        new_display_name = new_display_name.strip()
-        
-        # Update the original_name (display name) in metadata
-        file_meta['original_name'] = new_display_name
-        metadata[filename] = file_meta
-        _save_media_metadata(metadata)
+        with _metadata_db() as conn:
+            row = conn.execute('SELECT creator FROM media WHERE filename = ?', (filename,)).fetchone()
+            
+            if not row:
+                return {'success': False, 'error': 'File not found in metadata'}
+            
+            if row['creator'] != username:
+                return {'success': False, 'error': 'Only the creator can rename the file'}
+            
+            # Validate new display name
+            if not new_display_name or not new_display_name.strip():
+                return {'success': False, 'error': 'Display name cannot be empty'}
+            
+            new_display_name = new_display_name.strip()
+            
+            # Update the original_name (display name)
+            conn.execute('UPDATE media SET original_name = ? WHERE filename = ?', (new_display_name, filename))
         
         return {'success': True, 'original_name': new_display_name}
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
-def count_media_references(filename):
-    """Count how many quizzes reference a media file."""
-    try:
-        from app.utils.quiz_storage import get_quizes_folder, load_quiz
+def _ensure_references_indexed(conn):
+    """Build the reference index from the existing quiz files on first use."""
+    db_path = str(get_media_metadata_db())
+    if db_path in _reference_indexed_databases:
+        return
+
+    indexed = conn.execute("SELECT 1 FROM store_meta WHERE key = 'quiz_refs_indexed'").fetchone()
+    if not indexed:
+        from app.utils.quiz_storage import get_quizes_folder
         from app.utils.migration import extract_media_references
-        
+
         quizes_folder = get_quizes_folder()
-        if not quizes_folder.exists():
-            return 0
-        
-        count = 0
-        for quiz_file in quizes_folder.glob('*.json'):
-            try:
-                quiz_data = load_quiz(quiz_file.stem)
-                if not quiz_data:
+        conn.execute('DELETE FROM media_refs')
+        if quizes_folder.exists():
+            for quiz_file in quizes_folder.glob('*.json'):
+                try:
+                    with open(quiz_file, 'r', encoding='utf-8') as f:
+                        quiz_data = json.load(f)
+                except Exception:
                     continue
-                
-                # Extract all media references from this quiz
-                media_refs = extract_media_references(quiz_data)
-                
-                # Check if this filename is referenced
-                if filename in media_refs:
-                    count += 1
-            except:
-                continue
-        
-        return count
+                conn.executemany(
+                    'INSERT OR IGNORE INTO media_refs (quiz_id, filename) VALUES (?, ?)',
+                    [(quiz_file.stem, filename) for filename in extract_media_references(quiz_data)]
+                )
+        conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('quiz_refs_indexed', '1')")
+
+    _reference_indexed_databases.add(db_path)
+
+def update_quiz_media_references(quiz_id, quiz_data):
+    """
+    Replace the indexed media references of a quiz. Called by the quiz storage
+    write paths (quiz_data=None when the quiz is deleted).
+    """
+    from app.utils.migration import extract_media_references
+
+    media_files = extract_media_references(quiz_data) if quiz_data is not None else set()
+    with _metadata_db() as conn:
+        _ensure_references_indexed(conn)
+        conn.execute('DELETE FROM media_refs WHERE quiz_id = ?', (quiz_id,))
+        conn.executemany(
+            'INSERT INTO media_refs (quiz_id, filename) VALUES (?, ?)',
+            [(quiz_id, filename) for filename in media_files]
+        )
+
+def count_media_references(filename):
+    """Count how many quizzes reference a media file."""
+    try:
+        with _metadata_db() as conn:
+            _ensure_references_indexed(conn)
+            row = conn.execute('SELECT COUNT(*) FROM media_refs WHERE filename = ?', (filename,)).fetchone()
+        return row[0]
     except Exception as e:
+        logger.error("Failed to count references to %s: %s", filename, e)
         return 0
 
+def get_media_reference_counts():
+    """
+    Get {filename: number of referencing quizzes} for every referenced media file.
+    Raises if the reference index cannot be read - unknown is not the same as zero.
+    """
+    try:
+        with _metadata_db() as conn:
+            _ensure_references_indexed(conn)
+            rows = conn.execute('SELECT filename, COUNT(*) FROM media_refs GROUP BY filename').fetchall()
+    except Exception as e:
+        logger.error("Failed to read media reference counts: %s", e)
+        raise
+    return {filename: count for filename, count in rows}
 
+def get_quizzes_using_media(filename):
+    """Get the IDs of the quizzes that reference a media file."""
+    try:
+        with _metadata_db() as conn:
+            _ensure_references_indexed(conn)
+            rows = conn.execute(
+                'SELECT quiz_id FROM media_refs WHERE filename = ? ORDER BY quiz_id', (filename,)
+            ).fetchall()
+        return [row['quiz_id'] for row in rows]
+    except Exception as e:
+        logger.error("Failed to look up quizzes using %s: %s", filename, e)
+        return []
+
+def list_orphaned_media(username=None):
+    """
+    List media files (visible to username, if given) that no quiz references.
+    Raises if the reference counts cannot be read.
+    """
+    reference_counts = get_media_reference_counts()
+    orphans = []
+    for file_info in list_media_files(username=username):
+        if reference_counts.get(file_info['filename'], 0) == 0:
+            file_info['reference_count'] = 0
+            orphans.append(file_info)
+    return orphans
+
+def find_media_by_hashes(hashes, username):
+    """
+    Find stored content with the given hashes for username's own media. Used
+    by migrations to skip uploading files the target already has.
+
+    Content only found in someone else's public file is cloned into a private
+    entry of username's (sharing the blob, like _find_duplicate dedupe), so the
+    migrated quiz does not break if the owner deletes it or makes it private.
 
+    Returns:
+        Dict mapping sha256 -> filename (owned by username) for the hashes found
+    """
+    hashes = [h for h in dict.fromkeys(hashes) if isinstance(h, str)]
+    found = {}
+    if not hashes:
+        return found
+    try:
+        uploads_folder = get_uploads_folder()
+        public_matches = {}  # sha256 -> another user's public file with that content
+        with _metadata_db() as conn:
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT sha256, filename, creator FROM media WHERE sha256 IN ({placeholders}) '
+                    f'AND (creator = ? OR public = 1) ORDER BY creator = ? DESC',
+                    batch + [username, username]
+                ).fetchall()
+                for row in rows:
+                    sha256 = row['sha256']
+                    if sha256 in found or sha256 in public_matches or not (uploads_folder / row['filename']).exists():
+                        continue
+                    if row['creator'] == username:
+                        found[sha256] = row['filename']
+                    else:
+                        public_matches[sha256] = row['filename']
+
+        for sha256, filename in public_matches.items():
+            result = clone_media_file(filename, username)
+            if result['success']:
+                found[sha256] = result['filename']
+            else:
+                logger.warning("Failed to clone %s for %s: %s", filename, username, result['error'])
+        return found
+    except Exception as e:
+        logger.warning("Failed to look up media hashes: %s", e)
+        return found
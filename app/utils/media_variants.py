@@ -0,0 +1,290 @@
+"""
+Responsive media variants.
+
+After an upload, a background task generates smaller renditions of the file
+next to its content-addressed blob (.variants/<sha256[:2]>/<sha256>/):
+
+- images: thumb / phone / hd sizes in WebP (and AVIF where Pillow supports it)
+- videos: a poster thumbnail and a lower-bitrate phone rendition (needs ffmpeg)
+
+Variants are keyed by content hash, so entries sharing a blob share variants.
+serve_media picks the best available variant for the requesting role,
+viewport width and Accept header and falls back to the original otherwise.
+"""
+import json
+import logging
+import shutil
+import subprocess
+from pathlib import Path
+from threading import Lock
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps, features
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+FFMPEG_PATH = shutil.which('ffmpeg')
+
+VARIANTS_NAME = '.variants'
+MANIFEST_NAME = 'variants.json'
+
+# Image variant name -> longest edge in pixels (smallest first)
+IMAGE_VARIANTS = {
+    'thumb': 320,
+    'phone': 1280,
+    'hd': 1920
+}
+# Video rendition name -> frame height in pixels
+VIDEO_VARIANTS = {
+    'phone': 720
+}
+# Variant used for each client role when no explicit variant or width is requested
+ROLE_VARIANTS = {
+    'participant': 'phone',
+    'display': 'hd'
+}
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+VIDEO_EXTENSIONS = {'mp4', 'webm'}
+
+_manifest_cache = {}  # sha256 -> manifest dict (only once generation finished)
+_MANIFEST_CACHE_SIZE = 1024
+_scheduled = set()  # sha256 digests with generation queued or running
+_scheduled_lock = Lock()
+
+def _get_media_kind(filename):
+    """'image', 'video' or None (no variants) based on the file extension."""
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in VIDEO_EXTENSIONS:
+        return 'video'
+    return None
+
+def _get_variants_folder(sha256):
+    """Get the folder holding a blob's variants."""
+    from app.utils.media_storage import get_uploads_folder
+    return get_uploads_folder() / VARIANTS_NAME / sha256[:2] / sha256
+
+def _image_formats():
+    """Image formats variants are written in, best compression first."""
+    formats = []
+    if features.check('avif'):
+        formats.append(('avif', 'image/avif'))
+    if features.check('webp'):
+        formats.append(('webp', 'image/webp'))
+    return formats
+
+def _generate_image_variants(source_path, folder):
+    """Write resized image variants. Returns the manifest entries."""
+    manifest = {}
+    with Image.open(source_path) as image:
+        if getattr(image, 'is_animated', False):
+            # Resizing would drop the animation - keep serving the original
+            return manifest
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'P') else 'RGB')
+
+        for name, size in IMAGE_VARIANTS.items():
+            if max(image.size) <= size:
+                # Never upscale - the original is already small enough
+                continue
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            for ext, mimetype in _image_formats():
+                variant_file = f'{name}.{ext}'
+                resized.save(folder / variant_file, quality=80)
+                manifest.setdefault(name, {})[mimetype] = variant_file
+    return manifest
+
+def _run_ffmpeg(args):
+    """Run ffmpeg quietly. Returns True on success."""
+    result = subprocess.run(
+        [FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-y'] + args,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=30 * 60
+    )
+    if result.returncode != 0:
+        logger.warning("ffmpeg failed: %s", result.stderr.decode('utf-8', 'replace')[-500:])
+    return result.returncode == 0
+
+def _generate_video_variants(source_path, folder):
+    """Write a poster thumbnail and lower-bitrate renditions. Returns the manifest entries."""
+    manifest = {}
+    if _run_ffmpeg(['-ss', '1', '-i', str(source_path), '-frames:v', '1',
+                    '-vf', f"scale='min({IMAGE_VARIANTS['thumb']},iw)':-2", str(folder / 'thumb.webp')]):
+        manifest['thumb'] = {'image/webp': 'thumb.webp'}
+
+    for name, height in VIDEO_VARIANTS.items():
+        variant_file = f'{name}.mp4'
+        if _run_ffmpeg(['-i', str(source_path),
+                        '-vf', f"scale=-2:'min({height},ih)'",
+                        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28',
+                        '-c:a', 'aac', '-b:a', '96k', '-movflags', '+faststart',
+                        str(folder / variant_file)]):
+            manifest[name] = {'video/mp4': variant_file}
+    return manifest
+
+def generate_variants(sha256, source_path, filename):
+    """
+    Generate all variants for a blob and write its manifest.
+
+    Returns:
+        The manifest dict (variant name -> {mimetype: file name})
+    """
+    kind = _get_media_kind(filename)
+    folder = _get_variants_folder(sha256)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    manifest = {}
+    if kind == 'image' and PIL_AVAILABLE:
+        manifest = _generate_image_variants(source_path, folder)
+    elif kind == 'video' and FFMPEG_PATH:
+        manifest = _generate_video_variants(source_path, folder)
+
+    _write_manifest(folder, {'kind': kind, 'variants': manifest})
+    return manifest
+
+def _write_manifest(folder, data):
+    """Atomically write a blob's manifest."""
+    temp_manifest = folder / (MANIFEST_NAME + '.tmp')
+    with open(temp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    temp_manifest.replace(folder / MANIFEST_NAME)
+
+def _variant_task(sha256, source_path, filename):
+    """Background task wrapper - variant generation must never take the server down."""
+    try:
+        from app import socketio
+        if socketio.async_mode == 'eventlet':
+            # Image resizing and ffmpeg would block the event loop - run in a real OS thread
+            from eventlet import tpool
+            tpool.execute(generate_variants, sha256, source_path, filename)
+        else:
+            generate_variants(sha256, source_path, filename)
+    except Exception as e:
+        logger.warning("Failed to generate variants for %s: %s", filename, e)
+        # Record the failure so the blob is served as the original from now on instead of retried per request
+        try:
+            folder = _get_variants_folder(sha256)
+            folder.mkdir(parents=True, exist_ok=True)
+            _write_manifest(folder, {'kind': _get_media_kind(filename), 'variants': {}, 'error': str(e)})
+        except OSError as write_error:
+            logger.warning("Failed to record variant failure for %s: %s", filename, write_error)
+    finally:
+        with _scheduled_lock:
+            _scheduled.discard(sha256)
+
+def can_generate_variants(filename):
+    """True if variants can be generated for this file type in this environment."""
+    kind = _get_media_kind(filename)
+    return (kind == 'image' and PIL_AVAILABLE) or (kind == 'video' and FFMPEG_PATH is not None)
+
+def schedule_variants(sha256, source_path, filename):
+    """Generate a blob's variants in the background (once per blob)."""
+    if not sha256 or not can_generate_variants(filename):
+        return
+    if (_get_variants_folder(sha256) / MANIFEST_NAME).exists():
+        return
+    with _scheduled_lock:
+        if sha256 in _scheduled:
+            return
+        _scheduled.add(sha256)
+
+    from app import socketio
+    socketio.start_background_task(_variant_task, sha256, Path(source_path), filename)
+
+def _load_manifest(sha256):
+    """Load a blob's variant manifest, or None if variants have not been generated."""
+    manifest = _manifest_cache.get(sha256)
+    metrics.count_cache('media_variants_manifest', manifest is not None)
+    if manifest is not None:
+        return manifest
+    try:
+        with open(_get_variants_folder(sha256) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f).get('variants', {})
+    except (OSError, ValueError):
+        return None
+    if len(_manifest_cache) >= _MANIFEST_CACHE_SIZE:
+        _manifest_cache.clear()
+    _manifest_cache[sha256] = manifest
+    return manifest
+
+def _pick_variant_name(kind, variant=None, role=None, width=None):
+    """Choose which variant a request wants (None for the original)."""
+    sizes = IMAGE_VARIANTS if kind == 'image' else VIDEO_VARIANTS
+    if variant:
+        return variant if variant in sizes or variant == 'thumb' else None
+    if width and kind == 'image':
+        # Smallest variant that still covers the requested width
+        for name, size in sizes.items():
+            if size >= width:
+                return name
+        return None
+    if role == 'display' and kind == 'video':
+        # The display is the big screen - keep full quality video
+        return None
+    return ROLE_VARIANTS.get(role)
+
+def find_variant(sha256, filename, accept_mimetypes, variant=None, role=None, width=None):
+    """
+    Find the variant to serve for a request.
+
+    Args:
+        sha256: Content hash of the requested file
+        filename: Stored filename (used for the media kind)
+        accept_mimetypes: The request's Accept header (werkzeug MIMEAccept)
+        variant: Explicit variant name (?variant=)
+        role: Client role, 'participant' or 'display' (?role=)
+        width: Viewport width in device pixels (?w=)
+
+    Returns:
+        Tuple of (variant name, Path, mimetype), or None to serve the original.
+        Blobs without variants are scheduled for generation.
+    """
+    kind = _get_media_kind(filename)
+    if not sha256 or not kind:
+        return None
+
+    name = _pick_variant_name(kind, variant, role, width)
+    if not name:
+        return None
+
+    manifest = _load_manifest(sha256)
+    if manifest is None:
+        from app.utils.media_storage import get_media_file_path
+        schedule_variants(sha256, get_media_file_path(filename), filename)
+        return None
+
+    # Only formats the client names explicitly - */* does not mean it can decode AVIF
+    accepted = {value for value, quality in accept_mimetypes if quality > 0}
+    formats = manifest.get(name) or {}
+    for mimetype, variant_file in formats.items():
+        if mimetype.startswith('video/') or mimetype in accepted:
+            variant_path = _get_variants_folder(sha256) / variant_file
+            if variant_path.exists():
+                return name, variant_path, mimetype
+    return None
+
+def variants_pending(sha256, filename, variant=None, role=None, width=None):
+    """
+    True if a request wants a variant that has not been generated yet (it is
+    served the original for now, and should not be cached as final).
+    """
+    kind = _get_media_kind(filename)
+    if not sha256 or not kind or not can_generate_variants(filename):
+        return False
+    if not _pick_variant_name(kind, variant, role, width):
+        return False
+    return sha256 not in _manifest_cache and not (_get_variants_folder(sha256) / MANIFEST_NAME).exists()
+
+def delete_variants(sha256):
+    """Delete a blob's variants (when the blob itself is deleted)."""
+    _manifest_cache.pop(sha256, None)
+    folder = _get_variants_folder(sha256)
+    if folder.exists():
+        shutil.rmtree(folder, ignore_errors=True)
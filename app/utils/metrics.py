@@ -0,0 +1,142 @@
+"""
+In-process metrics, served in the Prometheus text format at /metrics.
+
+Counters and histograms are plain dicts updated under one lock, cheap
+enough for per-event hot paths. Gauges (active rooms, participants,
+sockets, ...) and counters kept elsewhere (Socket.IO payload stats) are
+read by collectors when the endpoint is scraped.
+
+    metrics.inc('quizia_cache_requests_total', cache='join_payload', result='hit')
+    metrics.observe('quizia_room_save_seconds', elapsed)
+"""
+import time
+from bisect import bisect_left
+from functools import wraps
+from threading import Lock
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Metric name -> (type, help)
+METRICS = {
+    'quizia_rooms_active': ('gauge', 'Rooms currently running'),
+    'quizia_participants': ('gauge', 'Participants in running rooms'),
+    'quizia_participants_connected': ('gauge', 'Participants in running rooms with a live connection'),
+    'quizia_sockets': ('gauge', 'Connected Socket.IO clients that joined a room, by role'),
+    'quizia_socketio_events_total': ('counter', 'Socket.IO events received, by event name'),
+    'quizia_socketio_handler_seconds': ('histogram', 'Socket.IO event handler latency, by event name'),
+    'quizia_socketio_handler_errors_total': ('counter', 'Socket.IO event handlers that raised, by event name'),
+    'quizia_socketio_emitted_total': ('counter', 'Socket.IO events sent (broadcasts count once), by event name'),
+    'quizia_socketio_emitted_bytes_total': ('counter', 'Encoded bytes of Socket.IO events sent, by event name'),
+    'quizia_socketio_oversized_total': ('counter', 'Socket.IO events sent over their payload budget, by event name'),
+    'quizia_room_saves_total': ('counter', 'Room state files written'),
+    'quizia_room_save_bytes_total': ('counter', 'Bytes of room state files written'),
+    'quizia_room_save_seconds': ('histogram', 'Time to write a room state file'),
+    'quizia_render_queue_depth': ('gauge', 'TV display renders in progress'),
+    'quizia_render_seconds': ('histogram', 'TV display render latency'),
+    'quizia_render_failures_total': ('counter', 'TV display renders that failed'),
+    'quizia_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit or miss)')
+}
+
+_lock = Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [count per bucket..., count above the last bucket, sum]
+_collectors = []
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+def inc(name, value=1, **labels):
+    """Add to a counter."""
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, **labels):
+    """Record a histogram observation (seconds for latency histograms)."""
+    key = (name, _label_key(labels))
+    index = bisect_left(LATENCY_BUCKETS, value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        histogram[index] += 1
+        histogram[-1] += value
+
+def count_cache(cache, hit):
+    """Count a cache lookup."""
+    inc('quizia_cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+def register_collector(collect):
+    """
+    Register a function called on every scrape. It returns an iterable of
+    (metric name, labels dict, value) for metrics described in METRICS.
+    """
+    if collect not in _collectors:
+        _collectors.append(collect)
+
+def timed(name, **labels):
+    """Decorator recording a function's run time in a histogram."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    samples = {}  # name -> list of (labels, value) for counters and gauges
+    with _lock:
+        for (name, labels), value in _counters.items():
+            samples.setdefault(name, []).append((labels, value))
+        histograms = {key: list(values) for key, values in _histograms.items()}
+
+    for collect in _collectors:
+        try:
+            for name, labels, value in collect():
+                samples.setdefault(name, []).append((_label_key(labels), value))
+        except Exception as e:
+            import logging
+            logging.getLogger(__name__).warning("Metrics collector %s failed: %s", collect.__name__, e)
+
+    by_name = {}
+    for (name, labels), values in histograms.items():
+        by_name.setdefault(name, []).append((labels, values))
+
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        if name not in samples and name not in by_name:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        if metric_type == 'histogram':
+            for labels, values in sorted(by_name.get(name, [])):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, values):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", repr(bound)),))} {cumulative}')
+                cumulative += values[len(LATENCY_BUCKETS)]
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(values[-1])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        else:
+            for labels, value in sorted(samples[name]):
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
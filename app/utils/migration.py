@@ -1,16 +1,25 @@
 """
 Quiz migration utilities for migrating quizzes from localhost to server.
 """
+import hashlib
 import json
+import logging
+import marshal
 import re
 import os
+import threading
+import time
+import uuid
 from pathlib import Path
 from flask import current_app
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Set, Any, Optional
 import paramiko
 from io import BytesIO
 
+logger = logging.getLogger(__name__)
+
 def get_server_url():
     """Get the server URL from environment variable."""
     return os.environ.get('MIGRATION_SERVER_URL', 'http://40.233.70.245')
@@ -20,7 +29,8 @@ def get_ssh_config():
     return {
         'host': os.environ.get('MIGRATION_SSH_HOST', '40.233.70.245'),
         'user': os.environ.get('MIGRATION_SSH_USER', 'root'),
-        'key_path': os.environ.get('MIGRATION_SSH_KEY_PATH', 'ssh/ssh-key-2025-12-26.key')
+        'key_path': os.environ.get('MIGRATION_SSH_KEY_PATH', 'ssh/ssh-key-2025-12-26.key'),
+        'uploads_path': os.environ.get('MIGRATION_SSH_UPLOADS_PATH', '/path/to/app/uploads')
     }
 
 def is_localhost():
@@ -38,66 +48,104 @@ def is_localhost():
         pass
     return False
 
-def extract_media_references(quiz_data: Dict) -> Set[str]:
-    """
-    Extract all media file references from a quiz.
-    Returns a set of filenames (without /api/media/serve/ prefix).
-    """
+# Keys whose string values name a media file
+_MEDIA_KEYS = frozenset(('media_url', 'file_name', 'filename', 'image_url', 'src', 'url'))
+_MEDIA_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg',
+                     '.mp4', '.webm', '.mp3', '.wav', '.ogg', '.pdf')
+_MEDIA_SERVE_PATH = '/api/media/serve/'
+_MEDIA_SERVE_RE = re.compile(r'/api/media/serve/([^\s"\'<>?]+)')
+# Values that can never contain a reference (skipped without being pushed)
+_SCALAR_TYPES = frozenset((int, float, bool, type(None)))
+
+_media_reference_cache = {}  # quiz content digest -> frozenset of filenames
+_MEDIA_REFERENCE_CACHE_SIZE = 256
+
+def _add_path_reference(media_files, value):
+    """Add a bare filename or path reference (not a full URL)."""
+    if not value.startswith(('http://', 'https://')):
+        # If it starts with /, it might be a path - extract just the filename
+        if value.startswith('/'):
+            filename = os.path.basename(value)
+            if filename:
+                media_files.add(filename)
+        else:
+            media_files.add(value)
+
+def _walk_media_references(quiz_data):
+    """Single iterative pass over the quiz structure collecting media filenames."""
     media_files = set()
-    
-    def extract_from_value(value, key=None):
-        """Recursively extract media references from any value."""
-        if isinstance(value, dict):
-            # Check for specific media-related keys
+    add = media_files.add
+    serve_path = _MEDIA_SERVE_PATH
+    extensions = _MEDIA_EXTENSIONS
+    media_keys = _MEDIA_KEYS
+    search = _MEDIA_SERVE_RE.search
+    findall = _MEDIA_SERVE_RE.findall
+
+    stack = [quiz_data]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        value = pop()
+        value_type = type(value)
+        if value_type is dict:
             for k, v in value.items():
-                if k in ('media_url', 'file_name', 'filename', 'image_url', 'src', 'url'):
-                    if isinstance(v, str) and v:
-                        # Extract filename from URL or use as-is
-                        if '/api/media/serve/' in v:
-                            match = re.search(r'/api/media/serve/([^\s"\'<>?]+)', v)
+                if k in media_keys:
+                    # Media keys hold a single reference - extract it, never descend
+                    if type(v) is str and v:
+                        if serve_path in v:
+                            match = search(v)
                             if match:
-                                filename = match.group(1)
-                                media_files.add(filename)
-                        elif v.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', 
-                                       '.mp4', '.webm', '.mp3', '.wav', '.ogg', '.pdf')):
-                            # Only add if it looks like a filename (not a full URL)
-                            if not v.startswith(('http://', 'https://')):
-                                # If it starts with /, it might be a path - extract just the filename
-                                if v.startswith('/'):
-                                    filename = os.path.basename(v)
-                                    if filename:
-                                        media_files.add(filename)
-                                else:
-                                    media_files.add(v)
-                else:
-                    extract_from_value(v, k)
-        elif isinstance(value, list):
-            for item in value:
-                extract_from_value(item, key)
-        elif isinstance(value, str):
+                                add(match.group(1))
+                        elif v.endswith(extensions):
+                            _add_path_reference(media_files, v)
+                elif type(v) not in _SCALAR_TYPES:
+                    push(v)
+        elif value_type is list:
+            stack.extend(value)
+        elif value_type is str:
             # Check for /api/media/serve/ URLs in any string
-            if '/api/media/serve/' in value:
-                # Extract filename
-                matches = re.findall(r'/api/media/serve/([^\s"\'<>?]+)', value)
-                for match in matches:
-                    filename = match.split('?')[0].split('#')[0]
-                    media_files.add(filename)
+            if serve_path in value:
+                for filename in findall(value):
+                    add(filename.split('#')[0])
             # Also check for direct filename references
-            elif value.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', 
-                               '.mp4', '.webm', '.mp3', '.wav', '.ogg', '.pdf')):
-                # Only add if it looks like a filename (not a full URL)
-                if not value.startswith(('http://', 'https://')):
-                    if value.startswith('/'):
-                        filename = os.path.basename(value)
-                        if filename:
-                            media_files.add(filename)
-                    else:
-                        media_files.add(value)
+            elif value.endswith(extensions):
+                _add_path_reference(media_files, value)
+        # Rare subclasses (e.g. OrderedDict) - convert and process like the base type
+        elif isinstance(value, dict):
+            push(dict(value))
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, str):
+            push(str(value))
+    return media_files
+
+def extract_media_references(quiz_data: Dict, cache: bool = False) -> Set[str]:
+    """
+    Extract all media file references from a quiz.
+    Returns a set of filenames (without /api/media/serve/ prefix).
     
-    # Extract from entire quiz data
-    extract_from_value(quiz_data)
+    With cache=True results are memoized by a hash of the quiz content, which
+    pays off for callers that see the same quiz repeatedly (room creation,
+    copies, migrations). The key is a marshal dump of the data: a faithful C-level
+    serialization several times cheaper than the walk (and than json.dumps).
+    """
+    if not cache:
+        return _walk_media_references(quiz_data)
     
-    return media_files
+    try:
+        content = marshal.dumps(quiz_data)
+    except ValueError:
+        # Not plain data (custom objects) - walk without caching
+        return _walk_media_references(quiz_data)
+    content_hash = hashlib.sha1(content).digest()
+    
+    cached = _media_reference_cache.get(content_hash)
+    if cached is None:
+        cached = frozenset(_walk_media_references(quiz_data))
+        if len(_media_reference_cache) >= _MEDIA_REFERENCE_CACHE_SIZE:
+            _media_reference_cache.clear()
+        _media_reference_cache[content_hash] = cached
+    return set(cached)
 
 def update_media_urls(quiz_data: Dict, server_url: str) -> Dict:
     """
@@ -148,126 +196,295 @@ def update_media_urls(quiz_data: Dict, server_url: str) -> Dict:
     
     return update_value(updated_quiz)
 
-def upload_file_via_ssh(file_path: Path, remote_path: str, ssh_config: Dict) -> bool:
-    """
-    Upload a file to the server via SSH.
-    Returns True if successful, False otherwise.
-    """
+MIGRATIONS_FOLDER = Path(__file__).parent.parent / 'data' / 'migrations'
+
+def get_migration_workers():
+    """Number of media files uploaded concurrently during a migration."""
     try:
-        # Read SSH private key
-        key_path = Path(ssh_config['key_path'])
-        if not key_path.exists():
-            # Try relative to project root
-            key_path = Path(__file__).parent.parent.parent / ssh_config['key_path']
-        
-        if not key_path.exists():
-            raise FileNotFoundError(f"SSH key not found at {key_path}")
-        
-        # Try to find private key (might be .key without .pub extension)
-        private_key_path = key_path
-        if key_path.name.endswith('.pub'):
-            private_key_path = key_path.parent / key_path.stem
-        
-        if not private_key_path.exists():
-            raise FileNotFoundError(f"SSH private key not found at {private_key_path}")
-        
-        # Load private key
+        return max(1, int(os.environ.get('MIGRATION_WORKERS', '4')))
+    except ValueError:
+        return 4
+
+def _login_session(server_url: str, username: str, password: str, pool_size: int = 4) -> Optional[requests.Session]:
+    """Log in to the target server once and return the authenticated session (None on failure)."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    
+    login_response = session.post(f"{server_url}/api/auth/login", json={
+        'username': username,
+        'password': password
+    }, timeout=10)
+    if login_response.status_code != 200:
+        session.close()
+        return None
+    return session
+
+def _load_ssh_key(ssh_config: Dict):
+    """Load the SSH private key named in the config."""
+    key_path = Path(ssh_config['key_path'])
+    if not key_path.exists():
+        # Try relative to project root
+        key_path = Path(__file__).parent.parent.parent / ssh_config['key_path']
+    
+    if not key_path.exists():
+        raise FileNotFoundError(f"SSH key not found at {key_path}")
+    
+    # Try to find private key (might be .key without .pub extension)
+    private_key_path = key_path
+    if key_path.name.endswith('.pub'):
+        private_key_path = key_path.parent / key_path.stem
+    
+    if not private_key_path.exists():
+        raise FileNotFoundError(f"SSH private key not found at {private_key_path}")
+    
+    try:
+        return paramiko.RSAKey.from_private_key_file(str(private_key_path))
+    except:
+        # Try other key types
         try:
-            private_key = paramiko.RSAKey.from_private_key_file(str(private_key_path))
+            return paramiko.Ed25519Key.from_private_key_file(str(private_key_path))
         except:
-            # Try other key types
-            try:
-                private_key = paramiko.Ed25519Key.from_private_key_file(str(private_key_path))
-            except:
-                # Try with passphrase (empty for now)
-                private_key = paramiko.RSAKey.from_private_key_file(str(private_key_path), password='')
-        
-        # Connect via SSH
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        ssh.connect(
+            # Try with passphrase (empty for now)
+            return paramiko.RSAKey.from_private_key_file(str(private_key_path), password='')
+
+class ApiMediaTarget:
+    """Uploads media through the target server's media API over one authenticated session."""
+    
+    def __init__(self, session: requests.Session, server_url: str):
+        self.session = session
+        self.server_url = server_url
+    
+    def find_existing(self, hashes_by_filename: Dict[str, str]) -> Dict[str, str]:
+        """Map local filenames to target filenames for content the target already has."""
+        try:
+            response = self.session.post(f"{self.server_url}/api/media/lookup-hashes", json={
+                'hashes': list(set(hashes_by_filename.values()))
+            }, timeout=30)
+            if response.status_code != 200:
+                # Older target without hash lookup - upload everything
+                return {}
+            found = response.json().get('found', {})
+        except Exception as e:
+            logger.warning("Media hash lookup failed, uploading all files: %s", e)
+            return {}
+        return {filename: found[sha256] for filename, sha256 in hashes_by_filename.items() if sha256 in found}
+    
+    def upload(self, file_path: Path, filename: str) -> Optional[str]:
+        """Upload one file. Returns the target's filename, or None on failure."""
+        try:
+            with open(file_path, 'rb') as f:
+                files = {'file': (filename, f, 'application/octet-stream')}
+                upload_response = self.session.post(f"{self.server_url}/api/media/upload",
+                                                    files=files, data={'public': 'false'}, timeout=300)
+            if upload_response.status_code == 200:
+                return upload_response.json().get('filename', filename)
+            logger.error("Error uploading file via API: %s: HTTP %s", filename, upload_response.status_code)
+            return None
+        except Exception as e:
+            logger.error("Error uploading file via API: %s: %s", filename, e)
+            return None
+    
+    def close(self):
+        pass
+
+class SshMediaTarget:
+    """Uploads media over one SSH connection, with an SFTP channel per worker thread."""
+    
+    def __init__(self, ssh_config: Dict):
+        self.remote_dir = ssh_config.get('uploads_path', '/path/to/app/uploads')
+        self.ssh = paramiko.SSHClient()
+        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.ssh.connect(
             hostname=ssh_config['host'],
             username=ssh_config['user'],
-            pkey=private_key,
+            pkey=_load_ssh_key(ssh_config),
             timeout=30
         )
+        self._local = threading.local()
+        self._channels = []
+        self._channels_lock = threading.Lock()
+    
+    def _sftp(self):
+        """This thread's SFTP channel (SFTP clients must not be shared between threads)."""
+        sftp = getattr(self._local, 'sftp', None)
+        if sftp is None:
+            sftp = self.ssh.open_sftp()
+            self._local.sftp = sftp
+            with self._channels_lock:
+                self._channels.append(sftp)
+        return sftp
+    
+    def find_existing(self, hashes_by_filename: Dict[str, str]) -> Dict[str, str]:
+        """Map local filenames to remote files that already have the same content (via sha256sum)."""
+        if not hashes_by_filename:
+            return {}
+        import shlex
+        paths = ' '.join(shlex.quote(f'{self.remote_dir}/{filename}') for filename in hashes_by_filename)
+        try:
+            _, stdout, _ = self.ssh.exec_command(f'sha256sum -- {paths} 2>/dev/null', timeout=120)
+            output = stdout.read().decode('utf-8', 'replace')
+        except Exception as e:
+            logger.warning("Remote hash check failed, uploading all files: %s", e)
+            return {}
+        existing = {}
+        for line in output.splitlines():
+            parts = line.split(None, 1)
+            if len(parts) == 2:
+                filename = os.path.basename(parts[1].strip())
+                if hashes_by_filename.get(filename) == parts[0]:
+                    existing[filename] = filename
+        return existing
+    
+    def upload(self, file_path: Path, filename: str) -> Optional[str]:
+        """
+        Upload one file. Returns the remote filename, or None on failure.
         
-        # Use SFTP to upload file
-        sftp = ssh.open_sftp()
-        
-        # Ensure remote directory exists
-        remote_dir = os.path.dirname(remote_path)
-        if remote_dir:
+        Remote uploads are hard links to shared content-addressed blobs, so the
+        file is written under a temporary name and renamed over the target:
+        the path gets a new inode and the blob it pointed to is left untouched.
+        """
+        remote_path = f'{self.remote_dir}/{filename}'
+        temp_path = f'{self.remote_dir}/.{filename}.{uuid.uuid4().hex[:8]}.part'
+        try:
+            sftp = self._sftp()
             try:
-                sftp.mkdir(remote_dir)
+                sftp.mkdir(self.remote_dir)
             except IOError:
                 pass  # Directory might already exist
-        
-        # Upload file
-        sftp.put(str(file_path), remote_path)
-        sftp.close()
-        ssh.close()
-        
-        return True
-    except Exception as e:
-        print(f"Error uploading file via SSH: {e}")
-        return False
+            sftp.put(str(file_path), temp_path)
+            try:
+                sftp.posix_rename(temp_path, remote_path)
+            except IOError:
+                # Server without the posix-rename extension - plain rename cannot overwrite
+                try:
+                    sftp.remove(remote_path)
+                except IOError:
+                    pass
+                sftp.rename(temp_path, remote_path)
+            return filename
+        except Exception as e:
+            logger.error("Error uploading file via SSH: %s: %s", filename, e)
+            try:
+                self._sftp().remove(temp_path)
+            except Exception:
+                pass
+            return None
+    
+    def close(self):
+        with self._channels_lock:
+            for sftp in self._channels:
+                try:
+                    sftp.close()
+                except Exception:
+                    pass
+        self.ssh.close()
+
+def _get_checkpoint_path(quiz_id: str, server_url: str, use_ssh: bool) -> Path:
+    """Checkpoint file recording the media already uploaded for a quiz migration."""
+    target = hashlib.sha1(f"{'ssh' if use_ssh else 'api'}:{server_url}".encode('utf-8')).hexdigest()[:12]
+    return MIGRATIONS_FOLDER / f'{quiz_id}-{target}.json'
+
+def _load_checkpoint(checkpoint_path: Path) -> Dict[str, Dict[str, str]]:
+    """Load uploaded files from a checkpoint ({local filename: {'sha256', 'remote'}})."""
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('uploaded', {})
+    except (OSError, ValueError):
+        return {}
 
-def upload_file_via_api(file_path: Path, filename: str, server_url: str, 
-                        username: str, password: str) -> Optional[str]:
+def _save_checkpoint(checkpoint_path: Path, uploaded: Dict[str, Dict[str, str]]):
+    """Write a checkpoint atomically."""
+    checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = checkpoint_path.with_suffix('.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'uploaded': uploaded, 'updated_at': time.time()}, f)
+    os.replace(temp_path, checkpoint_path)
+
+def upload_media_files(media_paths: Dict[str, Path], target, checkpoint_path: Path,
+                       workers: int) -> Dict[str, Any]:
     """
-    Upload a media file to the server via API.
-    Returns the uploaded filename if successful, None otherwise.
+    Upload media files to a migration target, skipping files the target
+    already has (by content hash) or that an earlier run uploaded (checkpoint).
+    
+    Args:
+        media_paths: Local filename -> local path
+        target: ApiMediaTarget or SshMediaTarget
+        checkpoint_path: Where progress is recorded so a rerun resumes
+        workers: Maximum concurrent uploads
+    
+    Returns:
+        Dict with 'uploaded' (local -> remote filename for every file now on the
+        target), 'transferred' and 'skipped' counts, and 'failed' (filenames)
     """
-    try:
-        # First, login to get session
-        login_url = f"{server_url}/api/auth/login"
-        session = requests.Session()
-        
-        login_response = session.post(login_url, json={
-            'username': username,
-            'password': password
-        }, timeout=10)
-        
-        if login_response.status_code != 200:
-            return None
-        
-        # Upload file
-        upload_url = f"{server_url}/api/media/upload"
-        
-        with open(file_path, 'rb') as f:
-            files = {'file': (filename, f, 'application/octet-stream')}
-            data = {'public': 'false'}
-            
-            upload_response = session.post(upload_url, files=files, data=data, timeout=30)
-        
-        if upload_response.status_code == 200:
-            result = upload_response.json()
-            return result.get('filename', filename)
-        else:
-            return None
-    except Exception as e:
-        print(f"Error uploading file via API: {e}")
-        return None
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from app.utils.media_storage import get_media_file_hash
+    
+    hashes = {filename: get_media_file_hash(filename) for filename in media_paths}
+    checkpoint = _load_checkpoint(checkpoint_path)
+    
+    uploaded = {}
+    for filename, entry in checkpoint.items():
+        if filename in hashes and entry.get('sha256') == hashes[filename]:
+            uploaded[filename] = entry['remote']
+    
+    pending_hashes = {filename: sha256 for filename, sha256 in hashes.items() if filename not in uploaded}
+    uploaded.update(target.find_existing(pending_hashes))
+    skipped = len(uploaded)
+    
+    pending = [filename for filename in media_paths if filename not in uploaded]
+    failed = []
+    checkpoint_lock = threading.Lock()
+    
+    def record(filename, remote):
+        with checkpoint_lock:
+            uploaded[filename] = remote
+            checkpoint[filename] = {'sha256': hashes[filename], 'remote': remote}
+            _save_checkpoint(checkpoint_path, checkpoint)
+    
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = {pool.submit(target.upload, media_paths[filename], filename): filename for filename in pending}
+            for future in as_completed(futures):
+                filename = futures[future]
+                remote = future.result()
+                if remote:
+                    record(filename, remote)
+                else:
+                    failed.append(filename)
+    
+    return {
+        'uploaded': uploaded,
+        'transferred': len(pending) - len(failed),
+        'skipped': skipped,
+        'failed': failed
+    }
 
 def migrate_quiz(quiz_id: str, server_username: str, server_password: str, 
-                 use_ssh: bool = False) -> Dict[str, Any]:
+                 use_ssh: bool = False, server_url: Optional[str] = None,
+                 workers: Optional[int] = None) -> Dict[str, Any]:
     """
     Migrate a quiz from localhost to server.
     
+    Media is uploaded concurrently over one authenticated session (or one SSH
+    connection). Files the server already has are skipped by content hash,
+    and progress is checkpointed so a failed migration resumes when rerun.
+    
     Args:
         quiz_id: The ID of the quiz to migrate
         server_username: Username for server authentication
         server_password: Password for server authentication
         use_ssh: Whether to use SSH for file uploads (default: False, uses API)
+        server_url: Target server (default: get_server_url())
+        workers: Concurrent uploads (default: get_migration_workers())
     
     Returns:
         Dict with 'success' (bool) and 'message' (str) or 'error' (str)
     """
     try:
-        from app.utils.quiz_storage import load_quiz, get_quizes_folder
-        from app.utils.media_storage import get_media_file_path, get_uploads_folder
+        from app.utils.quiz_storage import load_quiz
+        from app.utils.media_storage import get_uploads_folder
         
         # Load quiz
         quiz_data = load_quiz(quiz_id)
@@ -275,116 +492,114 @@ def migrate_quiz(quiz_id: str, server_username: str, server_password: str,
             return {'success': False, 'error': 'Quiz not found'}
         
         # Extract media references
-        media_files = extract_media_references(quiz_data)
-        
-        server_url = get_server_url()
-        
-        # Upload media files
-        uploaded_media = {}
-        missing_media = []
-        uploads_folder = get_uploads_folder()
-        
-        for media_filename in media_files:
-            media_path = uploads_folder / media_filename
-            if not media_path.exists():
-                missing_media.append(media_filename)
-                print(f"Warning: Media file {media_filename} not found locally, will skip upload")
-                continue
-            
-            if use_ssh:
-                # Upload via SSH
-                ssh_config = get_ssh_config()
-                remote_path = f"/path/to/app/uploads/{media_filename}"  # Adjust path as needed
-                if upload_file_via_ssh(media_path, remote_path, ssh_config):
-                    uploaded_media[media_filename] = media_filename
-                else:
-                    return {'success': False, 'error': f'Failed to upload media file: {media_filename}'}
-            else:
-                # Upload via API
-                uploaded_filename = upload_file_via_api(
-                    media_path, media_filename, server_url, 
-                    server_username, server_password
-                )
-                if uploaded_filename:
-                    uploaded_media[media_filename] = uploaded_filename
-                else:
-                    return {'success': False, 'error': f'Failed to upload media file: {media_filename}'}
-        
-        # Warn about missing media files but continue
-        warning_msg = ''
-        if missing_media:
-            warning_msg = f' Warning: {len(missing_media)} media file(s) not found locally and were skipped.'
-        
-        # Update media URLs in quiz data
-        updated_quiz = update_media_urls(quiz_data, server_url)
-        
-        # Update filenames if server renamed any files
-        def update_filenames(value):
-            """Recursively update filenames if they were renamed on server."""
-            if isinstance(value, dict):
-                for k, v in value.items():
-                    if k in ('file_name', 'filename') and isinstance(v, str) and v in uploaded_media:
-                        # Update to the server's filename
-                        value[k] = uploaded_media[v]
-                    else:
-                        value[k] = update_filenames(v)
-            elif isinstance(value, list):
-                return [update_filenames(item) for item in value]
-            elif isinstance(value, str):
-                # Check if this string is a filename that was renamed
-                if value in uploaded_media and uploaded_media[value] != value:
-                    return uploaded_media[value]
-                # Also check if it's a URL with a renamed filename
-                if '/api/media/serve/' in value:
-                    for old_name, new_name in uploaded_media.items():
-                        if old_name != new_name and f'/api/media/serve/{old_name}' in value:
-                            value = value.replace(f'/api/media/serve/{old_name}', f'/api/media/serve/{new_name}')
-            return value
+        media_files = extract_media_references(quiz_data, cache=True)
         
-        updated_quiz = update_filenames(updated_quiz)
+        server_url = (server_url or get_server_url()).rstrip('/')
+        workers = workers or get_migration_workers()
         
-        # Update creator to server username
-        updated_quiz['creator'] = server_username
+        # One authenticated session for media uploads and the quiz save
+        session = _login_session(server_url, server_username, server_password, pool_size=workers)
+        if session is None:
+            return {'success': False, 'error': 'Failed to authenticate with server'}
         
-        # Upload quiz to server
         try:
-            # Login to server
-            login_url = f"{server_url}/api/auth/login"
-            session = requests.Session()
-            
-            login_response = session.post(login_url, json={
-                'username': server_username,
-                'password': server_password
-            }, timeout=10)
-            
-            if login_response.status_code != 200:
-                return {'success': False, 'error': 'Failed to authenticate with server'}
+            media_paths = {}
+            missing_media = []
+            uploads_folder = get_uploads_folder()
+            for media_filename in media_files:
+                media_path = uploads_folder / media_filename
+                if not media_path.exists():
+                    missing_media.append(media_filename)
+                    logger.warning("Media file %s not found locally, will skip upload", media_filename)
+                    continue
+                media_paths[media_filename] = media_path
             
-            # Save quiz on server
-            save_url = f"{server_url}/api/quiz/save"
-            save_response = session.post(save_url, json={
-                'quiz': updated_quiz,
-                'id': quiz_id,
-                'force_recreate': True
-            }, timeout=30)
+            target = SshMediaTarget(get_ssh_config()) if use_ssh else ApiMediaTarget(session, server_url)
+            checkpoint_path = _get_checkpoint_path(quiz_id, server_url, use_ssh)
+            try:
+                upload_result = upload_media_files(media_paths, target, checkpoint_path, workers)
+            finally:
+                target.close()
             
-            if save_response.status_code == 200:
-                message = f'Quiz migrated successfully. {len(uploaded_media)} media file(s) uploaded.'
-                if missing_media:
-                    message += f' {len(missing_media)} media file(s) were not found locally and were skipped.'
-                return {
-                    'success': True,
-                    'message': message
-                }
-            else:
-                error_data = save_response.json() if save_response.content else {}
+            if upload_result['failed']:
                 return {
                     'success': False,
-                    'error': error_data.get('error', 'Failed to save quiz on server')
+                    'error': f"Failed to upload {len(upload_result['failed'])} media file(s): "
+                             f"{', '.join(sorted(upload_result['failed']))}. Run the migration again to resume."
                 }
-        except Exception as e:
-            return {'success': False, 'error': f'Failed to save quiz on server: {str(e)}'}
+            uploaded_media = upload_result['uploaded']
+            
+            # Warn about missing media files but continue
+            warning_msg = ''
+            if missing_media:
+                warning_msg = f' Warning: {len(missing_media)} media file(s) not found locally and were skipped.'
+            
+            # Update media URLs in quiz data
+            updated_quiz = update_media_urls(quiz_data, server_url)
+            
+            # Update filenames if server renamed any files
+            def update_filenames(value):
+                """Recursively update filenames if they were renamed on server."""
+                if isinstance(value, dict):
+                    for k, v in value.items():
+                        if k in ('file_name', 'filename') and isinstance(v, str) and v in uploaded_media:
+                            # Update to the server's filename
+                            value[k] = uploaded_media[v]
+                        else:
+                            value[k] = update_filenames(v)
+                elif isinstance(value, list):
+                    return [update_filenames(item) for item in value]
+                elif isinstance(value, str):
+                    # Check if this string is a filename that was renamed
+                    if value in uploaded_media and uploaded_media[value] != value:
+                        return uploaded_media[value]
+                    # Also check if it's a URL with a renamed filename
+                    if '/api/media/serve/' in value:
+                        for old_name, new_name in uploaded_media.items():
+                            if old_name != new_name and f'/api/media/serve/{old_name}' in value:
+                                value = value.replace(f'/api/media/serve/{old_name}', f'/api/media/serve/{new_name}')
+                return value
+            
+            updated_quiz = update_filenames(updated_quiz)
+            
+            # Update creator to server username
+            updated_quiz['creator'] = server_username
+            
+            # Upload quiz to server (same session as the media uploads)
+            try:
+                save_url = f"{server_url}/api/quiz/save"
+                save_response = session.post(save_url, json={
+                    'quiz': updated_quiz,
+                    'id': quiz_id,
+                    'force_recreate': True
+                }, timeout=30)
+                
+                if save_response.status_code == 200:
+                    # Migration complete - the next run starts from scratch
+                    try:
+                        checkpoint_path.unlink()
+                    except FileNotFoundError:
+                        pass
+                    message = (f"Quiz migrated successfully. {upload_result['transferred']} media file(s) uploaded, "
+                               f"{upload_result['skipped']} already on the server.")
+                    if missing_media:
+                        message += f' {len(missing_media)} media file(s) were not found locally and were skipped.'
+                    return {
+                        'success': True,
+                        'message': message,
+                        'uploaded': upload_result['transferred'],
+                        'skipped': upload_result['skipped']
+                    }
+                else:
+                    error_data = save_response.json() if save_response.content else {}
+                    return {
+                        'success': False,
+                        'error': error_data.get('error', 'Failed to save quiz on server')
+                    }
+            except Exception as e:
+                return {'success': False, 'error': f'Failed to save quiz on server: {str(e)}'}
+        finally:
+            session.close()
     
     except Exception as e:
         return {'success': False, 'error': f'Migration failed: {str(e)}'}
-
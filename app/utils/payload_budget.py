@@ -0,0 +1,112 @@
+"""
+Socket.IO payload size budgets.
+
+Every outgoing event packet is measured as it is encoded (no extra
+serialization) and checked against a byte budget for its event type.
+Oversized emits are counted and logged, so a change that starts shipping
+the whole quiz in a hot event shows up in the logs and stats right away.
+"""
+import logging
+import os
+import time
+from threading import Lock
+
+from socketio import packet
+from app.utils import metrics
+from app.utils.event_trace import record_emit
+
+logger = logging.getLogger(__name__)
+
+# Full-state events legitimately carry the whole quiz
+SNAPSHOT_PAYLOAD_BUDGET = 2 * 1024 * 1024
+# Everything else is sent often (to every participant) and should stay small
+DEFAULT_PAYLOAD_BUDGET = int(os.environ.get('SOCKETIO_PAYLOAD_BUDGET_KB', '64')) * 1024
+
+# Event name -> budget in encoded bytes (events not listed use DEFAULT_PAYLOAD_BUDGET)
+PAYLOAD_BUDGETS = {
+    'joined_room': SNAPSHOT_PAYLOAD_BUDGET,
+    'joined_control': SNAPSHOT_PAYLOAD_BUDGET,
+    'display_state': SNAPSHOT_PAYLOAD_BUDGET,
+    'quiz_state': SNAPSHOT_PAYLOAD_BUDGET,
+    'session_resumed': SNAPSHOT_PAYLOAD_BUDGET,
+    # Re-rendering a running quiz sends the updated quiz with the page
+    'page_changed': 512 * 1024,
+    'answers_submitted': 256 * 1024,
+    'quiz_ended': 256 * 1024,
+    'final_scores_finalized': 256 * 1024,
+    'participant_presence': 16 * 1024,
+    'answer_ack': 1024
+}
+
+# Seconds between log lines for the same oversized event
+OVERSIZE_LOG_INTERVAL = 60
+
+_stats = {}  # event -> {'count', 'bytes', 'max_bytes', 'oversized'}
+_last_logged = {}  # event -> time of the last oversize log line
+_stats_lock = Lock()
+
+def get_payload_budget(event):
+    """Budget in encoded bytes for an event type."""
+    return PAYLOAD_BUDGETS.get(event, DEFAULT_PAYLOAD_BUDGET)
+
+def _encoded_size(encoded):
+    """Size in bytes of an encoded packet (str, bytes, or a list with binary attachments)."""
+    if isinstance(encoded, list):
+        return sum(_encoded_size(part) for part in encoded)
+    if isinstance(encoded, str):
+        return len(encoded.encode('utf-8'))
+    return len(encoded)
+
+def record_payload(event, size):
+    """Count an encoded event payload and log it if it exceeds its budget."""
+    record_emit(size)
+    budget = get_payload_budget(event)
+    with _stats_lock:
+        stats = _stats.get(event)
+        if stats is None:
+            stats = _stats[event] = {'count': 0, 'bytes': 0, 'max_bytes': 0, 'oversized': 0}
+        stats['count'] += 1
+        stats['bytes'] += size
+        stats['max_bytes'] = max(stats['max_bytes'], size)
+        if size <= budget:
+            return
+        stats['oversized'] += 1
+        oversized = stats['oversized']
+        now = time.monotonic()
+        if now - _last_logged.get(event, -OVERSIZE_LOG_INTERVAL) < OVERSIZE_LOG_INTERVAL:
+            return
+        _last_logged[event] = now
+    logger.warning("Socket.IO event '%s' payload is %s bytes, over its %s byte budget (%s oversized so far)",
+                   event, size, budget, oversized)
+
+def get_payload_stats():
+    """Per-event payload counters: {event: {'count', 'bytes', 'max_bytes', 'oversized', 'budget'}}."""
+    with _stats_lock:
+        return {event: dict(stats, budget=get_payload_budget(event)) for event, stats in _stats.items()}
+
+def _collect_metrics():
+    """Sent event counters for /metrics."""
+    samples = []
+    for event, stats in get_payload_stats().items():
+        labels = {'event': event}
+        samples.append(('quizia_socketio_emitted_total', labels, stats['count']))
+        samples.append(('quizia_socketio_emitted_bytes_total', labels, stats['bytes']))
+        samples.append(('quizia_socketio_oversized_total', labels, stats['oversized']))
+    return samples
+
+metrics.register_collector(_collect_metrics)
+
+def budgeted_packet_class(base=packet.Packet):
+    """
+    Wrap a python-socketio packet class so every encoded event is measured
+    against its budget. Pass the result as the Socket.IO 'serializer'.
+    """
+    class BudgetedPacket(base):
+        def encode(self):
+            encoded = super().encode()
+            if self.packet_type in (packet.EVENT, packet.BINARY_EVENT) and self.data and isinstance(self.data[0], str):
+                record_payload(self.data[0], _encoded_size(encoded))
+            return encoded
+
+    BudgetedPacket.__name__ = f'Budgeted{base.__name__}'
+    return BudgetedPacket
@@ -0,0 +1,203 @@
+"""
+Quiz library archives.
+
+An archive is a zip holding several quizzes plus the media they reference,
+each distinct file content stored once:
+
+    manifest.json           format version, quiz list and media index
+    quizzes/<quiz_id>.json  one entry per quiz
+    media/<sha256>          one entry per distinct media content
+
+Entries are written in that order so an import can validate every quiz
+before any media is stored, then store media and save quizzes in a single
+pass over the archive. Exports are generated on the fly while the response
+is sent - nothing is staged in temp files.
+"""
+import json
+import logging
+import time
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = 'quizia-archive'
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+
+class _ZipStream:
+    """Write-only, non-seekable file object that hands zip output to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        """Return and clear everything written since the last call."""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _write_json(archive, name, data):
+    """Write a JSON document as a compressed entry."""
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    archive.writestr(info, json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8'))
+
+def stream_quiz_archive(quizzes):
+    """
+    Generate a quiz archive as a stream of bytes.
+
+    Args:
+        quizzes: List of quiz dicts (as loaded by load_quiz) to include
+
+    Yields:
+        Chunks of the zip file
+    """
+    from app.utils.migration import extract_media_references
+    from app.utils.media_storage import get_media_file_path, get_media_file_hash, get_media_metadata
+
+    # Index referenced media by content so shared content is stored once
+    media = {}  # filename -> {'sha256', 'original_name'}
+    media_paths = {}  # sha256 -> path of one file with that content
+    for quiz in quizzes:
+        for filename in extract_media_references(quiz, cache=True):
+            if filename in media:
+                continue
+            file_path = get_media_file_path(filename)
+            if not file_path.is_file():
+                logger.warning("Media file %s not found, leaving it out of the archive", filename)
+                continue
+            sha256 = get_media_file_hash(filename)
+            metadata = get_media_metadata(filename) or {}
+            media[filename] = {
+                'sha256': sha256,
+                'original_name': metadata.get('original_name', filename)
+            }
+            media_paths.setdefault(sha256, file_path)
+
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w') as archive:
+        _write_json(archive, MANIFEST_NAME, {
+            'format': ARCHIVE_FORMAT,
+            'version': ARCHIVE_VERSION,
+            'quizzes': [{'id': quiz['id'], 'name': quiz.get('name')} for quiz in quizzes],
+            'media': media
+        })
+        for quiz in quizzes:
+            _write_json(archive, f"quizzes/{quiz['id']}.json", quiz)
+            yield stream.pop()
+
+        for sha256, file_path in media_paths.items():
+            # Media is already compressed - store it as is
+            info = zipfile.ZipInfo(f'media/{sha256}', date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = file_path.stat().st_size  # lets zipfile pick ZIP64 for huge files
+            with open(file_path, 'rb') as source, archive.open(info, 'w') as entry:
+                for chunk in iter(lambda: source.read(ARCHIVE_CHUNK_SIZE), b''):
+                    entry.write(chunk)
+                    data = stream.pop()
+                    if data:
+                        yield data
+            yield stream.pop()
+    yield stream.pop()
+
+def import_quiz_archive(fileobj, username):
+    """
+    Import a quiz archive as new quizzes owned by username.
+
+    Every quiz is validated with validate_quiz_json before anything is
+    written; invalid quizzes are skipped and reported. Media referenced by
+    the valid quizzes is stored for username (content they already have is
+    reused) and the quizzes are saved with new IDs pointing at it.
+
+    Args:
+        fileobj: Seekable file object with the zip archive
+        username: The importing quizmaster
+
+    Returns:
+        Dict with 'success' (bool) and either 'error' (str) or 'quizzes'
+        (list of {'id', 'name'}), 'media' (count stored) and 'skipped'
+        (list of {'name', 'error'} for invalid quizzes)
+    """
+    from app.utils.quiz_storage import validate_quiz_json, generate_quiz_id, save_quiz, _update_media_references
+    from app.utils.migration import extract_media_references
+    from app.utils.media_storage import save_media_stream, get_max_upload_size
+
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        return {'success': False, 'error': 'Not a zip archive'}
+
+    with archive:
+        try:
+            manifest = json.loads(archive.read(MANIFEST_NAME).decode('utf-8'))
+        except (KeyError, ValueError):
+            return {'success': False, 'error': 'Archive has no valid manifest'}
+        if manifest.get('format') != ARCHIVE_FORMAT or manifest.get('version', 0) > ARCHIVE_VERSION:
+            return {'success': False, 'error': 'Unsupported archive format'}
+        media_index = manifest.get('media') or {}
+
+        quizzes = []
+        skipped = []
+        referenced = {}  # sha256 -> archived filenames with that content
+        for entry in manifest.get('quizzes') or []:
+            name = entry.get('name') or entry.get('id')
+            try:
+                quiz_data = json.loads(archive.read(f"quizzes/{entry.get('id')}.json").decode('utf-8'))
+            except (KeyError, ValueError):
+                skipped.append({'name': name, 'error': 'Quiz file missing or not valid JSON'})
+                continue
+            validation_result = validate_quiz_json(quiz_data)
+            if not validation_result['valid']:
+                skipped.append({'name': name, 'error': validation_result['error']})
+                continue
+            quizzes.append(quiz_data)
+            for filename in extract_media_references(quiz_data, cache=True):
+                media_entry = media_index.get(filename)
+                if media_entry and media_entry.get('sha256'):
+                    referenced.setdefault(media_entry['sha256'], []).append(filename)
+
+        # Store each distinct content once, in archive order
+        media_mapping = {}  # archived filename -> stored filename
+        stored = 0
+        max_size = get_max_upload_size()
+        for info in archive.infolist():
+            if not info.filename.startswith('media/'):
+                continue
+            sha256 = info.filename[len('media/'):]
+            filenames = referenced.get(sha256)
+            if not filenames:
+                continue
+            original_name = media_index[filenames[0]].get('original_name') or filenames[0]
+            with archive.open(info) as source:
+                result = save_media_stream(original_name, source, username, max_size=max_size)
+            if not result['success']:
+                logger.warning("Failed to import media %s: %s", original_name, result['error'])
+                continue
+            stored += 1
+            for filename in filenames:
+                media_mapping[filename] = result['filename']
+
+        imported = []
+        for quiz_data in quizzes:
+            if media_mapping:
+                quiz_data = _update_media_references(quiz_data, media_mapping)
+            # Imported quizzes are always new, private quizzes owned by the importer (like copies)
+            quiz_id = generate_quiz_id()
+            quiz_data['id'] = quiz_id
+            quiz_data['creator'] = username
+            quiz_data['public'] = False
+            result = save_quiz(quiz_id, quiz_data)
+            if result['success']:
+                imported.append({'id': quiz_id, 'name': quiz_data.get('name')})
+            else:
+                skipped.append({'name': quiz_data.get('name'), 'error': result['error']})
+
+    return {'success': True, 'quizzes': imported, 'media': stored, 'skipped': skipped}
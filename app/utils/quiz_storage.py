@@ -2,10 +2,13 @@
 Quiz storage utilities.
 """
 import json
+import logging
 import uuid
 from pathlib import Path
 from flask import current_app
 
+logger = logging.getLogger(__name__)
+
 def get_quizes_folder():
     """Get the quizes folder path."""
     try:
@@ -44,10 +47,30 @@ def save_quiz(quiz_id, quiz_data, force_recreate=False):
         with open(quiz_file, 'w', encoding='utf-8') as f:
             json.dump(quiz_data, f, indent=2, ensure_ascii=False)
         
+        _update_quiz_indexes(quiz_id, quiz_data)
+        
         return {'success': True, 'id': quiz_id}
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
+def _update_quiz_indexes(quiz_id, quiz_data):
+    """Keep derived indexes in step with a quiz file write (quiz_data=None on delete)."""
+    try:
+        from app.utils.stats import record_quiz_owner, record_quiz_deleted
+        if quiz_data is None:
+            record_quiz_deleted(quiz_id)
+        else:
+            record_quiz_owner(quiz_id, quiz_data.get('creator'))
+    except Exception as e:
+        # Log error but don't fail - the quiz file itself was written
+        logger.warning("Failed to update quiz stats for %s: %s", quiz_id, e)
+    
+    try:
+        from app.utils.media_storage import update_quiz_media_references
+        update_quiz_media_references(quiz_id, quiz_data)
+    except Exception as e:
+        logger.warning("Failed to update media references for %s: %s", quiz_id, e)
+
 def normalize_quiz_to_new_format(quiz_data):
     """
     Normalize quiz data to ensure it's in the new format.
@@ -279,6 +302,7 @@ def delete_quiz(quiz_id):
             return {'success': False, 'error': 'Quiz not found'}
         
         quiz_file.unlink()
+        _update_quiz_indexes(quiz_id, None)
         return {'success': True}
     except Exception as e:
         return {'success': False, 'error': str(e)}
@@ -322,39 +346,24 @@ def copy_quiz(quiz_id, new_creator_username):
     
     # Extract all media references from the quiz
     from app.utils.migration import extract_media_references
-    from app.utils.media_storage import _load_media_metadata, get_media_file_path, save_media_file
+    from app.utils.media_storage import get_media_metadata, clone_media_file
     
-    media_files = extract_media_references(new_quiz)
-    metadata = _load_media_metadata()
+    media_files = extract_media_references(new_quiz, cache=True)
     
     # Map old filenames to new filenames for non-public media
     media_mapping = {}  # old_filename -> new_filename
     
     for media_filename in media_files:
         # Check if this media file exists and is not public
-        file_meta = metadata.get(media_filename)
-        if file_meta:
-            is_public = file_meta.get('public', False)
-            if not is_public:
-                # Need to copy this file
-                media_path = get_media_file_path(media_filename)
-                if media_path.exists():
-                    try:
-                        # Read the file
-                        with open(media_path, 'rb') as f:
-                            file_content = f.read()
-                        
-                        # Get original name from metadata
-                        original_name = file_meta.get('original_name', media_filename)
-                        
-                        # Save to new creator's media storage
-                        save_result = save_media_file(original_name, file_content, new_creator_username, public=False)
-                        if save_result['success']:
-                            new_filename = save_result['filename']
-                            media_mapping[media_filename] = new_filename
-                    except Exception as e:
-                        # If copying fails, continue but log the error
-                        print(f"Warning: Failed to copy media file {media_filename}: {e}")
+        file_meta = get_media_metadata(media_filename)
+        if file_meta and not file_meta.get('public', False):
+            # Give the new creator their own entry - it shares the stored file data
+            clone_result = clone_media_file(media_filename, new_creator_username)
+            if clone_result['success']:
+                media_mapping[media_filename] = clone_result['filename']
+            else:
+                # If copying fails, continue but log the error
+                logger.warning("Failed to copy media file %s: %s", media_filename, clone_result['error'])
     
     # Update all media references in the quiz to use new filenames
     if media_mapping:
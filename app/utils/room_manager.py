@@ -2,25 +2,70 @@
 Room management utilities.
 Handles quiz room creation, expiration, and participant management.
 """
+import heapq
+import logging
+import secrets
 import string
 import random
+import re
 import time
 import json
+from collections import deque
 from datetime import datetime, timedelta
 from threading import Lock
 from pathlib import Path
+from app.utils import metrics
+from app.utils.event_trace import TracedLock, record_persist
+
+logger = logging.getLogger(__name__)
 
 # In-memory storage for active rooms
 rooms = {}
-rooms_lock = Lock()
+rooms_lock = TracedLock()  # Wait/hold times are charged to the running Socket.IO event
 
 # Room expiration time: 3 hours in seconds
 ROOM_EXPIRATION = 3 * 60 * 60
 
+# Min-heap of (expiry deadline, room_code, created_at) driving the background reaper.
+# Deadlines are on the monotonic clock. Entries are not updated on activity: when one
+# comes due the reaper re-checks the room's activity stamp and re-arms it if the room
+# has been used since.
+_expiry_heap = []
+# Longest the reaper sleeps between checks (seconds)
+REAPER_MAX_SLEEP = 60
+_reaper_started = False
+
+# Room keys that are never persisted: activity_at is a monotonic clock reading
+# (meaningless after a restart), join_payload a cache rebuilt on demand and
+# event_log the in-memory replay buffer
+TRANSIENT_ROOM_KEYS = frozenset(('activity_at', 'join_payload', 'event_log'))
+
+# Number of recent broadcasts each room keeps for replay to reconnecting clients.
+# Clients that missed more than this get a full snapshot instead.
+ROOM_EVENT_BUFFER_SIZE = 256
+# Socket.io groups each client role is in (participants also receive display broadcasts)
+ROLE_GROUPS = {
+    'control': ('control',),
+    'display': ('display',),
+    'participant': ('participant', 'display')
+}
+_event_log_lock = Lock()
+
+# Socket presence index: socket id -> (room_code, role, participant_id or None).
+# Lets disconnects be resolved without scanning rooms and participants.
+_socket_index = {}
+
 # Room persistence folder
 ROOMS_FOLDER = Path(__file__).parent.parent / 'rooms'
 ROOMS_FOLDER.mkdir(exist_ok=True)
 
+# Media file extensions by kind (used by the per-page prefetch manifest)
+MEDIA_KINDS = {
+    'image': ('png', 'jpg', 'jpeg', 'gif', 'webp', 'svg'),
+    'video': ('mp4', 'webm'),
+    'audio': ('mp3', 'wav', 'ogg')
+}
+
 def _get_room_file_path(room_code):
     """Get the file path for a room's state file."""
     return ROOMS_FOLDER / f'{room_code}.json'
@@ -28,6 +73,7 @@ def _get_room_file_path(room_code):
 def _save_room_state(room_code, room_data):
     """Save room state to disk."""
     try:
+        start = time.perf_counter()
         file_path = _get_room_file_path(room_code)
         # Create a copy without socket_id (not serializable and not needed for persistence)
         room_copy = {}
@@ -40,14 +86,20 @@ def _save_room_state(room_code, room_data):
                     participant_copy.pop('socket_id', None)  # Remove socket_id
                     participants_copy[pid] = participant_copy
                 room_copy[key] = participants_copy
-            else:
+            elif key not in TRANSIENT_ROOM_KEYS:
                 room_copy[key] = value
         
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(room_copy, f, indent=2, default=str)
+            size = f.tell()
+        metrics.inc('quizia_room_saves_total')
+        metrics.inc('quizia_room_save_bytes_total', size)
+        elapsed = time.perf_counter() - start
+        metrics.observe('quizia_room_save_seconds', elapsed)
+        record_persist(elapsed)
     except Exception as e:
         # Log error but don't fail - persistence is best effort
-        print(f"Warning: Failed to save room {room_code}: {e}")
+        logger.warning("Failed to save room %s: %s", room_code, e)
 
 def _load_room_state(room_code):
     """Load room state from disk."""
@@ -67,7 +119,7 @@ def _load_room_state(room_code):
         
         return room_data
     except Exception as e:
-        print(f"Warning: Failed to load room {room_code}: {e}")
+        logger.warning("Failed to load room %s: %s", room_code, e)
         return None
 
 def _delete_room_file(room_code):
@@ -77,7 +129,7 @@ def _delete_room_file(room_code):
         if file_path.exists():
             file_path.unlink()
     except Exception as e:
-        print(f"Warning: Failed to delete room file {room_code}: {e}")
+        logger.warning("Failed to delete room file %s: %s", room_code, e)
 
 def generate_room_code():
     """Generate a unique 4-character alphanumeric room code."""
@@ -102,6 +154,8 @@ def create_room(quiz_id, quiz_name, quiz_data, quizmaster_username):
         'quizmaster': quizmaster_username,
         'created_at': time.time(),
         'last_activity': time.time(),
+        'activity_at': time.monotonic(),  # Activity stamp used for expiry (see touch_room)
+        'revision': 0,  # Bumped when what joining clients receive (quiz, page, state) changes
         'current_page': 0,
         'page_start_time': time.time(),
         'question_start_times': {},  # Track when each question becomes visible
@@ -110,37 +164,115 @@ def create_room(quiz_id, quiz_name, quiz_data, quizmaster_username):
         'scores': {},
         'state': {},
         'ended': False,
-        'public': False  # Mark run as public (available for future use)
+        'public': False,  # Mark run as public (available for future use)
+        'media_manifest': build_media_manifest(quiz_data)  # Per-page media, for client prefetching
     }
     
     with rooms_lock:
         rooms[room_code] = room
+        _schedule_expiry(room_code, room)
         # Save room state immediately
         _save_room_state(room_code, room)
     
     return room_code
 
+def build_media_manifest(quiz_data):
+    """
+    Build a per-page media manifest for a quiz.
+
+    Returns:
+        List (one entry per page) of lists of {'filename', 'url', 'kind'} dicts.
+        'url' is the URL as written in the quiz (so prefetches hit the same
+        cache entry the page will use).
+    """
+    from app.utils.migration import extract_media_references
+
+    manifest = []
+    for page in quiz_data.get('pages', []):
+        page_json = json.dumps(page)
+        entries = []
+        for filename in sorted(extract_media_references(page, cache=True)):
+            match = re.search(r'/api/media/serve/' + re.escape(filename) + r'(\?[^\s"\'<>\\]*)?', page_json)
+            ext = filename.rsplit('.', 1)[-1].lower()
+            entries.append({
+                'filename': filename,
+                'url': match.group(0) if match else f'/api/media/serve/{filename}',
+                'kind': next((kind for kind, exts in MEDIA_KINDS.items() if ext in exts), 'other')
+            })
+        manifest.append(entries)
+    return manifest
+
+def get_media_manifest(room):
+    """Get a room's per-page media manifest (built on first use and kept with the room)."""
+    manifest = room.get('media_manifest')
+    if manifest is None:
+        manifest = build_media_manifest(room.get('quiz', {}))
+        room['media_manifest'] = manifest
+    return manifest
+
+def get_prefetch_media(room, page_index, pages_ahead=1):
+    """Media used by the pages after page_index (not already on page_index), for clients to prefetch."""
+    manifest = get_media_manifest(room)
+    current = {entry['url'] for entry in manifest[page_index]} if 0 <= page_index < len(manifest) else set()
+    prefetch = []
+    for entries in manifest[page_index + 1:page_index + 1 + pages_ahead]:
+        for entry in entries:
+            if entry['url'] not in current:
+                current.add(entry['url'])
+                prefetch.append(entry)
+    return prefetch
+
+def touch_room(room):
+    """
+    Record meaningful activity in a room (state changes, answers, joins).
+    
+    Only activity keeps a room from expiring - reads such as page loads,
+    TV display polling and get_room/peek_room lookups do not.
+    """
+    room['last_activity'] = time.time()  # Wall clock, persisted and shown to quizmasters
+    room['activity_at'] = time.monotonic()
+
+def bump_room_revision(room):
+    """Record that the room's quiz, current page or state changed (invalidates cached join payloads)."""
+    room['revision'] = room.get('revision', 0) + 1
+
+def _idle_seconds(room):
+    """Seconds since the room's last recorded activity."""
+    activity_at = room.get('activity_at')
+    if activity_at is None:
+        return time.time() - room.get('last_activity', 0)
+    return time.monotonic() - activity_at
+
+def peek_room(room_code):
+    """
+    Get a room by code for read-only use, without locking or recording activity.
+    Returns None if not found, ended or expired (expired rooms are left to the reaper).
+    """
+    room = rooms.get(room_code)
+    if room is None or room.get('ended') or _idle_seconds(room) > ROOM_EXPIRATION:
+        return None
+    return room
+
 def get_room(room_code):
-    """Get a room by code. Returns None if not found or expired."""
+    """
+    Get a room by code. Returns None if not found or expired.
+    
+    Does not record activity - callers that change the room call touch_room.
+    """
+    room = rooms.get(room_code)
+    if room is None:
+        return None
+    if _idle_seconds(room) <= ROOM_EXPIRATION:
+        return room
+    
+    # Expired and not reaped yet - end it but don't delete quiz
     with rooms_lock:
-        if room_code not in rooms:
-            return None
-        
-        room = rooms[room_code]
-        
-        # Check expiration
-        if time.time() - room['last_activity'] > ROOM_EXPIRATION:
-            # Room expired - end it but don't delete quiz
-            room['ended'] = True
-            del rooms[room_code]
-            # Delete room file
-            _delete_room_file(room_code)
+        if rooms.get(room_code) is not room:
             return None
-        
-        # Update last activity (but don't save on every get_room call to avoid excessive I/O)
-        # We'll save periodically when state actually changes
-        room['last_activity'] = time.time()
-        return room
+        room['ended'] = True
+        del rooms[room_code]
+    _release_room(room_code)
+    return None
 
 def end_room(room_code):
     """End a room and remove it from active rooms."""
@@ -149,8 +281,16 @@ def end_room(room_code):
             rooms[room_code]['ended'] = True
             # Remove the room immediately so it's no longer accessible
             del rooms[room_code]
-        # Delete room file
-        _delete_room_file(room_code)
+    _release_room(room_code)
+
+def _release_room(room_code):
+    """Delete a removed room's file and free per-room caches (call without rooms_lock held)."""
+    _delete_room_file(room_code)
+    try:
+        from app.utils.display_renderer import release_room
+        release_room(room_code)
+    except Exception as e:
+        logger.warning("Failed to release display cache for room %s: %s", room_code, e)
 
 def add_participant(room_code, name, avatar, socket_id):
     """
@@ -163,9 +303,7 @@ def add_participant(room_code, name, avatar, socket_id):
         return None
     
     # Create unique participant ID from avatar+name combo
-    import hashlib
-    combo_string = f"{avatar}|{name}"
-    participant_id = hashlib.md5(combo_string.encode()).hexdigest()[:16]  # 16-char ID
+    participant_id = get_participant_id(name, avatar)
     
     with rooms_lock:
         # Check if this combo already exists
@@ -184,12 +322,18 @@ def add_participant(room_code, name, avatar, socket_id):
         }
         
         room['participants'][participant_id] = participant
-        room['last_activity'] = time.time()
+        touch_room(room)
         # Save room state when participants change
         _save_room_state(room_code, room)
     
     return participant_id
 
+def get_participant_id(name, avatar):
+    """Participant ID for an avatar+name combo (16 hex characters)."""
+    import hashlib
+    combo_string = f"{avatar}|{name}"
+    return hashlib.md5(combo_string.encode()).hexdigest()[:16]
+
 def find_participant_by_combo(room_code, name, avatar):
     """
     Find a participant by avatar+name combo.
@@ -199,9 +343,7 @@ def find_participant_by_combo(room_code, name, avatar):
     if not room:
         return None
     
-    import hashlib
-    combo_string = f"{avatar}|{name}"
-    participant_id = hashlib.md5(combo_string.encode()).hexdigest()[:16]
+    participant_id = get_participant_id(name, avatar)
     
     if participant_id in room.get('participants', {}):
         return participant_id
@@ -217,13 +359,124 @@ def remove_participant(room_code, participant_id):
     with rooms_lock:
         if participant_id in room['participants']:
             room['participants'][participant_id]['connected'] = False
-            room['last_activity'] = time.time()
+            touch_room(room)
             # Save room state when participants change
             _save_room_state(room_code, room)
             return True
     
     return False
 
+def register_socket(socket_id, room_code, role, participant_id=None):
+    """Record which room (and participant, for role 'participant') a socket belongs to."""
+    _socket_index[socket_id] = (room_code, role, participant_id)
+
+def unregister_socket(socket_id):
+    """Forget a socket. Returns its (room_code, role, participant_id), or None if unknown."""
+    return _socket_index.pop(socket_id, None)
+
+def mark_participant_disconnected(room_code, participant_id, socket_id):
+    """
+    Mark a participant as disconnected when their socket goes away.
+    
+    Ignored if the participant has since reconnected on another socket.
+    Returns True if the participant's presence changed.
+    """
+    room = peek_room(room_code)
+    if not room:
+        return False
+    
+    with rooms_lock:
+        participant = room.get('participants', {}).get(participant_id)
+        if not participant or participant.get('socket_id') != socket_id:
+            return False
+        participant['connected'] = False
+        participant['socket_id'] = None
+    return True
+
+def count_connected_participants(room):
+    """Number of participants in a room with a live connection."""
+    return sum(1 for p in room.get('participants', {}).values() if p.get('connected'))
+
+def _get_event_log(room):
+    """Get a room's replay buffer, creating it on first use (call with _event_log_lock held)."""
+    event_log = room.get('event_log')
+    if event_log is None:
+        # The epoch tells clients holding sequence numbers from before a restart apart
+        event_log = room['event_log'] = {
+            'epoch': secrets.token_hex(4),
+            'seq': 0,
+            'events': deque(maxlen=ROOM_EVENT_BUFFER_SIZE)
+        }
+    return event_log
+
+def broadcast_room_event(room_code, group, event, data):
+    """
+    Emit an event to one of a room's socket.io groups ('control', 'display'
+    or 'participant') and record it for replay to clients that reconnect.
+    
+    The payload gets a 'seq' key with the event's sequence number in the room.
+    """
+    from app import socketio
+    room = rooms.get(room_code)
+    if room is not None:
+        with _event_log_lock:
+            event_log = _get_event_log(room)
+            event_log['seq'] += 1
+            data = dict(data, seq=event_log['seq'])
+            event_log['events'].append((event_log['seq'], group, event, data))
+    socketio.emit(event, data, room=f'{group}_{room_code}')
+
+def get_event_cursor(room):
+    """The room's current replay position ({'epoch', 'seq'}), sent with full snapshots."""
+    with _event_log_lock:
+        event_log = _get_event_log(room)
+        return {'epoch': event_log['epoch'], 'seq': event_log['seq']}
+
+def get_missed_events(room, role, resume):
+    """
+    Get the broadcasts a reconnecting client missed.
+    
+    Args:
+        room: The room
+        role: Client role ('control', 'display' or 'participant')
+        resume: The client's last position ({'epoch', 'seq'}) or None
+    
+    Returns:
+        List of {'seq', 'event', 'data'} for the role's groups after the
+        client's position, or None if the client cannot resume (no or stale
+        position, or it fell out of the buffer) and needs a full snapshot
+    """
+    if not isinstance(resume, dict) or not isinstance(resume.get('seq'), int):
+        return None
+    groups = ROLE_GROUPS.get(role, ())
+    last_seq = resume['seq']
+    with _event_log_lock:
+        event_log = room.get('event_log')
+        if not event_log or resume.get('epoch') != event_log['epoch'] or last_seq > event_log['seq']:
+            return None
+        events = event_log['events']
+        if last_seq < event_log['seq'] and (not events or events[0][0] > last_seq + 1):
+            return None
+        return [{'seq': seq, 'event': event, 'data': data}
+                for seq, group, event, data in events
+                if seq > last_seq and group in groups]
+
+def _collect_metrics():
+    """Room, participant and socket gauges for /metrics."""
+    active = [room for room in list(rooms.values()) if not room.get('ended')]
+    sockets = {'control': 0, 'display': 0, 'participant': 0}
+    for _, role, _ in list(_socket_index.values()):
+        sockets[role] = sockets.get(role, 0) + 1
+    samples = [
+        ('quizia_rooms_active', {}, len(active)),
+        ('quizia_participants', {}, sum(len(room.get('participants', {})) for room in active)),
+        ('quizia_participants_connected', {}, sum(count_connected_participants(room) for room in active))
+    ]
+    samples.extend(('quizia_sockets', {'role': role}, count) for role, count in sockets.items())
+    return samples
+
+metrics.register_collector(_collect_metrics)
+
 def get_participants(room_code):
     """Get all participants in a room, returned as a dictionary keyed by participant_id."""
     room = get_room(room_code)
@@ -242,7 +495,8 @@ def update_room_state(room_code, state_updates):
     
     with rooms_lock:
         room['state'].update(state_updates)
-        room['last_activity'] = time.time()
+        touch_room(room)
+        bump_room_revision(room)
         # Save room state when state changes
         _save_room_state(room_code, room)
     
@@ -257,8 +511,8 @@ def get_running_rooms_for_quizmaster(quizmaster_username):
         for code, room in rooms.items():
             # Check if room belongs to this quizmaster and is not ended
             if room.get('quizmaster') == quizmaster_username and not room.get('ended', False):
-                # Check if room is still active (not expired)
-                if current_time - room['last_activity'] <= ROOM_EXPIRATION:
+                # Skip expired rooms (the reaper removes them)
+                if _idle_seconds(room) <= ROOM_EXPIRATION:
                     running_rooms.append({
                         'code': code,
                         'quiz_name': room.get('quiz_name', 'Unknown'),
@@ -268,24 +522,19 @@ def get_running_rooms_for_quizmaster(quizmaster_username):
                         'participant_count': len(room.get('participants', {})),
                         'public': room.get('public', False)
                     })
-                else:
-                    # Room expired - mark as ended and delete file
-                    room['ended'] = True
-                    _delete_room_file(code)
     
     return running_rooms
 
 def get_public_rooms():
     """Get all public running (non-ended) rooms."""
-    current_time = time.time()
     public_rooms = []
     
     with rooms_lock:
         for code, room in rooms.items():
             # Check if room is public, not ended, and still active
             if room.get('public', False) and not room.get('ended', False):
-                # Check if room is still active (not expired)
-                if current_time - room['last_activity'] <= ROOM_EXPIRATION:
+                # Skip expired rooms (the reaper removes them)
+                if _idle_seconds(room) <= ROOM_EXPIRATION:
                     quiz = room.get('quiz', {})
                     pages = quiz.get('pages', [])
                     total_pages = len(pages)
@@ -299,30 +548,77 @@ def get_public_rooms():
                         'total_pages': total_pages,
                         'participant_count': len(room.get('participants', {}))
                     })
-                else:
-                    # Room expired - mark as ended and delete file
-                    room['ended'] = True
-                    _delete_room_file(code)
     
     return public_rooms
 
+def _schedule_expiry(room_code, room):
+    """Add a room to the reaper's expiry heap (call with rooms_lock held)."""
+    heapq.heappush(_expiry_heap, (room['activity_at'] + ROOM_EXPIRATION, room_code, room.get('created_at')))
+
 def cleanup_expired_rooms():
-    """Clean up expired rooms. Should be called periodically."""
-    current_time = time.time()
+    """
+    Remove rooms that have been inactive for ROOM_EXPIRATION.
+    
+    Only expiry heap entries that have come due are examined, so the cost is
+    proportional to the rooms expiring rather than to all active rooms.
+    Room files and caches are released after rooms_lock is dropped.
+    
+    Returns:
+        Number of rooms removed
+    """
+    current_time = time.monotonic()
     expired_codes = []
     
     with rooms_lock:
-        for code, room in rooms.items():
-            if current_time - room['last_activity'] > ROOM_EXPIRATION:
-                expired_codes.append(code)
-        
-        for code in expired_codes:
+        while _expiry_heap and _expiry_heap[0][0] <= current_time:
+            _, code, created_at = heapq.heappop(_expiry_heap)
+            room = rooms.get(code)
+            if room is None or room.get('created_at') != created_at:
+                # Ended already (or the code was reused by a newer room with its own entry)
+                continue
+            deadline = room['activity_at'] + ROOM_EXPIRATION
+            if deadline > current_time:
+                # Active since the entry was scheduled - re-arm it
+                heapq.heappush(_expiry_heap, (deadline, code, created_at))
+                continue
+            room['ended'] = True
             del rooms[code]
-            # Delete room file when expired
-            _delete_room_file(code)
+            expired_codes.append(code)
+    
+    for code in expired_codes:
+        _release_room(code)
     
     return len(expired_codes)
 
+def _next_reap_delay():
+    """Seconds until the next expiry heap entry comes due (capped at REAPER_MAX_SLEEP)."""
+    with rooms_lock:
+        if not _expiry_heap:
+            return REAPER_MAX_SLEEP
+        delay = _expiry_heap[0][0] - time.monotonic()
+    return min(max(delay, 1), REAPER_MAX_SLEEP)
+
+def _reaper_loop():
+    """Background task: remove expired rooms as their deadlines pass."""
+    from app import socketio
+    while True:
+        socketio.sleep(_next_reap_delay())
+        try:
+            removed = cleanup_expired_rooms()
+            if removed:
+                logger.info("Removed %s expired room(s)", removed)
+        except Exception as e:
+            logger.warning("Room reaper failed: %s", e)
+
+def start_room_reaper():
+    """Start the background room reaper (once per process)."""
+    global _reaper_started
+    if _reaper_started:
+        return
+    _reaper_started = True
+    from app import socketio
+    socketio.start_background_task(_reaper_loop)
+
 def restore_rooms():
     """Restore all rooms from disk on server startup."""
     restored_count = 0
@@ -357,7 +653,10 @@ def restore_rooms():
                 room_data['public'] = False
             
             # Restore room to memory (preserves all fields including public status)
+            # Carry the persisted idle time over to the monotonic activity stamp
+            room_data['activity_at'] = time.monotonic() - max(0, current_time - last_activity)
             rooms[room_code] = room_data
+            _schedule_expiry(room_code, room_data)
             restored_count += 1
     
     return restored_count
@@ -1,112 +1,246 @@
 """
 Statistics utilities for tracking quizmaster activity.
+
+Quiz runs and quiz ownership changes are recorded in an append-only event log
+(one JSON object per line). The log is replayed once per process into an
+in-memory index keyed by (room_code, quiz_id) and materialized per-quizmaster
+counters, so recording an event and reading a quizmaster's totals never
+rescans the quizzes folder or rewrites the history.
 """
 import json
+import logging
+import time
 from pathlib import Path
-from flask import current_app
+from threading import Lock
+
+logger = logging.getLogger(__name__)
 
+# Legacy single-document stats file (imported into the run log once)
 STATS_FILE = Path(__file__).parent.parent / 'data' / 'stats.json'
+RUN_LOG_FILE = Path(__file__).parent.parent / 'data' / 'quiz_runs.jsonl'
 
-def _ensure_stats_file():
-    """Ensure stats file exists."""
-    STATS_FILE.parent.mkdir(exist_ok=True)
-    if not STATS_FILE.exists():
-        with open(STATS_FILE, 'w') as f:
-            json.dump({'quiz_runs': []}, f)
-
-def _load_stats():
-    """Load statistics data."""
-    _ensure_stats_file()
-    with open(STATS_FILE, 'r') as f:
-        return json.load(f)
-
-def _save_stats(data):
-    """Save statistics data."""
-    _ensure_stats_file()
-    with open(STATS_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def record_quiz_run(quiz_id, quizmaster_username, room_code, completed=False):
-    """Record a quiz run. Uses quiz_id (not quiz_name) as the authoritative identifier."""
-    stats = _load_stats()
-    import time
-    
-    # Check if this run already exists (for completion tracking)
-    existing_run = None
-    for run in stats.get('quiz_runs', []):
-        # Support both quiz_id (new) and quiz_name (legacy) for backward compatibility
-        run_quiz_id = run.get('quiz_id')
-        run_room_code = run.get('room_code')
-        if run_room_code == room_code and (run_quiz_id == quiz_id or run.get('quiz_name') == quiz_id):
-            existing_run = run
-            break
-    
-    if existing_run:
-        # Update existing run
-        if completed:
-            existing_run['completed'] = True
-            existing_run['completed_at'] = time.time()
-        # Migrate legacy runs to use quiz_id if needed
-        if 'quiz_id' not in existing_run and 'quiz_name' in existing_run:
-            existing_run['quiz_id'] = quiz_id
-    else:
-        # Create new run
+_stats_lock = Lock()
+_run_index = None  # (room_code, quiz_id) -> run dict, built lazily from the log
+_quiz_creators = {}  # quiz_id -> creator username
+_quiz_owners_indexed = False  # True once existing quiz files have been counted
+_quizmaster_counters = {}  # username -> counters (see _get_counters)
+
+def _empty_counters():
+    """Aggregate counters for a quizmaster with no recorded activity."""
+    return {
+        'quizzes_created': 0,
+        'quizzes_run': 0,
+        'participants_hosted': 0,
+        'answers_collected': 0
+    }
+
+def _get_counters(username):
+    """Get (creating if needed) the aggregate counters for a quizmaster."""
+    counters = _quizmaster_counters.get(username)
+    if counters is None:
+        counters = _empty_counters()
+        _quizmaster_counters[username] = counters
+    return counters
+
+def _apply_event(event):
+    """Apply a single log event to the in-memory index and counters."""
+    global _quiz_owners_indexed
+    event_type = event.get('event')
+
+    if event_type in ('quiz_owner', 'quiz_deleted'):
+        quiz_id = event.get('quiz_id')
+        old_creator = _quiz_creators.pop(quiz_id, None)
+        if old_creator is not None:
+            _get_counters(old_creator)['quizzes_created'] -= 1
+        if event_type == 'quiz_owner' and event.get('creator') is not None:
+            _quiz_creators[quiz_id] = event['creator']
+            _get_counters(event['creator'])['quizzes_created'] += 1
+        return
+
+    if event_type == 'quiz_owners_indexed':
+        _quiz_owners_indexed = True
+        return
+
+    key = (event.get('room_code'), event.get('quiz_id'))
+    run = _run_index.get(key)
+
+    if run is None:
         run = {
-            'quiz_id': quiz_id,
-            'quizmaster': quizmaster_username,
-            'room_code': room_code,
-            'started_at': time.time(),
+            'quiz_id': event.get('quiz_id'),
+            'quizmaster': event.get('quizmaster'),
+            'room_code': event.get('room_code'),
+            'started_at': event.get('at'),
             'completed_at': None,
-            'completed': completed
+            'completed': False
         }
-        
-        if completed:
-            run['completed_at'] = time.time()
-        
-        stats['quiz_runs'].append(run)
-    
-    _save_stats(stats)
+        _run_index[key] = run
 
-def get_quizmaster_stats(username):
-    """Get statistics for a quizmaster."""
-    from app.utils.quiz_storage import list_quizes, load_quiz
-    
-    # Count quizzes created by this quizmaster
-    all_quizes = list_quizes()
-    quizzes_created = 0
-    for quiz in all_quizes:
-        quiz_data = load_quiz(quiz.get('id', quiz.get('name')))  # Support both ID and legacy name
-        if quiz_data and quiz_data.get('creator') == username:
-            quizzes_created += 1
-    
-    # Count quizzes run (completed) by this quizmaster
-    stats = _load_stats()
-    quizzes_run = 0
-    completed_runs = set()  # Track unique quiz runs that were completed
-    
-    for run in stats.get('quiz_runs', []):
-        if run.get('quizmaster') == username and run.get('completed', False):
-            # Count unique quiz runs (use quiz_id if available, fallback to quiz_name for legacy)
-            quiz_id = run.get('quiz_id') or run.get('quiz_name', 'unknown')
-            run_key = f"{quiz_id}_{run.get('room_code')}"
-            if run_key not in completed_runs:
-                completed_runs.add(run_key)
-                quizzes_run += 1
-    
-    return {
-        'quizzes_created': quizzes_created,
-        'quizzes_run': quizzes_run
+    if event.get('event') == 'completed' and not run['completed']:
+        run['completed'] = True
+        run['completed_at'] = event.get('at')
+        if run['quizmaster'] is None:
+            run['quizmaster'] = event.get('quizmaster')
+        # Each (room_code, quiz_id) run counts once towards the quizmaster's totals
+        counters = _get_counters(run['quizmaster'])
+        counters['quizzes_run'] += 1
+        counters['participants_hosted'] += event.get('participants', 0)
+        counters['answers_collected'] += event.get('answers', 0)
+
+def _append_events(events):
+    """Append events to the run log."""
+    RUN_LOG_FILE.parent.mkdir(exist_ok=True)
+    with open(RUN_LOG_FILE, 'a', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+def _import_legacy_stats():
+    """Convert runs from the legacy stats.json into run log events."""
+    try:
+        with open(STATS_FILE, 'r') as f:
+            legacy = json.load(f)
+    except Exception as e:
+        logger.warning("Failed to read legacy stats file: %s", e)
+        return []
+
+    events = []
+    for run in legacy.get('quiz_runs', []):
+        # Support both quiz_id (new) and quiz_name (legacy) for backward compatibility
+        quiz_id = run.get('quiz_id') or run.get('quiz_name')
+        base = {
+            'quiz_id': quiz_id,
+            'quizmaster': run.get('quizmaster'),
+            'room_code': run.get('room_code')
+        }
+        events.append(dict(base, event='started', at=run.get('started_at')))
+        if run.get('completed', False):
+            events.append(dict(base, event='completed', at=run.get('completed_at')))
+    return events
+
+def _index_existing_quizzes():
+    """Create ownership events for quiz files saved before ownership was logged."""
+    from app.utils.quiz_storage import get_quizes_folder
+
+    events = []
+    quizes_folder = get_quizes_folder()
+    if quizes_folder.exists():
+        for quiz_file in quizes_folder.glob('*.json'):
+            try:
+                with open(quiz_file, 'r', encoding='utf-8') as f:
+                    quiz_data = json.load(f)
+            except Exception:
+                continue
+            quiz_id = quiz_data.get('id') or quiz_file.stem
+            if quiz_id not in _quiz_creators and quiz_data.get('creator'):
+                events.append({'event': 'quiz_owner', 'quiz_id': quiz_id, 'creator': quiz_data['creator']})
+    events.append({'event': 'quiz_owners_indexed', 'at': time.time()})
+    return events
+
+def _ensure_loaded():
+    """Build the index from the log on first use. Caller must hold _stats_lock."""
+    global _run_index, _quiz_owners_indexed
+    if _run_index is not None:
+        return
+
+    _run_index = {}
+    _quiz_creators.clear()
+    _quiz_owners_indexed = False
+    _quizmaster_counters.clear()
+
+    if not RUN_LOG_FILE.exists() and STATS_FILE.exists():
+        legacy_events = _import_legacy_stats()
+        _append_events(legacy_events)
+
+    if RUN_LOG_FILE.exists():
+        with open(RUN_LOG_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write from a crash - skip the partial line
+                    continue
+                _apply_event(event)
+
+    if not _quiz_owners_indexed:
+        # One-time scan so quizzes saved before ownership tracking are counted
+        owner_events = _index_existing_quizzes()
+        for event in owner_events:
+            _apply_event(event)
+        _append_events(owner_events)
+
+def record_quiz_run(quiz_id, quizmaster_username, room_code, completed=False,
+                    participant_count=0, answer_count=0):
+    """
+    Record a quiz run. Uses quiz_id (not quiz_name) as the authoritative identifier.
+
+    participant_count and answer_count are only used when completed is True and are
+    added to the quizmaster's participants hosted / answers collected totals.
+    """
+    event = {
+        'event': 'completed' if completed else 'started',
+        'quiz_id': quiz_id,
+        'quizmaster': quizmaster_username,
+        'room_code': room_code,
+        'at': time.time()
     }
+    if completed:
+        event['participants'] = participant_count
+        event['answers'] = answer_count
+
+    with _stats_lock:
+        _ensure_loaded()
+        existing_run = _run_index.get((room_code, quiz_id))
+        if existing_run and (not completed or existing_run['completed']):
+            # Nothing new to record (run already started / already completed)
+            return
+        _apply_event(event)
+        _append_events([event])
+
+def get_quiz_run(room_code, quiz_id):
+    """Get the recorded run for a room and quiz, or None."""
+    with _stats_lock:
+        _ensure_loaded()
+        run = _run_index.get((room_code, quiz_id))
+        return dict(run) if run else None
+
+def record_quiz_owner(quiz_id, creator):
+    """Record the creator of a saved quiz. Called by the quiz storage write paths."""
+    with _stats_lock:
+        _ensure_loaded()
+        if _quiz_creators.get(quiz_id) == creator:
+            # Ordinary re-save of an existing quiz - nothing changed
+            return
+        event = {'event': 'quiz_owner', 'quiz_id': quiz_id, 'creator': creator}
+        _apply_event(event)
+        _append_events([event])
+
+def record_quiz_deleted(quiz_id):
+    """Record that a quiz was deleted. Called by the quiz storage write paths."""
+    with _stats_lock:
+        _ensure_loaded()
+        if quiz_id not in _quiz_creators:
+            return
+        event = {'event': 'quiz_deleted', 'quiz_id': quiz_id}
+        _apply_event(event)
+        _append_events([event])
+
+def get_quizmaster_stats(username):
+    """Get statistics for a quizmaster (served from materialized counters)."""
+    with _stats_lock:
+        _ensure_loaded()
+        counters = _quizmaster_counters.get(username)
+        return dict(counters) if counters else _empty_counters()
 
 def get_all_quizmaster_stats():
     """Get statistics for all quizmasters."""
     from app.utils.auth import get_all_quizmasters
-    
+
     quizmasters = get_all_quizmasters()
     stats_dict = {}
-    
+
     for username in quizmasters:
         stats_dict[username] = get_quizmaster_stats(username)
-    
-    return stats_dict
 
+    return stats_dict
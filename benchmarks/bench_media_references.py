@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for migration.extract_media_references.
+
+Generates large synthetic quizzes and compares the current walker (with and
+without the content-hash cache) against the previous recursive implementation,
+checking that all of them find the same references.
+
+Usage:
+    python benchmarks/bench_media_references.py [--pages 200] [--elements 40] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.migration import extract_media_references
+
+
+def legacy_extract_media_references(quiz_data):
+    """The recursive implementation extract_media_references replaced (reference for timing)."""
+    media_files = set()
+
+    def extract_from_value(value, key=None):
+        if isinstance(value, dict):
+            for k, v in value.items():
+                if k in ('media_url', 'file_name', 'filename', 'image_url', 'src', 'url'):
+                    if isinstance(v, str) and v:
+                        if '/api/media/serve/' in v:
+                            match = re.search(r'/api/media/serve/([^\s"\'<>?]+)', v)
+                            if match:
+                                media_files.add(match.group(1))
+                        elif v.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg',
+                                         '.mp4', '.webm', '.mp3', '.wav', '.ogg', '.pdf')):
+                            if not v.startswith(('http://', 'https://')):
+                                if v.startswith('/'):
+                                    filename = os.path.basename(v)
+                                    if filename:
+                                        media_files.add(filename)
+                                else:
+                                    media_files.add(v)
+                else:
+                    extract_from_value(v, k)
+        elif isinstance(value, list):
+            for item in value:
+                extract_from_value(item, key)
+        elif isinstance(value, str):
+            if '/api/media/serve/' in value:
+                matches = re.findall(r'/api/media/serve/([^\s"\'<>?]+)', value)
+                for match in matches:
+                    media_files.add(match.split('?')[0].split('#')[0])
+            elif value.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg',
+                                 '.mp4', '.webm', '.mp3', '.wav', '.ogg', '.pdf')):
+                if not value.startswith(('http://', 'https://')):
+                    if value.startswith('/'):
+                        filename = os.path.basename(value)
+                        if filename:
+                            media_files.add(filename)
+                    else:
+                        media_files.add(value)
+
+    extract_from_value(quiz_data)
+    return media_files
+
+
+def generate_quiz(pages, elements_per_page, seed=1):
+    """Build a quiz shaped like editor output: pages of elements with nested configs."""
+    rng = random.Random(seed)
+    quiz = {'id': 'bench', 'name': 'Benchmark quiz', 'creator': 'bench', 'pages': []}
+    for page_index in range(pages):
+        elements = {}
+        for element_index in range(elements_per_page):
+            element_id = f'element-{page_index}-{element_index}'
+            element = {
+                'id': element_id,
+                'type': rng.choice(['text', 'rectangle', 'image', 'video', 'audio', 'radio']),
+                'x': rng.randint(0, 1920), 'y': rng.randint(0, 1080),
+                'width': rng.randint(50, 800), 'height': rng.randint(50, 600),
+                'rotation': 0, 'visible': True, 'view': rng.choice(['display', 'participant', 'control']),
+                'properties': {'text': 'Lorem ipsum dolor sit amet ' * rng.randint(1, 5),
+                               'font_size': 24, 'color': '#333333', 'background_color': '#ffffff'},
+                'appearance_config': {'appearance_type': 'on_load', 'appearance_order': element_index},
+            }
+            kind = rng.random()
+            if kind < 0.15:
+                element['media_url'] = f'/api/media/serve/image_{rng.randint(0, 500)}.png?v=0123456789abcdef'
+            elif kind < 0.2:
+                element['src'] = f'video_{rng.randint(0, 100)}.mp4'
+            elif kind < 0.25:
+                element['properties']['html'] = (f'<p>See <img src="/api/media/serve/inline_{rng.randint(0, 50)}.jpg"> '
+                                                 f'and more text</p>')
+            if element['type'] == 'radio':
+                element['question_config'] = {
+                    'question_type': 'radio',
+                    'question_title': 'Which one?',
+                    'options': [f'Option {i}' for i in range(4)],
+                    'correct_answer': 'Option 1',
+                }
+            elements[element_id] = element
+        quiz['pages'].append({
+            'page_type': 'quiz_page', 'page_order': page_index, 'elements': elements,
+            'background': {'type': 'color', 'color': '#000000'},
+            'views': {'display': {'width': 1920, 'height': 1080}, 'participant': {'width': 400, 'height': 800}},
+        })
+    return quiz
+
+
+def time_call(func, quiz, repeat):
+    """Best-of-repeat wall time of one call, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(quiz)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--elements', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    quiz = generate_quiz(args.pages, args.elements)
+    expected = legacy_extract_media_references(quiz)
+    assert extract_media_references(quiz) == expected
+    assert extract_media_references(quiz, cache=True) == expected
+
+    legacy_ms = time_call(legacy_extract_media_references, quiz, args.repeat)
+    walker_ms = time_call(extract_media_references, quiz, args.repeat)
+    cached_ms = time_call(lambda q: extract_media_references(q, cache=True), quiz, args.repeat)
+
+    print(f'Quiz: {args.pages} pages x {args.elements} elements, {len(expected)} distinct media references')
+    print(f'  legacy recursive walk : {legacy_ms:8.2f} ms')
+    print(f'  iterative walker      : {walker_ms:8.2f} ms  ({legacy_ms / walker_ms:.1f}x)')
+    print(f'  walker + content cache: {cached_ms:8.2f} ms  ({legacy_ms / cached_ms:.1f}x, cache hit)')
+
+
+if __name__ == '__main__':
+    main()
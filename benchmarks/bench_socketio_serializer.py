@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark Socket.IO payload encoding: JSON (default) vs msgpack.
+
+Encodes the payloads the server sends most - joined_room (full quiz plus
+current page), page_changed and an answers map - for real quiz files and
+reports encode time and wire size for both serializers.
+
+Usage:
+    python benchmarks/bench_socketio_serializer.py [quiz.json ...] [--participants 200] [--repeat 50]
+
+Without files, every quiz in app/quizes/ is used.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from socketio import packet
+from socketio.msgpack_packet import MsgPackPacket
+
+SERIALIZERS = {
+    'json': packet.Packet,
+    'msgpack': MsgPackPacket
+}
+
+
+def build_payloads(quiz, participants):
+    """Representative event payloads for a room running this quiz."""
+    pages = quiz.get('pages', [])
+    page = pages[0] if pages else None
+    question_ids = [element_id
+                    for page_data in pages
+                    for element_id, element in (page_data.get('elements') or {}).items()
+                    if isinstance(element, dict) and element.get('is_question')] or ['question']
+    answers = {
+        question_id: {
+            f'{index:016x}': {'answer': f'Option {index % 4}', 'submission_time': 12.5, 'correct': index % 2 == 0,
+                              'bonus_points': 0, 'submission_id': f'sub-{index}', 'seq': 1}
+            for index in range(participants)
+        }
+        for question_id in question_ids
+    }
+    return {
+        'joined_room': {'room_code': 'ABCDEF', 'revision': 3, 'current_page': 0, 'page': page, 'quiz': quiz,
+                        'state': {}, 'participant_id': '0123456789abcdef', 'submitted_answers': {}},
+        'page_changed': {'page_index': 0, 'page': page, 'seq': 42},
+        'answers': {'answers': answers, 'seq': 43}
+    }
+
+
+def measure(packet_class, event, payload, repeat):
+    """Best-of-repeat encode time (ms) and encoded size (bytes) of one event packet."""
+    best = float('inf')
+    encoded = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encoded = packet_class(packet.EVENT, data=[event, payload], namespace='/').encode()
+        best = min(best, time.perf_counter() - start)
+    size = len(encoded.encode('utf-8')) if isinstance(encoded, str) else len(encoded)
+    return best * 1000, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('files', nargs='*', type=Path)
+    parser.add_argument('--participants', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    files = args.files or sorted((Path(__file__).resolve().parent.parent / 'app' / 'quizes').glob('*.json'))
+    if not files:
+        parser.error('no quiz files given and none found in app/quizes/')
+
+    totals = {name: [0.0, 0] for name in SERIALIZERS}
+    for quiz_file in files:
+        with open(quiz_file, 'r', encoding='utf-8') as f:
+            quiz = json.load(f)
+        print(f'{quiz_file.name}: {len(quiz.get("pages", []))} pages')
+        for event, payload in build_payloads(quiz, args.participants).items():
+            results = {name: measure(packet_class, event, payload, args.repeat)
+                       for name, packet_class in SERIALIZERS.items()}
+            json_ms, json_size = results['json']
+            msgpack_ms, msgpack_size = results['msgpack']
+            print(f'  {event:<12} json {json_ms:7.3f} ms {json_size:>9} B | '
+                  f'msgpack {msgpack_ms:7.3f} ms {msgpack_size:>9} B '
+                  f'({json_ms / msgpack_ms:.1f}x faster, {100 * msgpack_size / json_size:.0f}% size)')
+            for name, (ms, size) in results.items():
+                totals[name][0] += ms
+                totals[name][1] += size
+
+    json_ms, json_size = totals['json']
+    msgpack_ms, msgpack_size = totals['msgpack']
+    print(f'Total: json {json_ms:.2f} ms / {json_size} B, msgpack {msgpack_ms:.2f} ms / {msgpack_size} B '
+          f'({json_ms / msgpack_ms:.1f}x faster, {100 * msgpack_size / json_size:.0f}% size)')
+
+
+if __name__ == '__main__':
+    main()